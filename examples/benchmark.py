@@ -0,0 +1,84 @@
+# pico_synth_sandbox - DSP Benchmark Example
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+# Compares the vectorized dsp helpers against their previous implementations. Can also be run on a host machine from the root of the repository: `PYTHONPATH=. python3 examples/benchmark.py`
+
+import gc, time, random
+from pico_synth_sandbox import normalize, resample, fft, clamp, is_pow2
+import ulab.numpy as numpy
+import ulab.utils
+
+LENGTH = 16384
+ITERATIONS = 4
+
+# Previous implementations
+
+def legacy_normalize(data):
+    max_level = numpy.max(data)
+    if max_level < 32767.0:
+        for i in range(len(data)):
+            data[i] = int(clamp(float(data[i]) * 32767.0 / max_level, -32767.0, 32767.0))
+    return data
+
+def legacy_resample(data, in_sample_rate, out_sample_rate):
+    if in_sample_rate == out_sample_rate: return data
+    return numpy.interp(
+        numpy.arange(0.0, len(data), in_sample_rate / out_sample_rate, dtype=numpy.float),
+        numpy.arange(0, len(data), 1, dtype=numpy.uint16),
+        data
+    )
+
+def legacy_fft(data, log=True, dtype=numpy.int16, length=1024):
+    if len(data) > length:
+        offset = (len(data)-length)//2
+        data = data[offset:len(data)-offset]
+    if dtype is numpy.uint16:
+        mean = int(numpy.mean(data))
+        data = numpy.array([int(x) - mean for x in data], dtype=numpy.int16)
+    if len(data) < 2:
+        return None
+    if not is_pow2(len(data)):
+        j = 2
+        while True:
+            j *= 2
+            if j > len(data):
+                data = data[:int(j//2)]
+                break
+    data = ulab.utils.spectrogram(data)
+    data = data[1:(len(data)//2)-1]
+    if log:
+        data = numpy.log(data)
+    gc.collect()
+    return data
+
+# Benchmark
+
+def measure(function, setup):
+    total = 0
+    for i in range(ITERATIONS):
+        args = setup()
+        gc.collect()
+        start = time.monotonic_ns()
+        function(*args)
+        total += time.monotonic_ns() - start
+        del args
+    return total / ITERATIONS / 1000000
+
+def compare(name, legacy, current, setup):
+    legacy_time = measure(legacy, setup)
+    current_time = measure(current, setup)
+    print("{:<12}{:>12.3f}{:>12.3f}{:>9.1f}x".format(name, legacy_time, current_time, legacy_time / max(current_time, 0.001)))
+
+random.seed(0)
+source = numpy.array([random.randint(-8000, 8000) for i in range(LENGTH)], dtype=numpy.int16)
+unsigned = numpy.array(source + 32768.0, dtype=numpy.uint16)
+buffer = numpy.zeros(LENGTH, dtype=numpy.int16)
+
+print("{} samples, {} iterations".format(LENGTH, ITERATIONS))
+print("{:<12}{:>12}{:>12}{:>10}".format("Function", "Legacy(ms)", "Current(ms)", "Speedup"))
+compare("normalize", legacy_normalize, normalize, lambda: (numpy.array(source, dtype=numpy.int16),))
+compare("normalize*", legacy_normalize, lambda data: normalize(data, buffer), lambda: (numpy.array(source, dtype=numpy.int16),))
+compare("resample", legacy_resample, resample, lambda: (source, 44100, 22050))
+compare("fft", legacy_fft, fft, lambda: (unsigned, True, numpy.uint16, 8192))
+print("* with a preallocated output buffer")
@@ -3,9 +3,10 @@
 # GPL v3 License
 
 import gc, time
+import ulab.numpy as numpy
 import pico_synth_sandbox.tasks
 from pico_synth_sandbox.tasks import Task
-from pico_synth_sandbox import fftfreq, normalize
+from pico_synth_sandbox import normalize
 from pico_synth_sandbox.board import get_board
 from pico_synth_sandbox.display import Display
 from pico_synth_sandbox.encoder import Encoder
@@ -13,7 +14,7 @@ from pico_synth_sandbox.audio import get_audio_driver
 from pico_synth_sandbox.synth import Synth
 from pico_synth_sandbox.voice.sample import Sample
 from pico_synth_sandbox.keyboard import get_keyboard_driver
-from pico_synth_sandbox.microphone import Microphone
+from pico_synth_sandbox.microphone import Microphone, Recorder
 
 board = get_board()
 
@@ -71,10 +72,16 @@ def update_level(level, max_level):
         display.write("", (12,1), 4)
 mic_level = MicrophoneLevel(microphone, update_level)
 
+recorder = Recorder(
+    microphone,
+    samples=4096,
+    trigger=0.01,
+    clip=0.001
+)
+
 def trigger():
     display.write("Recording")
-    display.force_update()
-microphone.set_trigger(trigger)
+recorder.set_trigger(trigger)
 
 type = 0
 semitone = 0
@@ -107,8 +114,10 @@ def reset_display():
 
 def start_record():
     global semitone
+    if recorder.is_active():
+        return
 
-    pico_synth_sandbox.tasks.pause()
+    mic_level.pause()
     audio.mute()
     display.set_cursor_enabled(False)
     display.set_cursor_blink(False)
@@ -121,36 +130,22 @@ def start_record():
     gc.collect()
 
     display.write("Waiting")
-    display.force_update()
-
-    sample_data = microphone.read(
-        samples=4096,
-        trigger=0.01,
-        clip=0.001
-    )
+    recorder.start()
 
+def complete_record(sample_data):
     display.write("Processing")
     display.force_update()
 
-    # Normalize Volume
-    sample_data = normalize(sample_data)
-
-    # Calculate root frequency
-    sample_rate = Microphone.get_sample_rate()
-    sample_root = fftfreq(
-        data=sample_data,
-        sample_rate=sample_rate
-    )
-    voice.load(sample_data, sample_rate, sample_root)
+    # Normalize Volume into a copy, the recorder buffer is reused by the next recording
+    sample_data = normalize(sample_data, numpy.zeros(len(sample_data), dtype=numpy.int16))
 
-    display.clear()
-    display.write("Complete!")
-    display.force_update()
-    time.sleep(0.5)
+    # Root frequency is calculated by pitch detection, unpitched recordings play at their original speed
+    voice.load(sample_data, Microphone.get_sample_rate())
 
     reset_display()
     audio.unmute()
-    pico_synth_sandbox.tasks.resume()
+    mic_level.resume()
+recorder.set_complete(complete_record)
 
 def increment_semitone():
     global type, semitone
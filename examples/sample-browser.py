@@ -2,17 +2,16 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-import gc, os
+import gc
 import pico_synth_sandbox.tasks
-from pico_synth_sandbox import fftfreq
 from pico_synth_sandbox.board import get_board
 from pico_synth_sandbox.display import Display
 from pico_synth_sandbox.encoder import Encoder
 from pico_synth_sandbox.keyboard import get_keyboard_driver
 from pico_synth_sandbox.audio import get_audio_driver
 from pico_synth_sandbox.synth import Synth
+from pico_synth_sandbox.samples import SampleLibrary
 from pico_synth_sandbox.voice.sample import Sample
-import pico_synth_sandbox.waveform as waveform
 
 board = get_board()
 
@@ -34,11 +33,8 @@ for voice in synth.voices:
         sustain_level=0.5
     )
 
-sample_data = None
-sample_rate = audio.get_sample_rate()
-sample_root = 440.0
-
-sample_files = list(filter(lambda x: x[-4:] == ".wav", os.listdir("/samples")))
+library = SampleLibrary("/samples", max_samples=8192)
+sample_files = library.get_files()
 if not sample_files:
     print("No samples available. Try running \"make samples --always-make\" in the library root directory.")
     exit()
@@ -105,7 +101,7 @@ def decrement_sample():
     update_sample()
 
 def load_sample(write=True):
-    global semitone, sample_data, sample_rate, sample_root, sample_index, sample_index_loaded
+    global semitone, sample_index, sample_index_loaded
     if sample_index == sample_index_loaded:
         return
     
@@ -117,19 +113,19 @@ def load_sample(write=True):
 
     for voice in synth.voices:
         voice.unload()
-    del sample_data
     gc.collect()
 
     semitone = 0
     update_tune(write)
 
-    sample_data, sample_rate = waveform.load_from_file("/samples/" + sample_files[sample_index], max_samples=8192)
-    sample_root = fftfreq(
-        data=sample_data,
-        sample_rate=sample_rate
-    )
+    # Root frequency is read from the library index and only detected the first time a sample is loaded, unpitched samples play at their original speed for A4 without detecting again
+    sample_data, sample_rate, sample_info = library.load(sample_files[sample_index])
+    sample_root = sample_info.get_root()
+    if sample_root is None:
+        sample_root = 440.0
     for voice in synth.voices:
         voice.load(sample_data, sample_rate, sample_root)
+    del sample_data
 
     sample_index_loaded = sample_index
     if write: update_sample()
@@ -4,7 +4,7 @@
 
 import random
 import pico_synth_sandbox.tasks
-from pico_synth_sandbox import fftfreq
+from pico_synth_sandbox.pitch import detect, MIN_CONFIDENCE
 from pico_synth_sandbox.board import get_board
 from pico_synth_sandbox.display import Display
 from pico_synth_sandbox.encoder import Encoder
@@ -26,13 +26,12 @@ audio = get_audio_driver(board)
 audio.mute()
 
 sample_data, sample_rate = waveform.load_from_file("/samples/hey.wav")
-root = fftfreq(
-    data=sample_data,
-    sample_rate=sample_rate
-)
+root, confidence = detect(sample_data, sample_rate) # Detect once rather than for each voice
+if root is None or confidence < MIN_CONFIDENCE:
+    root = 440.0
 
 synth = Synth(audio)
-synth.add_voices(Sample(loop=True) for i in range(4))
+synth.add_voices(Sample(loop=True, modulation=Sample.MODULATION_GLOBAL) for i in range(4))
 for voice in synth.voices:
     voice.load(sample_data, sample_rate, root)
     voice.set_envelope(
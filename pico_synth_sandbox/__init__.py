@@ -2,9 +2,15 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-import gc, os, sys, board, math
-import ulab.utils
-import ulab.numpy as numpy
+import gc, os, sys, math
+try:
+    import ulab.utils
+    import ulab.numpy as numpy
+except ImportError: # Running on a host machine without CircuitPython
+    from pico_synth_sandbox.host import install
+    install()
+    import ulab.utils
+    import ulab.numpy as numpy
 
 # Global Constants
 
@@ -33,6 +39,7 @@ def check_dir(path):
         os.mkdir(path)
 
 def getenvgpio(key, default=None):
+    import board
     return getattr(board, os.getenv(key, default), None)
 
 def getenvfloat(key, default=0.0, decimals=2):
@@ -73,8 +80,7 @@ def fft(data, log=True, dtype=numpy.int16, length=1024):
         data = data[offset:len(data)-offset]
 
     if dtype is numpy.uint16:
-        mean = int(numpy.mean(data))
-        data = numpy.array([x - mean for x in data], dtype=numpy.int16)
+        data = numpy.array(data - numpy.mean(data), dtype=numpy.int16)
 
     # Ensure that data length is a power of 2
     if len(data) < 2:
@@ -102,20 +108,31 @@ def fftfreq(data, sample_rate=None, dtype=numpy.int16):
     gc.collect()
     return freq
 
-def resample(data, in_sample_rate, out_sample_rate):
-    if in_sample_rate == out_sample_rate: return data
-    return numpy.interp(
-        numpy.arange(0.0, len(data), in_sample_rate / out_sample_rate, dtype=numpy.float),
-        numpy.arange(0, len(data), 1, dtype=numpy.uint16),
-        data
-    )
-
-def normalize(data): # For numpy.int16
-    max_level = numpy.max(data)
-    if max_level < 32767.0:
-        for i in range(len(data)):
-            data[i] = int(clamp(float(data[i]) * 32767.0 / max_level, -32767.0, 32767.0))
-    return data
+def resample(data, in_sample_rate, out_sample_rate, out=None):
+    # Linear interpolation, float indices avoid overflow past 65535 samples. If provided, the result is written into the out array (must be at least as long as the result).
+    if in_sample_rate == out_sample_rate:
+        result = data
+    else:
+        result = numpy.interp(
+            numpy.arange(0.0, len(data), in_sample_rate / out_sample_rate, dtype=numpy.float),
+            numpy.arange(0.0, len(data), 1.0, dtype=numpy.float),
+            data
+        )
+    if out is None:
+        return result
+    out[:len(result)] = result
+    return out[:len(result)]
+
+def normalize(data, out=None): # For numpy.int16
+    # Scale to full range by the largest positive or negative peak. Written in place unless an out array of the same length is provided.
+    if out is None: out = data
+    peak = max(int(numpy.max(data)), -int(numpy.min(data)))
+    if peak <= 0 or peak >= 32767:
+        if not out is data:
+            out[:] = data
+        return out
+    out[:] = numpy.array(numpy.clip(data * (32767.0 / peak), -32767.0, 32767.0), dtype=numpy.int16)
+    return out
 
 # Filter Range
 
@@ -2,10 +2,9 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-import random
+import random, array
 from pico_synth_sandbox import clamp
 from pico_synth_sandbox.timer import Timer
-from pico_synth_sandbox.keyboard import Note
 
 class Arpeggiator(Timer):
 
@@ -17,16 +16,27 @@ class Arpeggiator(Timer):
     MODE_PLAYED = 4
     MODE_RANDOM = 5
 
-    def __init__(self, bpm=120, steps=2.0, mode=0, octaves=0, probability=1.0):
+    MAX_NOTES = 32 # Number of held notes which are preallocated, any further notes are ignored
+
+    def __init__(self, bpm=None, steps=2.0, mode=0, octaves=0, probability=1.0):
+        # Held notes are kept both in ascending order and in the order played within preallocated arrays
+        self._count = 0
+        self._sorted_notes = bytearray(self.MAX_NOTES)
+        self._sorted_velocities = array.array('f', [0.0] * self.MAX_NOTES)
+        self._played_notes = bytearray(self.MAX_NOTES)
+        self._played_velocities = array.array('f', [0.0] * self.MAX_NOTES)
+
+        # Sorted notes expanded by octave, only rebuilt when the held notes or octaves change
+        self._expanded_notes = array.array('h')
+        self._expanded_velocities = array.array('f')
+        self._expanded = False
+
         Timer.__init__(self,
             bpm=bpm,
             steps=steps,
             gate=0.3
         )
 
-        self._raw_notes = []
-        self._notes = []
-
         self.set_mode(mode)
         self.set_octaves(octaves)
         self._probability = probability
@@ -41,8 +51,7 @@ class Arpeggiator(Timer):
         return self._octaves
     def set_octaves(self, value):
         self._octaves = int(value)
-        if self._notes:
-            self.update_notes(self._raw_notes)
+        self._expanded = False
 
     def get_probability(self):
         return self._probability
@@ -53,7 +62,7 @@ class Arpeggiator(Timer):
         self._keyboard = keyboard
     def _enable(self):
         if self._keyboard:
-            self.update_notes(self._keyboard.get_notes())
+            self.update_notes(self._keyboard.get_notes()) # Only the note number and velocity of the borrowed notes are copied
     def _disable(self):
         if self._keyboard:
             self._keyboard.force_update()
@@ -62,50 +71,127 @@ class Arpeggiator(Timer):
         return self._mode
     def set_mode(self, value):
         self._mode = value % self.NUM_MODES
-        if self._notes: self.update_notes(self._raw_notes)
-
-    def _get_notes(self, notes=[]):
-        if not notes: return notes
-
-        if abs(self._octaves) > 0:
-            l = len(notes)
-            for octave in range(1,abs(self._octaves)+1):
-                if self._octaves < 0:
-                    octave = octave * -1
-                for i in range(0,l):
-                    notes.append(Note(notes[i].notenum + octave*12, notes[i].velocity))
-
-        if self._mode == self.MODE_UP:
-            notes.sort()
-        elif self._mode == self.MODE_DOWN:
-            notes.sort(reverse=True)
+
+    def get_notes(self):
+        return [self._played_notes[i] for i in range(self._count)]
+    def add_note(self, notenum, velocity=1.0):
+        # Called by the keyboard for each note that is appended while enabled, the pattern restarts when the first note is added
+        self._expanded = False
+        for i in range(self._count):
+            if self._played_notes[i] == notenum:
+                self._played_velocities[i] = velocity
+                for j in range(self._count):
+                    if self._sorted_notes[j] == notenum:
+                        self._sorted_velocities[j] = velocity
+                        break
+                return
+        if self._count >= self.MAX_NOTES:
+            return
+        if not self._count:
+            self._reset()
+
+        # Insert into the sorted notes by shifting higher notes up
+        i = self._count
+        while i > 0 and self._sorted_notes[i - 1] > notenum:
+            self._sorted_notes[i] = self._sorted_notes[i - 1]
+            self._sorted_velocities[i] = self._sorted_velocities[i - 1]
+            i -= 1
+        self._sorted_notes[i] = notenum
+        self._sorted_velocities[i] = velocity
+
+        self._played_notes[self._count] = notenum
+        self._played_velocities[self._count] = velocity
+        self._count += 1
+    def remove_note(self, notenum):
+        self._remove(self._played_notes, self._played_velocities, notenum)
+        if self._remove(self._sorted_notes, self._sorted_velocities, notenum):
+            self._count -= 1
+            self._expanded = False
+    def _remove(self, notes, velocities, notenum):
+        for i in range(self._count):
+            if notes[i] == notenum:
+                for j in range(i, self._count - 1):
+                    notes[j] = notes[j + 1]
+                    velocities[j] = velocities[j + 1]
+                return True
+        return False
+    def update_notes(self, notes=[]):
+        # Remove held notes which are no longer within the list and add any new notes, the order of existing notes is maintained. Only used to synchronize with the keyboard when enabled, otherwise notes are added and removed individually.
+        i = self._count
+        while i > 0:
+            i -= 1
+            notenum = self._played_notes[i]
+            found = False
+            for note in notes:
+                if note.notenum == notenum:
+                    found = True
+                    break
+            if not found:
+                self.remove_note(notenum)
+        for note in notes:
+            self.add_note(note.notenum, note.velocity)
+
+    def get_length(self):
+        # Number of steps within the pattern generated from the held notes, octaves and mode
+        length = self._count * (abs(self._octaves) + 1)
+        if length > 2 and (self._mode == self.MODE_UPDOWN or self._mode == self.MODE_DOWNUP):
+            return length * 2 - 2
+        return length
+
+    def _expand(self):
+        # Merge the held notes of every octave into ascending order so that up and down modes remain monotonic when the notes span more than an octave
+        octaves = abs(self._octaves) + 1
+        length = self._count * octaves
+        if len(self._expanded_notes) < length:
+            self._expanded_notes = array.array('h', [0] * length)
+            self._expanded_velocities = array.array('f', [0.0] * length)
+        base = 0 if self._octaves >= 0 else self._octaves * 12
+        k = 0
+        for octave in range(octaves):
+            for i in range(self._count):
+                notenum = self._sorted_notes[i] + base + octave * 12
+                j = k
+                while j > 0 and self._expanded_notes[j - 1] > notenum:
+                    self._expanded_notes[j] = self._expanded_notes[j - 1]
+                    self._expanded_velocities[j] = self._expanded_velocities[j - 1]
+                    j -= 1
+                self._expanded_notes[j] = notenum
+                self._expanded_velocities[j] = self._sorted_velocities[i]
+                k += 1
+        self._expanded = True
+
+    def _get_index(self, pos):
+        # Map a pattern position to an index of the held notes expanded by octave without building the sequence
+        length = self._count * (abs(self._octaves) + 1)
+        if self._mode == self.MODE_DOWN:
+            return length - 1 - pos
         elif self._mode == self.MODE_UPDOWN:
-            notes.sort()
-            if len(notes) > 2:
-                _notes = notes[1:-1].copy()
-                _notes.reverse()
-                notes = notes + _notes
+            return pos if pos < length else length * 2 - 2 - pos
         elif self._mode == self.MODE_DOWNUP:
-            notes.sort(reverse=True)
-            if len(notes) > 2:
-                _notes = notes[1:-1].copy()
-                _notes.reverse()
-                notes = notes + _notes
-        # MODE_PLAYED = notes stay as is, MODE_RANDOM = index is randomized on update
-
-        return notes
-    def update_notes(self, notes=[]):
-        if not self._notes:
-            self._reset()
-        self._raw_notes = notes.copy()
-        self._notes = self._get_notes(notes)
+            return length - 1 - pos if pos < length else pos - length + 1
+        return pos
 
     def _update(self):
-        if self._notes:
+        if self._count:
             if self._probability < 1.0 and (self._probability == 0.0 or random.random() > self._probability):
                 return
+            length = self.get_length()
             if self.get_mode() == self.MODE_RANDOM:
-                self._pos = random.randrange(0,len(self._notes),1)
+                self._pos = random.randrange(0,length,1)
+            else:
+                self._pos = (self._pos+1) % length
+
+            index = self._get_index(self._pos)
+            if self._mode == self.MODE_PLAYED or self._mode == self.MODE_RANDOM:
+                # Octaves are appended after the notes in the order played
+                octave = index // self._count
+                index = index % self._count
+                notenum = self._played_notes[index] + (octave * 12 if self._octaves >= 0 else octave * -12)
+                velocity = self._played_velocities[index]
             else:
-                self._pos = (self._pos+1) % len(self._notes)
-            self._do_press(self._notes[self._pos].notenum, self._notes[self._pos].velocity)
+                # Octaves are merged in ascending order below or above the held notes
+                if not self._expanded:
+                    self._expand()
+                notenum = self._expanded_notes[index]
+                velocity = self._expanded_velocities[index]
+            self._do_press(notenum, velocity)
@@ -0,0 +1,453 @@
+# pico_synth_sandbox/clock.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+from pico_synth_sandbox.tasks import Task, get_profiler, set_event_dispatcher
+import time, asyncio
+
+_clock = None
+
+def get_clock():
+    """Get the shared master clock which drives all :class:`pico_synth_sandbox.timer.Timer` objects. The clock will be created on the first call.
+
+    :return: master clock
+    :rtype: :class:`pico_synth_sandbox.clock.Clock`
+    """
+    global _clock
+    if _clock is None:
+        _clock = Clock()
+    return _clock
+
+class Clock(Task):
+    """A single tick source at 24 pulses per quarter note (the resolution of midi clock) which drives the steps and note releases of all :class:`pico_synth_sandbox.timer.Timer` objects so that they stay phase-locked. The time of each tick is calculated from the start of the clock rather than accumulated from the previous tick, so scheduling delays never build into drift. Typically accessed with :func:`pico_synth_sandbox.clock.get_clock` rather than created directly.
+
+    The clock can either generate its own ticks from the tempo or follow an external midi clock. When following midi clock, the tempo is measured over each beat of received ticks and smoothed to filter out transport jitter and the batching of messages between midi updates. Ticks are generated at the measured tempo and their spacing is corrected to stay within a single tick of the received ticks. If the clock falls further behind, the missed ticks are caught up immediately.
+
+    Ticks are generated a short lookahead time before they are due. The notes of each step are calculated at that point and queued as timestamped press, release and step events which are dispatched at their due time, so only the callbacks themselves run on time. Due events are also dispatched by the task scheduler between the updates of other tasks. The lateness of each dispatched event is measured, see :func:`pico_synth_sandbox.clock.Clock.get_event_stats`.
+
+    :param bpm: The initial beats per minute of the internal tick source.
+    :type bpm: float
+    """
+
+    PPQN = 24 #: The number of ticks per quarter note.
+    SOURCE_INTERNAL = 0 #: Generate ticks from the tempo set by :func:`pico_synth_sandbox.clock.Clock.set_bpm`.
+    SOURCE_MIDI = 1 #: Follow midi clock, start, stop and continue messages received by :class:`pico_synth_sandbox.midi.Midi`.
+    SMOOTHING = 0.5 #: The weight of each newly measured beat when following midi clock.
+    CORRECTION = 0.25 #: The ratio that the spacing of ticks is shortened or lengthened by when following midi clock and the clock is behind or ahead of the received ticks.
+    MIN_BPM = 20.0 #: The slowest tempo which can be measured from midi clock. Longer beats are considered a pause of the transport.
+    MAX_BPM = 300.0 #: The fastest tempo which can be set or measured.
+    LOOKAHEAD = 0.01 #: The default amount of time in seconds that ticks are generated and events are queued ahead of their due time.
+    MAX_EVENTS = 64 #: The number of preallocated event entries.
+
+    EVENT_STEP = 0 #: Queued event which calls the step callback of a timer.
+    EVENT_PRESS = 1 #: Queued event which presses a note of a timer.
+    EVENT_RELEASE = 2 #: Queued event which releases the notes of a timer which are due.
+
+    def __init__(self, bpm:float=120.0):
+        """Constructor method
+        """
+        self._timers = []
+        self._source = self.SOURCE_INTERNAL
+        self._midi = None
+        self._send = False
+        self._running = True
+        self._bpm_set = False # Whether the tempo has been set explicitly rather than by the constructor
+
+        self._ticks = 0 # Number of ticks generated since start
+        self._tick_time = time.monotonic() # Desired time of the last generated tick
+        self._start_time = self._tick_time
+        self._start_tick = 0
+
+        self._received = 0 # Number of midi clock ticks received since start
+        self._beat_count = 0
+        self._beat_time = None
+
+        # Queued events are kept in a binary min-heap ordered by time as [time, timer, kind, notenum, velocity, order] entries which are reused. The order places releases before other events with the same time and otherwise keeps events in the order they were queued.
+        self._lookahead = self.LOOKAHEAD
+        self._events = []
+        self._free = [[0.0, None, 0, 0, 0.0, 0] for i in range(self.MAX_EVENTS)]
+        self._sequence = 0
+        self.reset_event_stats()
+        set_event_dispatcher(self.dispatch)
+
+        self._set_period(60.0 / bpm / self.PPQN)
+        Task.__init__(self, update_frequency=1.0 / self._period, priority=Task.PRIORITY_HIGH, scheduled=False)
+
+    def _set_period(self, value:float):
+        self._period = min(max(value, 60.0 / self.MAX_BPM / self.PPQN), 60.0 / self.MIN_BPM / self.PPQN)
+
+    def _rebase(self):
+        # Restart the internal tick grid from the last generated tick so that a new tempo doesn't shift the phase
+        self._start_time = self._tick_time
+        self._start_tick = self._ticks - 1
+
+    def set_bpm(self, value:float):
+        """Set the tempo of the internal tick source. The phase of the clock is maintained. Has no effect on the tempo while following midi clock.
+
+        :param value: The desired beats per minute.
+        :type value: float
+        """
+        if self._source == self.SOURCE_MIDI or not value:
+            return
+        self._bpm_set = True
+        self._set_period(60.0 / value / self.PPQN)
+        self._rebase()
+        self.set_update_frequency(1.0 / self._period)
+    def get_bpm(self) -> float:
+        """Get the current tempo. While following midi clock, this is the measured tempo of the received ticks.
+
+        :return: beats per minute
+        :rtype: float
+        """
+        return 60.0 / self._period / self.PPQN
+
+    def get_tick_time(self) -> float:
+        """Get the duration of a single tick.
+
+        :return: tick duration in seconds
+        :rtype: float
+        """
+        return self._period
+    def get_ticks(self) -> int:
+        """Get the number of ticks generated since the clock was last started.
+
+        :return: tick count
+        :rtype: int
+        """
+        return self._ticks
+
+    def set_lookahead(self, value:float):
+        """Set the amount of time that ticks are generated and events are queued ahead of their due time. Larger values give more headroom to calculate each step while other tasks are busy, but changes to timers will take effect later.
+
+        :param value: The lookahead time in seconds.
+        :type value: float
+        """
+        self._lookahead = max(value, 0.0)
+    def get_lookahead(self) -> float:
+        return self._lookahead
+
+    def set_source(self, value:int):
+        """Set whether ticks are generated internally or follow an external midi clock. The midi device must first be assigned with :func:`pico_synth_sandbox.clock.Clock.set_midi`.
+
+        :param value: :const:`pico_synth_sandbox.clock.Clock.SOURCE_INTERNAL` or :const:`pico_synth_sandbox.clock.Clock.SOURCE_MIDI`.
+        :type value: int
+        """
+        if value == self._source:
+            return
+        self._source = value
+        self._received = self._ticks
+        self._beat_count = 0
+        self._beat_time = None
+        self._tick_time = time.monotonic()
+        self._rebase()
+    def get_source(self) -> int:
+        return self._source
+
+    def set_midi(self, midi, send:bool=False):
+        """Assign the midi device used to receive and send midi clock. Received clock, start, stop and continue messages are only followed while the source is :const:`pico_synth_sandbox.clock.Clock.SOURCE_MIDI`.
+
+        :param midi: The midi device.
+        :type midi: :class:`pico_synth_sandbox.midi.Midi`
+        :param send: Whether or not to send a clock message through the midi outputs on every tick along with start, stop and continue messages.
+        :type send: bool
+        """
+        self._midi = midi
+        self._send = send
+        if not midi is None:
+            midi.set_clock(self.receive_tick)
+            midi.set_start(self.receive_start)
+            midi.set_stop(self.receive_stop)
+            midi.set_continue(self.receive_continue)
+    def set_send(self, value:bool):
+        self._send = value
+    def get_send(self) -> bool:
+        return self._send
+
+    def add_timer(self, timer):
+        if not timer in self._timers:
+            self._timers.append(timer)
+    def remove_timer(self, timer):
+        if timer in self._timers:
+            self._timers.remove(timer)
+
+    def is_running(self) -> bool:
+        """Whether or not the clock is currently generating ticks.
+
+        :return: running state
+        :rtype: bool
+        """
+        return self._running
+    def start(self):
+        """Restart the clock from the first tick. All timers will restart from their first step on the next tick. A midi start message will be sent if enabled.
+        """
+        self._ticks = 0
+        self._received = 0
+        self._tick_time = time.monotonic()
+        self._start_time = self._tick_time
+        self._start_tick = 0
+        self._running = True
+        for timer in self._timers:
+            timer._clock_start()
+        if self._send and not self._midi is None:
+            self._midi.send_start()
+    def stop(self):
+        """Pause the clock and release any notes of all timers. A midi stop message will be sent if enabled.
+        """
+        self._running = False
+        for timer in self._timers:
+            timer._clock_stop()
+        if self._send and not self._midi is None:
+            self._midi.send_stop()
+    def resume(self):
+        """Resume the clock from its current position after being stopped. A midi continue message will be sent if enabled.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._received = self._ticks
+        self._tick_time = time.monotonic() - self._period
+        self._rebase()
+        if self._send and not self._midi is None:
+            self._midi.send_continue()
+
+    def receive_tick(self):
+        """Handle a received midi clock message. Called by :class:`pico_synth_sandbox.midi.Midi`.
+        """
+        if self._source != self.SOURCE_MIDI:
+            return
+        if self._running:
+            self._received += 1
+
+        # Measure the tempo over a whole beat so that the jitter of individual messages averages out
+        now = time.monotonic()
+        if self._beat_time is None:
+            self._beat_time = now
+            self._beat_count = 0
+            return
+        self._beat_count += 1
+        if self._beat_count >= self.PPQN:
+            duration = now - self._beat_time
+            self._beat_time = now
+            self._beat_count = 0
+            if duration < 60.0 / self.MIN_BPM:
+                self._set_period(self._period + (duration / self.PPQN - self._period) * self.SMOOTHING)
+                self.set_update_frequency(1.0 / self._period)
+    def receive_start(self):
+        """Handle a received midi start message. Called by :class:`pico_synth_sandbox.midi.Midi`.
+        """
+        if self._source == self.SOURCE_MIDI:
+            self.start()
+    def receive_stop(self):
+        """Handle a received midi stop message. Called by :class:`pico_synth_sandbox.midi.Midi`.
+        """
+        if self._source == self.SOURCE_MIDI:
+            self.stop()
+    def receive_continue(self):
+        """Handle a received midi continue message. Called by :class:`pico_synth_sandbox.midi.Midi`.
+        """
+        if self._source == self.SOURCE_MIDI:
+            self.resume()
+
+    def _get_next_tick(self, now:float) -> float:
+        # Desired time of the next tick or None if waiting
+        if not self._running:
+            return None
+        if self._source == self.SOURCE_INTERNAL:
+            return self._start_time + (self._ticks - self._start_tick) * self._period
+        # Adjust the spacing of ticks by the number of pending received ticks to stay locked within a tick of the received clock
+        pending = self._received - self._ticks
+        if pending < 0:
+            return None
+        if pending > 2:
+            return now
+        return self._tick_time + self._period * (1.0 - self.CORRECTION * (pending - 1))
+
+    def queue_event(self, time:float, timer, kind:int, notenum:int=0, velocity:float=0.0):
+        """Queue an event of a timer to be dispatched at the desired time. Events with the same time are dispatched in the order that they were queued, except that release events are dispatched first.
+
+        :param time: The due time of the event relative to `time.monotonic()`.
+        :type time: float
+        :param timer: The timer which will handle the event.
+        :type timer: :class:`pico_synth_sandbox.timer.Timer`
+        :param kind: The type of event, :const:`pico_synth_sandbox.clock.Clock.EVENT_STEP`, :const:`pico_synth_sandbox.clock.Clock.EVENT_PRESS` or :const:`pico_synth_sandbox.clock.Clock.EVENT_RELEASE`.
+        :type kind: int
+        :param notenum: The note value of a press event.
+        :type notenum: int
+        :param velocity: The velocity of a press event.
+        :type velocity: float
+        """
+        if not self._events:
+            self._sequence = 0
+        self._sequence += 1
+        event = self._free.pop() if self._free else [0.0, None, 0, 0, 0.0, 0]
+        event[0] = time
+        event[1] = timer
+        event[2] = kind
+        event[3] = notenum
+        event[4] = velocity
+        event[5] = self._sequence if kind == self.EVENT_RELEASE else self._sequence + 0x20000000
+
+        # Sift up, comparisons are inlined since this runs for every press, release and step
+        events = self._events
+        events.append(event)
+        order = event[5]
+        i = len(events) - 1
+        while i > 0:
+            parent = (i - 1) >> 1
+            other = events[parent]
+            if other[0] < time or (other[0] == time and other[5] < order):
+                break
+            events[i] = other
+            i = parent
+        events[i] = event
+
+    def _pop_event(self):
+        events = self._events
+        event = events[0]
+        last = events.pop()
+        if events:
+            self._sift_down(last, 0)
+        return event
+
+    def _sift_down(self, event, i:int):
+        events = self._events
+        count = len(events)
+        due, order = event[0], event[5]
+        while True:
+            child = 2 * i + 1
+            if child >= count:
+                break
+            a = events[child]
+            if child + 1 < count:
+                b = events[child + 1]
+                if b[0] < a[0] or (b[0] == a[0] and b[5] < a[5]):
+                    child += 1
+                    a = b
+            if due < a[0] or (due == a[0] and order < a[5]):
+                break
+            events[i] = a
+            i = child
+        events[i] = event
+
+    def cancel_events(self, timer, kind:int=None) -> int:
+        """Remove all queued events of a timer without dispatching them.
+
+        :param timer: The timer of the events.
+        :type timer: :class:`pico_synth_sandbox.timer.Timer`
+        :param kind: The type of events to remove. If left as `None`, all events of the timer will be removed.
+        :type kind: int
+        :return: the number of events removed
+        :rtype: int
+        """
+        count = 0
+        i = 0
+        while i < len(self._events):
+            event = self._events[i]
+            if event[1] is timer and (kind is None or event[2] == kind):
+                self._events[i] = self._events[-1]
+                self._events.pop()
+                event[1] = None
+                self._free.append(event)
+                count += 1
+            else:
+                i += 1
+        if count:
+            # Restore the heap from the bottom up
+            for i in range((len(self._events) >> 1) - 1, -1, -1):
+                self._sift_down(self._events[i], i)
+        return count
+
+    def dispatch(self, now:float=None):
+        """Dispatch all queued events which are due. Called by the clock and by the task scheduler between the updates of other tasks.
+
+        :param now: The current time. If left as `None`, `time.monotonic()` will be used.
+        :type now: float
+        """
+        if not self._events:
+            return
+        if now is None:
+            now = time.monotonic()
+        profiler = None
+        while self._events and self._events[0][0] <= now:
+            event = self._pop_event()
+            timer = event[1]
+            event[1] = None
+            self._free.append(event)
+
+            lateness = now - event[0]
+            self._event_count += 1
+            self._event_lateness += lateness
+            if lateness > self._event_max_lateness:
+                self._event_max_lateness = lateness
+            if profiler is None:
+                profiler = get_profiler()
+            if not profiler is None:
+                profiler.get_profile(self).record_slip(int(lateness * 1000000000))
+
+            timer._dispatch(event[2], event[3], event[4], event[0])
+
+    def get_event_stats(self) -> tuple[int, float, float]:
+        """Get the lateness statistics of dispatched events since the clock was created or the statistics were reset.
+
+        :return: the number of dispatched events, the average lateness and the maximum lateness in seconds
+        :rtype: tuple[int, float, float]
+        """
+        return (
+            self._event_count,
+            self._event_lateness / self._event_count if self._event_count else 0.0,
+            self._event_max_lateness
+        )
+    def reset_event_stats(self):
+        """Clear the lateness statistics of dispatched events.
+        """
+        self._event_count = 0
+        self._event_lateness = 0.0
+        self._event_max_lateness = 0.0
+
+    def _tick(self, due:float, now:float):
+        tick = self._ticks
+        self._ticks += 1
+        if now - due > self._period:
+            # Restart the grid from this tick after a long stall rather than bursting the missed ticks
+            due = now
+            self._tick_time = due
+            if self._source == self.SOURCE_INTERNAL:
+                self._rebase()
+        else:
+            self._tick_time = due
+
+        if self._send and not self._midi is None:
+            self._midi.send_clock()
+        for timer in self._timers:
+            timer._clock_tick(tick, due)
+
+    async def update(self):
+        """Dispatch any due events and generate a tick if one is due within the lookahead time.
+        """
+        now = time.monotonic()
+        self.dispatch(now)
+        due = self._get_next_tick(now)
+        if not due is None and due <= now + self._lookahead:
+            self._tick(due, now)
+            self.dispatch(now)
+
+    async def loop(self):
+        while True:
+            try:
+                now = time.monotonic()
+                wake = self._get_next_tick(now)
+                if not wake is None:
+                    wake -= self._lookahead
+                if self._events and (wake is None or self._events[0][0] < wake):
+                    wake = self._events[0][0]
+                if wake is None:
+                    # Poll for received midi clock or the clock to be started
+                    await asyncio.sleep(0.001 if self._source == self.SOURCE_MIDI else 0.01)
+                elif wake > now:
+                    await asyncio.sleep(wake - now)
+                else:
+                    await asyncio.sleep(0)
+                if not self._async_paused:
+                    await self._update()
+            except asyncio.CancelledError:
+                break
@@ -4,14 +4,30 @@
 
 from pico_synth_sandbox.tasks import Task, run_task
 from pico_synth_sandbox import clamp, truncate_str, unmap_value
-import math
+import os, math
 
 class Display(Task):
-    """Control the connected 16x2 character display (aka *1602*). Hardware connections are abstracted and text writing and cursor management is simplified.
+    """Control the connected character display. Hardware connections are abstracted and text writing and cursor management is simplified. The size of the display is determined by the `DISPLAY_COLUMNS` and `DISPLAY_ROWS` variables in `settings.toml` and defaults to 16x2 (aka *1602*). 16x2, 20x4 (aka *2004*) and 40x2 (aka *4002*) displays are supported.
+
+    Writes are buffered and the range of modified columns is tracked for each row. During each update, only the characters which differ from those on the display are transmitted. Nearby changes are merged into a single write when rewriting the unchanged characters between them costs less than positioning the cursor again.
+
+    :param board: The board object which provides the character lcd.
+    :type board: :class:`pico_synth_sandbox.board.Board`
+    :param columns: The number of columns of the display. If left as `None`, the value of `DISPLAY_COLUMNS` will be used.
+    :type columns: int
+    :param rows: The number of rows of the display. If left as `None`, the value of `DISPLAY_ROWS` will be used.
+    :type rows: int
     """
 
-    def __init__(self, board):
-        self._lcd = board.get_lcd()
+    SPAN_COST = 2 #: The estimated cost of positioning the cursor for a new write in character writes (one address command plus call overhead). Unchanged gaps up to this length are rewritten rather than split into separate writes.
+
+    def __init__(self, board, columns:int=None, rows:int=None):
+        """Constructor method
+        """
+        self._columns = clamp(int(columns if not columns is None else os.getenv("DISPLAY_COLUMNS", 16)), 1, 40)
+        self._rows = clamp(int(rows if not rows is None else os.getenv("DISPLAY_ROWS", 2)), 1, 4)
+
+        self._lcd = board.get_lcd(self._columns, self._rows)
         self._lcd.cursor = False
         self._lcd.text_direction = self._lcd.LEFT_TO_RIGHT
 
@@ -19,13 +35,28 @@ class Display(Task):
         self._cursor_blink = None
         self._cursor_position = (-1,-1)
 
-        self._buffer = [
-            [['\0' for x in range(16)] for y in range(2)], # Input Buffer
-            [[' ' for x in range(16)] for y in range(2)] # Output Buffer
-        ]
+        self._buffer = [[' ' for x in range(self._columns)] for y in range(self._rows)] # Input Buffer
+        self._output = [[' ' for x in range(self._columns)] for y in range(self._rows)] # Output Buffer
+        self._dirty_start = [self._columns for y in range(self._rows)]
+        self._dirty_end = [-1 for y in range(self._rows)]
         self._needs_update = False
 
-        Task.__init__(self, update_frequency=4)
+        Task.__init__(self, update_frequency=4, priority=Task.PRIORITY_LOW)
+
+    def get_columns(self) -> int:
+        """Get the number of columns of the display.
+
+        :return: number of columns
+        :rtype: int
+        """
+        return self._columns
+    def get_rows(self) -> int:
+        """Get the number of rows of the display.
+
+        :return: number of rows
+        :rtype: int
+        """
+        return self._rows
 
     def clear(self):
         """Remove all text from display and hide and reset cursor position
@@ -33,33 +64,43 @@ class Display(Task):
         self._lcd.clear()
         self.set_cursor_enabled(False)
         self.set_cursor_position(0, 0, True)
-        for y in range(2):
-            for x in range(16):
-                self._buffer[0][y][x] = '\0'
-                self._buffer[1][y][x] = ' '
+        for y in range(self._rows):
+            for x in range(self._columns):
+                self._buffer[y][x] = ' '
+                self._output[y][x] = ' '
+            self._dirty_start[y] = self._columns
+            self._dirty_end[y] = -1
         self._needs_update = False
 
+    def _set_char(self, column, row, char):
+        if self._buffer[row][column] != char:
+            self._buffer[row][column] = char
+            if column < self._dirty_start[row]:
+                self._dirty_start[row] = column
+            if column > self._dirty_end[row]:
+                self._dirty_end[row] = column
+            self._needs_update = True
+
     def write(self, value, position=(0,0), length=None, right_aligned=False):
         """Display a string or number on the display at the designated position. Can be truncated to a specified length and right-aligned.
 
-        :param value: The message or number you would like to display. Any part of the string beyond the first 16 characters or the defined length will not be displayed.
+        :param value: The message or number you would like to display. Any part of the string beyond the width of the display or the defined length will not be displayed.
         :type value: string, float
-        :param position: Use a tuple of two 0-based integers for the column and row of that you would like to write the value to. Ie: (x,y). The column (x) should be between 0 and 15 and the row (y) should be between 0 and 1.
+        :param position: Use a tuple of two 0-based integers for the column and row of that you would like to write the value to. Ie: (x,y). The column (x) should be between 0 and the number of columns minus one and the row (y) should be between 0 and the number of rows minus one.
         :type position: tuple
-        :param length: The length of the message you would like to write. By default, the length will be 16 or the length to the last column of the row from the designated x-position.
+        :param length: The length of the message you would like to write. By default, the length will be the number of columns to the last column of the row from the designated x-position.
         :type length: int
         :param right_aligned: Whether or not you would like to align the data to the right padded by spaces as determined by the designated length.
         :type right_align: bool
         """
         position = self._sanitize_position(position)
-        if not length: length = 16
-        length = clamp(length,1,16-position[0])
+        if not length: length = self._columns
+        length = clamp(length,1,self._columns-position[0])
         if type(value) is float:
             value = "{:.2f}".format(value)
         value = truncate_str(str(value), length, right_aligned)
         for x in range(length):
-            self._buffer[0][position[1]][position[0]+x] = value[x]
-        self._needs_update = True
+            self._set_char(position[0]+x, position[1], value[x])
 
     async def update(self, reset_cursor=True):
         """Write buffer to display. Must be called after any changes are made to the display for those changes to be visible.
@@ -73,53 +114,41 @@ class Display(Task):
             return
         self._needs_update = False # Prevent future unnecessary update
 
-        # Locate the end of front buffer data
-        end = -1
-        for i in range(2*16-1, -1, -1):
-            x = i % 16
-            y = i // 16
-            if self._buffer[0][y][x] != '\0' and self._buffer[0][y][x] != self._buffer[1][y][x]:
-                end = i
-                break
-        if end < 0:
-            return # No changes found
-        
-        # Locate the start of front buffer data and start building data
-        start = -1
-        data = []
-        for i in range(2*16):
-            x = i % 16
-            y = i // 16
-            if start < 0:
-                if self._buffer[0][y][x] != '\0' and self._buffer[0][y][x] != self._buffer[1][y][x]:
-                    start = i
-                    if start-end+1 == 2*16: # Needs full buffer refresh
-                        break
-                else:
+        written = False
+        for y in range(self._rows):
+            if self._dirty_end[y] < 0:
+                continue
+            buffer = self._buffer[y]
+            output = self._output[y]
+            x = self._dirty_start[y]
+            end = self._dirty_end[y]
+            self._dirty_start[y] = self._columns
+            self._dirty_end[y] = -1
+
+            while x <= end:
+                # Locate the start of the next changed span
+                if buffer[x] == output[x]:
+                    x += 1
                     continue
-            if self._buffer[0][y][x] != '\0':
-                self._buffer[1][y][x] = self._buffer[0][y][x]
-            data.append(self._buffer[1][y][x])
-            if i == end: # We've reached the end of new buffer data
-                break
-            elif x == 15: # We're at the end of a line
-                data.append('\n')
-
-        if not data: # If no data appended, needs full buffer refresh
-            data = "\n".join(["".join(self._buffer[1][y]) for y in range(2)])
-        else:
-            data = "".join(data)
-        
-        # Write new data to display
-        self._lcd.cursor_position(start%16, start//16)
-        self._lcd.message = data
-        if reset_cursor:
+                start = x
+                last = x
+                x += 1
+                while x <= end and x - last <= Display.SPAN_COST + 1:
+                    if buffer[x] != output[x]:
+                        last = x
+                    x += 1
+                x = last + 1
+
+                # Write the span directly from the requested position, message positions the cursor itself
+                for i in range(start, x):
+                    output[i] = buffer[i]
+                self._lcd.column = start
+                self._lcd.row = y
+                self._lcd.message = "".join(buffer[start:x])
+                written = True
+
+        if written and reset_cursor:
             self._lcd.cursor_position(self._cursor_position[0], self._cursor_position[1])
-        
-        # Reset input buffer
-        for y in range(2):
-            for x in range(16):
-                self._buffer[0][y][x] = '\0'
     
     def force_update(self, reset_cursor=True):
         run_task(self.update(reset_cursor))
@@ -130,7 +159,7 @@ class Display(Task):
                 return (0,0)
             row = column[1]
             column = column[0]
-        return (clamp(column, 0, 15), clamp(row, 0, 1))
+        return (clamp(column, 0, self._columns-1), clamp(row, 0, self._rows-1))
 
     def set_cursor_enabled(self, value):
         """Set whether or not the cursor should be displayed.
@@ -144,9 +173,9 @@ class Display(Task):
     def set_cursor_position(self, column=0, row=0, force=False):
         """Set the position of the cursor.
 
-        :param column: The x-position or column of the cursor which should be between 0 and 15. Can use a tuple of (x,y) to set both column and row.
+        :param column: The x-position or column of the cursor which should be between 0 and the number of columns minus one. Can use a tuple of (x,y) to set both column and row.
         :type column: int|tuple
-        :param row: The y-position or row of the cursor which should be between 0 and 1.
+        :param row: The y-position or row of the cursor which should be between 0 and the number of rows minus one.
         :type row: int
         :param force: Force the display to update the cursor position even if it hasn't changed.
         :type force: bool
@@ -168,9 +197,9 @@ class Display(Task):
     def show_cursor(self, column=0, row=0):
         """A quick method to ensure that the cursor is being displayed and set the position. Will not cause unnecessary display writes if called multiple times.
 
-        :param column: The x-position or column of the cursor which should be between 0 and 15.
+        :param column: The x-position or column of the cursor which should be between 0 and the number of columns minus one.
         :type column: int
-        :param row: The y-position or row of the cursor which should be between 0 and 1.
+        :param row: The y-position or row of the cursor which should be between 0 and the number of rows minus one.
         :type row: int
         """
         self.set_cursor_enabled(True)
@@ -206,7 +235,7 @@ class Display(Task):
 
     def _write_graph(self, value=0.0, minimum=0.0, maximum=1.0, position=(0,0), length=1, vertical=False, centered=False):
         position = self._sanitize_position(position)
-        length = clamp(length, 1, (2 if vertical else 16) - position[1 if vertical else 0])
+        length = clamp(length, 1, (self._rows if vertical else self._columns) - position[1 if vertical else 0])
         value = unmap_value(value, minimum, maximum)
 
         segment = 1.0 / length
@@ -240,10 +269,9 @@ class Display(Task):
 
         for i in range(length):
             if vertical:
-                self._buffer[0][position[1]+(length-i-1)][position[0]] = data[i]
+                self._set_char(position[0], position[1]+(length-i-1), data[i])
             else:
-                self._buffer[0][position[1]][position[0]+i] = data[i]
-        self._needs_update = True
+                self._set_char(position[0]+i, position[1], data[i])
 
     def write_vertical_graph(self, value=0.0, minimum=0.0, maximum=1.0, position=(0,0), height=1):
         self._write_graph(value, minimum, maximum, position, height, True, False)
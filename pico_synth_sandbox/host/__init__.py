@@ -0,0 +1,52 @@
+# pico_synth_sandbox/host/__init__.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import sys
+
+def install():
+    """Register the CPython stand-ins for the CircuitPython `ulab` and `synthio` modules within `sys.modules` so that the library can be imported on a host machine without any hardware. This is called automatically by `pico_synth_sandbox` when `ulab` isn't available. Requires NumPy and SciPy, which are listed along with the other host dependencies in `requirements-host.txt`.
+    """
+    if "ulab" in sys.modules and "synthio" in sys.modules:
+        return
+    from pico_synth_sandbox.host import ulab, synthio
+    sys.modules.setdefault("ulab", ulab)
+    sys.modules.setdefault("ulab.numpy", ulab.numpy)
+    sys.modules.setdefault("ulab.utils", ulab.utils)
+    sys.modules.setdefault("synthio", synthio)
+
+def _run(coro):
+    # Step a coroutine which doesn't await anything (ie: Synth.update) to completion without an event loop
+    try:
+        while True:
+            coro.send(None)
+    except StopIteration:
+        pass
+
+def render(synth, duration:float, control_rate:bool=True):
+    """Render the audio output of a :class:`pico_synth_sandbox.synth.Synth` object (or a stand-in :class:`synthio.Synthesizer` object) into a NumPy buffer as fast as the host allows. Notes should be pressed and released between calls to build up a performance.
+
+    :param synth: The synthesizer object to render.
+    :type synth: :class:`pico_synth_sandbox.synth.Synth`
+    :param duration: The length of audio to render in seconds.
+    :type duration: float
+    :param control_rate: Whether or not to call the `update` routine of the synth object at its update frequency between rendered blocks so that filter envelopes, filter lfos and other control-rate logic are processed. Defaults to `True`.
+    :type control_rate: bool
+    :return: audio data with a shape of (frames, channels)
+    :rtype: :class:`numpy.ndarray` of type `numpy.int16`
+    """
+    import numpy
+    synthesizer = getattr(synth, "_synth", synth)
+    frames = max(int(duration * synthesizer.sample_rate), 0)
+    if not control_rate or not hasattr(synth, "update") or synthesizer is synth:
+        return synthesizer.render(frames)
+
+    step = max(int(synth._async_time * synthesizer.sample_rate), 1)
+    data = numpy.empty((frames, synthesizer.channel_count), dtype=numpy.int16)
+    position = 0
+    while position < frames:
+        _run(synth.update())
+        length = min(step, frames - position)
+        data[position:position+length] = synthesizer.render(length)
+        position += length
+    return data
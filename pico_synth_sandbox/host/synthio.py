@@ -0,0 +1,374 @@
+# pico_synth_sandbox/host/synthio.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+# CPython stand-in for the CircuitPython `synthio` module. Only the features used by this library are implemented. Audio is rendered in blocks of 256 samples (the synthio block duration) and all block inputs are evaluated once per block just like on the device.
+
+import math
+import numpy
+
+from scipy.signal import lfilter
+
+BLOCK_SIZE = 256
+MAX_POLYPHONY = 12
+
+_tick = 0
+_rate_scale = BLOCK_SIZE / 11025
+
+_DEFAULT_WAVEFORM = numpy.array([32767, -32767], dtype=numpy.int16) # Square
+_DEFAULT_LFO_WAVEFORM = numpy.array([0, 32767, 0, -32767], dtype=numpy.int16) # Triangle
+
+def midi_to_hz(midi_note:float) -> float:
+    return 440.0 * math.pow(2.0, (midi_note - 69.0) / 12.0)
+
+def _get(value) -> float:
+    if isinstance(value, BlockInput):
+        return value._evaluate()
+    return float(value)
+
+class MathOperation:
+    SUM = 0
+    ADD_SUB = 1
+    PRODUCT = 2
+    MUL_DIV = 3
+    SCALE_OFFSET = 4
+    OFFSET_SCALE = 5
+    LERP = 6
+    CONSTRAINED_LERP = 7
+    DIV_ADD = 8
+    ADD_DIV = 9
+    MID = 10
+    MAX = 11
+    MIN = 12
+    ABS = 13
+
+    _FUNCTIONS = (
+        lambda a, b, c: a + b + c,
+        lambda a, b, c: a + b - c,
+        lambda a, b, c: a * b * c,
+        lambda a, b, c: a * b / c if c else 0.0,
+        lambda a, b, c: a * b + c,
+        lambda a, b, c: (a + b) * c,
+        lambda a, b, c: a * (1.0 - c) + b * c,
+        lambda a, b, c: a * (1.0 - min(max(c, 0.0), 1.0)) + b * min(max(c, 0.0), 1.0),
+        lambda a, b, c: a / b + c if b else c,
+        lambda a, b, c: (a + b) / c if c else 0.0,
+        lambda a, b, c: sorted((a, b, c))[1],
+        lambda a, b, c: max(a, b, c),
+        lambda a, b, c: min(a, b, c),
+        lambda a, b, c: abs(a),
+    )
+
+class EnvelopeState:
+    ATTACK = 1
+    DECAY = 2
+    SUSTAIN = 3
+    RELEASE = 4
+
+class Envelope:
+    def __init__(self, *, attack_time:float=0.1, decay_time:float=0.05, release_time:float=0.2, attack_level:float=1.0, sustain_level:float=0.8):
+        self.attack_time = attack_time
+        self.decay_time = decay_time
+        self.release_time = release_time
+        self.attack_level = attack_level
+        self.sustain_level = sustain_level
+
+_DEFAULT_ENVELOPE = Envelope(attack_time=0.0, decay_time=0.0, release_time=0.0, attack_level=1.0, sustain_level=1.0)
+
+class BlockInput:
+    def __init__(self):
+        self._tick = -1
+        self.value = 0.0
+
+    def _evaluate(self) -> float:
+        if self._tick != _tick:
+            self._tick = _tick
+            self.value = self._compute()
+        return self.value
+
+    def _compute(self) -> float:
+        return 0.0
+
+class LFO(BlockInput):
+    def __init__(self, waveform=None, *, rate=1.0, scale=1.0, offset=0.0, phase_offset=0.0, once:bool=False, interpolate:bool=True):
+        BlockInput.__init__(self)
+        self.waveform = waveform
+        self.rate = rate
+        self.scale = scale
+        self.offset = offset
+        self.phase_offset = phase_offset
+        self.once = once
+        self.interpolate = interpolate
+        self._accum = 0.0
+        self.value = self._sample(0.0)
+
+    @property
+    def phase(self) -> float:
+        return self._accum
+
+    def retrigger(self):
+        self._accum = 0.0
+
+    def _sample(self, phase:float) -> float:
+        waveform = self.waveform if self.waveform is not None else _DEFAULT_LFO_WAVEFORM
+        length = len(waveform)
+        position = phase * length
+        index = min(int(position), length - 1)
+        value = float(waveform[index])
+        if self.interpolate:
+            following = index + 1
+            if following >= length:
+                following = length - 1 if self.once else 0
+            frac = position - index
+            value = value * (1.0 - frac) + float(waveform[following]) * frac
+        return value / 32768.0 * _get(self.scale) + _get(self.offset)
+
+    def _compute(self) -> float:
+        accum = self._accum + _get(self.rate) * _rate_scale
+        if self.once:
+            accum = min(max(accum, 0.0), 1.0)
+        else:
+            accum -= math.floor(accum)
+        self._accum = accum
+        phase = accum + _get(self.phase_offset)
+        if self.once:
+            phase = min(max(phase, 0.0), 1.0)
+        else:
+            phase -= math.floor(phase)
+        return self._sample(phase)
+
+class Math(BlockInput):
+    def __init__(self, operation:int, a, b=0.0, c=1.0):
+        BlockInput.__init__(self)
+        self.operation = operation
+        self.a = a
+        self.b = b
+        self.c = c
+
+    def _compute(self) -> float:
+        return MathOperation._FUNCTIONS[self.operation](_get(self.a), _get(self.b), _get(self.c))
+
+class Biquad:
+    def __init__(self, b0:float, b1:float, b2:float, a1:float, a2:float):
+        self.b0 = b0
+        self.b1 = b1
+        self.b2 = b2
+        self.a1 = a1
+        self.a2 = a2
+
+    def _process(self, data:numpy.ndarray, state:numpy.ndarray) -> numpy.ndarray:
+        data, state[:] = lfilter((self.b0, self.b1, self.b2), (1.0, self.a1, self.a2), data, zi=state)
+        return data
+
+class Note:
+    def __init__(self, frequency:float, *, panning=0.0, waveform=None, waveform_loop_start:int=0, waveform_loop_end:int=0, envelope:Envelope=None, amplitude=1.0, bend=0.0, filter:Biquad=None, ring_frequency:float=0.0, ring_bend=0.0, ring_waveform=None, ring_waveform_loop_start:int=0, ring_waveform_loop_end:int=0):
+        self.frequency = frequency
+        self.panning = panning
+        self.waveform = waveform
+        self.waveform_loop_start = waveform_loop_start
+        self.waveform_loop_end = waveform_loop_end
+        self.envelope = envelope
+        self.amplitude = amplitude
+        self.bend = bend
+        self.filter = filter
+        self.ring_frequency = ring_frequency
+        self.ring_bend = ring_bend
+        self.ring_waveform = ring_waveform
+        self.ring_waveform_loop_start = ring_waveform_loop_start
+        self.ring_waveform_loop_end = ring_waveform_loop_end
+
+def _loop_bounds(waveform, start:int, end:int) -> tuple:
+    length = len(waveform)
+    if end <= 0 or end > length:
+        end = length
+    start = min(max(start, 0), end - 1)
+    return start, end
+
+def _oscillate(waveform, start:int, end:int, phase:float, frequency:float, sample_rate:int, frames:int) -> tuple:
+    # Returns the block of samples and the updated phase (relative to the loop start)
+    length = end - start
+    increment = frequency * length / sample_rate
+    positions = phase + increment * numpy.arange(frames)
+    indexes = start + numpy.mod(positions, length).astype(numpy.int32)
+    return waveform[numpy.minimum(indexes, end - 1)].astype(numpy.float64), (phase + increment * frames) % length
+
+class _Channel:
+    def __init__(self, note:Note):
+        self.note = note
+        self.state = EnvelopeState.ATTACK
+        self.level = 0.0
+        self.release_rate = 0.0
+        self.phase = 0.0
+        self.ring_phase = 0.0
+        self.filter_state = numpy.zeros(2)
+
+    def press(self):
+        self.state = EnvelopeState.ATTACK
+
+    def release(self, envelope:Envelope):
+        self.state = EnvelopeState.RELEASE
+        self.release_rate = self.level / envelope.release_time if envelope.release_time > 0.0 else math.inf
+
+    def step_envelope(self, envelope:Envelope, duration:float) -> float:
+        if self.state == EnvelopeState.ATTACK:
+            if envelope.attack_time > 0.0:
+                self.level += envelope.attack_level / envelope.attack_time * duration
+            if envelope.attack_time <= 0.0 or self.level >= envelope.attack_level:
+                self.level = envelope.attack_level
+                self.state = EnvelopeState.DECAY
+        elif self.state == EnvelopeState.DECAY:
+            difference = envelope.sustain_level - envelope.attack_level
+            if envelope.decay_time > 0.0 and difference != 0.0:
+                self.level += difference / envelope.decay_time * duration
+            if envelope.decay_time <= 0.0 or (self.level - envelope.sustain_level) * difference >= 0.0:
+                self.level = envelope.sustain_level
+                self.state = EnvelopeState.SUSTAIN
+        elif self.state == EnvelopeState.SUSTAIN:
+            self.level = envelope.sustain_level
+        else:
+            self.level = max(self.level - self.release_rate * duration, 0.0)
+        return self.level
+
+    def is_finished(self) -> bool:
+        return self.state == EnvelopeState.RELEASE and self.level <= 0.0
+
+class Synthesizer:
+    def __init__(self, *, sample_rate:int=11025, channel_count:int=1, waveform=None, envelope:Envelope=None):
+        self.sample_rate = sample_rate
+        self.channel_count = channel_count
+        self.waveform = waveform
+        self.envelope = envelope
+        self.blocks = []
+        self.max_polyphony = MAX_POLYPHONY
+        self._channels = []
+
+    @property
+    def pressed(self) -> tuple:
+        return tuple(channel.note for channel in self._channels if channel.state != EnvelopeState.RELEASE)
+
+    def _get_channel(self, note:Note) -> _Channel:
+        for channel in self._channels:
+            if channel.note is note:
+                return channel
+        return None
+
+    def _get_envelope(self, note:Note) -> Envelope:
+        if note.envelope is not None:
+            return note.envelope
+        if self.envelope is not None:
+            return self.envelope
+        return _DEFAULT_ENVELOPE
+
+    def press(self, press=()):
+        if isinstance(press, Note):
+            press = (press,)
+        for note in press:
+            channel = self._get_channel(note)
+            if channel is not None:
+                if channel.state == EnvelopeState.RELEASE:
+                    channel.press()
+            elif len(self._channels) < self.max_polyphony:
+                self._channels.append(_Channel(note))
+
+    def release(self, release=()):
+        if isinstance(release, Note):
+            release = (release,)
+        for note in release:
+            channel = self._get_channel(note)
+            if channel is not None and channel.state != EnvelopeState.RELEASE:
+                channel.release(self._get_envelope(note))
+
+    def release_then_press(self, release=(), press=()):
+        self.release(release)
+        self.press(press)
+
+    def release_all(self):
+        self.release(self.pressed)
+
+    def release_all_then_press(self, press=()):
+        self.release_all()
+        self.press(press)
+
+    def note_info(self, note:Note) -> tuple:
+        channel = self._get_channel(note)
+        if channel is None:
+            return (None, 0.0)
+        return (channel.state, channel.level)
+
+    def _build_filter(self, frequency:float, Q:float, type:int) -> Biquad:
+        w0 = 2.0 * math.pi * min(max(frequency, 1.0), self.sample_rate * 0.499) / self.sample_rate
+        cos_w0 = math.cos(w0)
+        alpha = math.sin(w0) / (2.0 * Q)
+        a0 = 1.0 + alpha
+        if type == 0: # Low Pass
+            b0 = b2 = (1.0 - cos_w0) / 2.0
+            b1 = 1.0 - cos_w0
+        elif type == 1: # High Pass
+            b0 = b2 = (1.0 + cos_w0) / 2.0
+            b1 = -(1.0 + cos_w0)
+        else: # Band Pass
+            b0 = alpha
+            b1 = 0.0
+            b2 = -alpha
+        return Biquad(b0 / a0, b1 / a0, b2 / a0, -2.0 * cos_w0 / a0, (1.0 - alpha) / a0)
+
+    def low_pass_filter(self, frequency:float, Q:float=0.7071067811865475) -> Biquad:
+        return self._build_filter(frequency, Q, 0)
+
+    def high_pass_filter(self, frequency:float, Q:float=0.7071067811865475) -> Biquad:
+        return self._build_filter(frequency, Q, 1)
+
+    def band_pass_filter(self, frequency:float, Q:float=0.7071067811865475) -> Biquad:
+        return self._build_filter(frequency, Q, 2)
+
+    def render(self, frames:int) -> numpy.ndarray:
+        """Host only: render the next `frames` samples of output as a `numpy.int16` array with a shape of (frames, channel_count)."""
+        output = numpy.zeros((frames, self.channel_count), dtype=numpy.float64)
+        position = 0
+        while position < frames:
+            length = min(BLOCK_SIZE, frames - position)
+            self._render_block(output[position:position+length])
+            position += length
+        return numpy.clip(output, -32768, 32767).astype(numpy.int16)
+
+    def _render_block(self, output:numpy.ndarray):
+        global _tick, _rate_scale
+        frames = len(output)
+        duration = frames / self.sample_rate
+        _tick += 1
+        _rate_scale = duration
+
+        for block in self.blocks:
+            _get(block)
+
+        for channel in tuple(self._channels):
+            note = channel.note
+            envelope = self._get_envelope(note)
+            start_level = channel.level
+            end_level = channel.step_envelope(envelope, duration)
+
+            waveform = note.waveform if note.waveform is not None else (self.waveform if self.waveform is not None else _DEFAULT_WAVEFORM)
+            start, end = _loop_bounds(waveform, note.waveform_loop_start, note.waveform_loop_end)
+            frequency = note.frequency * math.pow(2.0, _get(note.bend))
+            data, channel.phase = _oscillate(waveform, start, end, channel.phase, frequency, self.sample_rate, frames)
+
+            if note.ring_frequency and note.ring_waveform is not None:
+                start, end = _loop_bounds(note.ring_waveform, note.ring_waveform_loop_start, note.ring_waveform_loop_end)
+                frequency = note.ring_frequency * math.pow(2.0, _get(note.ring_bend))
+                ring, channel.ring_phase = _oscillate(note.ring_waveform, start, end, channel.ring_phase, frequency, self.sample_rate, frames)
+                data *= ring / 32768.0
+
+            data *= numpy.linspace(start_level, end_level, frames, endpoint=False) * _get(note.amplitude)
+
+            if note.filter is not None:
+                data = note.filter._process(data, channel.filter_state)
+
+            if self.channel_count == 1:
+                output[:, 0] += data
+            else:
+                panning = min(max(_get(note.panning), -1.0), 1.0)
+                output[:, 0] += data * min(1.0, 1.0 - panning)
+                output[:, 1] += data * min(1.0, 1.0 + panning)
+
+            if channel.is_finished():
+                self._channels.remove(channel)
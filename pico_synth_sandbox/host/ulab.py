@@ -0,0 +1,31 @@
+# pico_synth_sandbox/host/ulab.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+# Minimal stand-in for the CircuitPython `ulab` module backed by NumPy
+
+import types
+import numpy as _numpy
+
+numpy = types.ModuleType("ulab.numpy")
+numpy.__getattr__ = lambda name: getattr(_numpy, name)
+numpy.float = _numpy.float64
+numpy.bool = _numpy.bool_
+
+# ulab returns the real and imaginary parts separately rather than complex arrays
+def _fft(real, imag=None):
+    result = _numpy.fft.fft(real if imag is None else real + 1j * imag)
+    return result.real, result.imag
+def _ifft(real, imag=None):
+    result = _numpy.fft.ifft(real if imag is None else real + 1j * imag)
+    return result.real, result.imag
+
+numpy.fft = types.ModuleType("ulab.numpy.fft")
+numpy.fft.fft = _fft
+numpy.fft.ifft = _ifft
+
+def _spectrogram(data):
+    return _numpy.abs(_numpy.fft.fft(data))
+
+utils = types.ModuleType("ulab.utils")
+utils.spectrogram = _spectrogram
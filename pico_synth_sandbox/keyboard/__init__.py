@@ -78,6 +78,8 @@ class Note:
     :param velocity: The strength of which a note was pressed. Ranges from 0.0 to 1.0. Defaults to 1.0.
     :type velocity: float
     :param keynum: The index number of the :class:`pico_synth_sandbox.keyboard.Key` object which may have created this :class:`pico_synth_sandbox.keyboard.Note` object. If not applicable, will be `None`. Defaults to `None`.
+
+    Note objects which are created by a :class:`pico_synth_sandbox.keyboard.Keyboard` object are borrowed: they are pooled and reused for new notes once they have been released, and the note used for arpeggiator steps is updated on every step. The attributes of a borrowed note are only valid until the note is released, so use :func:`pico_synth_sandbox.keyboard.Note.get_data` to keep a copy of them.
     """
 
     def __init__(self, notenum:int, velocity:float=1.0, keynum:int=None):
@@ -88,6 +90,14 @@ class Note:
         self.keynum = keynum
         self.timestamp = time.monotonic()
 
+        # Allocation state managed by pico_synth_sandbox.keyboard.Keyboard
+        self._voice = None
+        self._held = False
+        self._sustained = False
+        self._selected = False
+        self._pressed = False
+        self._pooled = False
+
     def get_data(self) -> tuple[int, float, int]:
         """Return all note data as tuple. The data is formatted as: (notenum:int, velocity:float, keynum:int). Keynum may be set as `None` if not applicable.
 
@@ -160,7 +170,7 @@ class Note:
             return False
 
 class Voice:
-    """Object which represents the parameters of a :class:`pico_synth_sandbox.keyboard.Keyboard` voice. Used to allocate :class:`pico_synth_sandbox.keyboard.Note` objects to a pre-defined number of available slots in a logical manner based on timing and keyboard mode.
+    """Object which represents the parameters of a :class:`pico_synth_sandbox.keyboard.Keyboard` voice. Used to allocate :class:`pico_synth_sandbox.keyboard.Note` objects to a pre-defined number of available slots in a logical manner based on timing and keyboard mode. The assigned `note` is borrowed from the keyboard and will be reused once the voice is cleared, whereas `notenum` keeps the last assigned note number.
 
     :param index: The position of the voice in the pre-defined set of keyboard voices. Used for external reference.
     :type index: int
@@ -171,7 +181,9 @@ class Voice:
         """
         self.index = index
         self.note = None
+        self.notenum = None # The note number of the last assigned note, kept after the voice is cleared
         self.time = time.monotonic()
+        self._update = 0
 
     def set_note(self, note:Note):
         """Assign a :class:`pico_synth_sandbox.keyboard.Note` object to a voice. When a note is assigned to a voice, the voice is "active" until the note is cleared.
@@ -180,6 +192,7 @@ class Voice:
         :type note: :class:`pico-synth_sandbox.keyboard.Note`
         """
         self.note = note
+        self.notenum = note.notenum
         self.time = time.monotonic()
 
     def is_active(self) -> bool:
@@ -238,6 +251,22 @@ class Keyboard(Task):
     """int: When the keyboard is set as this mode, it will prioritize notes by the order in when they were played/appended.
     """
 
+    NUM_STEAL_POLICIES = 4
+    """int: The number of available voice stealing policies.
+    """
+    STEAL_PRIORITY = 0
+    """int: When all voices are busy, notes are allocated by the keyboard mode alone and the note with the lowest priority is left silent. This is the default policy.
+    """
+    STEAL_OLDEST = 1
+    """int: When all voices are busy, a new note will take over the voice which was assigned a note the longest time ago.
+    """
+    STEAL_QUIETEST = 2
+    """int: When all voices are busy, a new note will take over the voice with the lowest amplitude. Requires a level callback assigned with `set_voice_level`, otherwise the oldest voice is used.
+    """
+    STEAL_SAME = 3
+    """int: A new note will prefer the voice which last played the same note number so that it is retriggered rather than layered. When all voices are busy, the oldest voice is used if none match.
+    """
+
     def __init__(self, keys:list[Key]=[], max_voices:int=1, root:int=None):
         """Constructor method
         """
@@ -248,19 +277,24 @@ class Keyboard(Task):
         self.keys = keys
         self._max_voices = max(max_voices, 1)
 
-        self._notes = []
+        self._notes = [] # Active notes (held or sustained) in order of priority
+        self._note_table = [None] * 128 # Lookup of active notes by midi note number
+        self._note_pool = [] # Released note objects available for reuse
+        self._timer_note = Note(0)
         self._voices = [Voice(i) for i in range(self._max_voices)]
         self._sustain = False
-        self._sustained = []
         self._voice_press = None
         self._voice_release = None
+        self._voice_level = None
+        self._steal = self.STEAL_PRIORITY
+        self._update_count = 0
         self._key_press = None
         self._key_release = None
         self._arpeggiator = None
 
         self.set_mode(os.getenv("KEYBOARD_MODE", self.MODE_HIGH))
 
-        Task.__init__(self, update_frequency=100)
+        Task.__init__(self, update_frequency=100, priority=Task.PRIORITY_HIGH)
 
     def set_voice_press(self, callback):
         """Set the callback method you would like to be called when a voice is pressed.
@@ -276,6 +310,13 @@ class Keyboard(Task):
         :type callback: function
         """
         self._voice_release = callback
+    def set_voice_level(self, callback):
+        """Set the callback method used to measure the current amplitude of a voice when using the `STEAL_QUIETEST` voice stealing policy. :func:`pico_synth_sandbox.synth.Synth.get_level` can be used directly if the keyboard voices match the synth voices.
+
+        :param callback: The callback method. Must have 1 parameter for voice index and return the current level of the voice (0.0-1.0). Ie: `def level(voice):`.
+        :type callback: function
+        """
+        self._voice_level = callback
     def set_key_press(self, callback):
         """Set the callback method you would like to be called when a key is pressed.
 
@@ -318,6 +359,25 @@ class Keyboard(Task):
         :type value: int
         """
         self._mode = value % self.NUM_MODES
+        if self._mode == self.MODE_HIGH or self._mode == self.MODE_LOW:
+            self._notes.sort(reverse=(self._mode == self.MODE_HIGH))
+        else: # self.MODE_LAST
+            self._notes.sort(key=lambda note: note.timestamp)
+
+    def get_steal_policy(self) -> int:
+        """Get the current voice stealing policy of this object.
+
+        :return: voice stealing policy
+        :rtype: int
+        """
+        return self._steal
+    def set_steal_policy(self, value:int):
+        """Set how voices are reassigned when more notes are active than there are available voices. Use one of the policy constants of this class such as `pico_synth_sandbox.Keyboard.STEAL_OLDEST`. Voices are only stolen for newly appended notes, and the cost of finding a voice is bound by the number of voices.
+
+        :param value: The desired voice stealing policy.
+        :type value: int
+        """
+        self._steal = value % self.NUM_STEAL_POLICIES
 
     def get_sustain(self) -> bool:
         """Get the current sustain state of the keyboard.
@@ -335,10 +395,11 @@ class Keyboard(Task):
         """
         if value != self._sustain:
             self._sustain = value
-            self._sustained = []
-            
-            if self._sustain:
-                self._sustained = self._notes.copy()
+            for i in range(len(self._notes) - 1, -1, -1):
+                note = self._notes[i]
+                note._sustained = value
+                if not note._held:
+                    self._drop_note(i)
 
             if update:
                 self._update()
@@ -351,25 +412,37 @@ class Keyboard(Task):
         :returns: has notes
         :rtype: bool
         """
-        if include_sustained and self._sustain and self._sustained:
-            return True
-        if self._notes:
-            return True
+        if include_sustained:
+            return bool(self._notes)
+        for note in self._notes:
+            if note._held:
+                return True
         return False
     def get_notes(self, include_sustained:bool=True) -> list[Note]:
-        """Get all active :class:`pico_synth_sandbox.keyboard.Note` objects within the keyboard object.
+        """Get all active :class:`pico_synth_sandbox.keyboard.Note` objects within the keyboard object in the order that they were played. The list is new, but the note objects are borrowed and will be reused once released (see :class:`pico_synth_sandbox.keyboard.Note`).
 
         :param include_sustained: If set as `True`, any sustained notes will be included in the returned value.
         :type include_sustained: bool
         :returns: list of note objects
         :rtype: list[:class:`pico_synth_sandbox.keyboard.Note`]
         """
-        if not self.has_notes(include_sustained):
-            return []
         if include_sustained:
-            return (self._notes if self._notes else []) + (self._sustained if self._sustain and self._sustained else [])
+            notes = self._notes.copy()
         else:
-            return self._notes
+            notes = [note for note in self._notes if note._held]
+        if self._mode != self.MODE_LAST:
+            notes.sort(key=lambda note: note.timestamp)
+        return notes
+
+    def _get_note(self, notenum:int|Note) -> Note:
+        if isinstance(notenum, Note):
+            notenum = notenum.notenum
+        if 0 <= notenum < 128:
+            return self._note_table[notenum]
+        for note in self._notes:
+            if note.notenum == notenum:
+                return note
+        return None
 
     def has_note(self, notenum:int|Note, include_sustained:bool=True) -> bool:
         """Check whether the keyboard has an active note.
@@ -381,13 +454,11 @@ class Keyboard(Task):
         :returns: has note
         :rtype: bool
         """
-        for note in self.get_notes(include_sustained):
-            if note == notenum:
-                return True
-        return False
+        note = self._get_note(notenum)
+        return not note is None and (include_sustained or note._held)
 
     def get(self, count:int=None) -> list[Note]:
-        """Retrieve a set of active notes according to the keyboard mode setting (`MODE_HIGH`, `MODE_LOW`, or `MODE_LAST`).
+        """Retrieve a set of active notes according to the keyboard mode setting (`MODE_HIGH`, `MODE_LOW`, or `MODE_LAST`). The note objects are borrowed and will be reused once released (see :class:`pico_synth_sandbox.keyboard.Note`).
 
         :param count: The number of notes to return. If left undefined, the max voices setting of the keyboard object will be used instead.
         :type count: int
@@ -395,12 +466,7 @@ class Keyboard(Task):
         :rtype: list[:class:`pico_synth_sandbox.keyboard.Note`]
         """
         if count is None: count = self._max_voices
-        notes = self.get_notes()
-        if self._mode == self.MODE_HIGH or self._mode == self.MODE_LOW:
-            notes.sort(reverse=(self._mode == self.MODE_HIGH))
-        else: # self.MODE_LAST
-            notes.sort(key=lambda note: note.timestamp)
-        return notes[:count]
+        return self._notes[:count]
 
     def append(self, notenum:int|Note, velocity:float=1.0, keynum:int=None, update:bool=True):
         """Add a note to the keyboard buffer. Useful when working with MIDI input or another note source. Any previous notes with the same notenum value will be removed automatically.
@@ -414,11 +480,45 @@ class Keyboard(Task):
         :param update: Whether or not to update the keyboard logic and potentially trigger any associated callbacks.
         :type update: bool
         """
-        self.remove(notenum, False, True)
-        note = notenum if isinstance(notenum, Note) else Note(notenum, velocity, keynum)
-        self._notes.append(note)
-        if self._sustain:
-            self._sustained.append(note)
+        note = self._get_note(notenum)
+        if not note is None:
+            # Retrigger the voice of a note which is pressed again
+            if not note._voice is None:
+                self._release_voice(note._voice)
+            self._drop_note(self._notes.index(note), False) # The arpeggiator keeps its position in the order played
+
+        if isinstance(notenum, Note):
+            note = notenum
+        elif self._note_pool:
+            note = self._note_pool.pop()
+            note.notenum = notenum
+            note.velocity = velocity
+            note.keynum = keynum
+            note.timestamp = time.monotonic()
+        else:
+            note = Note(notenum, velocity, keynum)
+            note._pooled = True
+        note._held = True
+        note._sustained = self._sustain
+        note._selected = False
+        note._pressed = False
+
+        # Insert note by priority
+        i = len(self._notes)
+        if self._mode == self.MODE_HIGH:
+            i = 0
+            while i < len(self._notes) and self._notes[i].notenum >= note.notenum:
+                i += 1
+        elif self._mode == self.MODE_LOW:
+            i = 0
+            while i < len(self._notes) and self._notes[i].notenum <= note.notenum:
+                i += 1
+        self._notes.insert(i, note)
+        if 0 <= note.notenum < 128:
+            self._note_table[note.notenum] = note
+        if self._arpeggiator and self._arpeggiator.is_enabled():
+            self._arpeggiator.add_note(note.notenum, note.velocity)
+
         if update:
             self._update()
         
@@ -432,14 +532,29 @@ class Keyboard(Task):
         :param remove_sustained: Whether or not you would like to override the current sustained state of the keyboard and release any notes that are being sustained.
         :type remove_sustained: bool
         """
-        if not self.has_note(notenum):
+        note = self._get_note(notenum)
+        if note is None:
             return
-        self._notes = [note for note in self._notes if note != notenum]
-        if remove_sustained and self._sustain and self._sustained:
-            self._sustained = [note for note in self._sustained if note != notenum]
+        note._held = False
+        if remove_sustained:
+            note._sustained = False
+        if not note._sustained:
+            self._drop_note(self._notes.index(note))
         if update:
             self._update()
 
+    def _drop_note(self, index:int, arpeggiate:bool=True):
+        note = self._notes.pop(index)
+        if arpeggiate and self._arpeggiator and self._arpeggiator.is_enabled():
+            self._arpeggiator.remove_note(note.notenum)
+        note._held = False
+        note._sustained = False
+        note._selected = False
+        if 0 <= note.notenum < 128 and self._note_table[note.notenum] is note:
+            self._note_table[note.notenum] = None
+        if note._pooled and note._voice is None:
+            self._note_pool.append(note)
+
     async def update(self):
         """Update the keyboard logic and call any pre-defined callbacks if triggered. If any :class:`pico_synth_sandbox.keyboard.Key` objects (during initialization) or an :class:`pico_synth_sandbox.arpeggiator.Arpeggiator` object (using the `set_arpeggiator` method) were associated with this object, it will also be updated in this process.
         """
@@ -459,13 +574,19 @@ class Keyboard(Task):
                         self._key_release(i, notenum)
 
     def _update(self):
+        # The arpeggiator's held notes are maintained by append and _drop_note
         if not self._arpeggiator or not self._arpeggiator.is_enabled():
-            self._update_voices(self.get())
-        else:
-            self._arpeggiator.update_notes(self.get_notes() if self.has_notes() else [])
+            self._update_voices(self._max_voices)
 
     def _timer_press(self, notenum, velocity):
-        self._update_voices(Note(notenum, velocity))
+        # The voice holding the previous step is released before the shared timer note is updated so that its release callback receives the previous note
+        self._update_voices()
+        self._timer_note.notenum = notenum
+        self._timer_note.velocity = velocity
+        self._timer_note.timestamp = time.monotonic()
+        voice = self._get_inactive_voice()
+        if not voice is None:
+            self._press_voice(voice, self._timer_note)
     def _timer_release(self, notenum): # NOTE: notenum is ignored
         self._update_voices()
 
@@ -540,47 +661,84 @@ class Keyboard(Task):
                 return True
         return False
     
-    def _update_voices(self, notes=None):
-        if isinstance(notes, Note):
-            notes = [notes]
-        
-        # Release all active voices if no available notes
-        if notes is None or not notes:
-            if self.has_active_voice():
-                for voice in self.get_active_voices():
-                    self._release_voice(voice)
-            return
-        
-        if self.has_active_voice():
-            for voice in self.get_active_voices():
-                # Determine if voice has one of the notes in the buffer
-                has_note = False
-                for note in notes:
-                    if voice.note is note:
-                        has_note = True
-                        break
-                if not has_note:
-                    # Release voices without active notes
-                    self._release_voice(voice)
-                else:
-                    # Remove currently active notes from buffer
-                    notes.remove(voice.note)
-
-        if not notes:
-            return # No new notes
-        
-        # Activate new notes
-        if self.has_inactive_voices(): # If no voices are available, it will ignore remaining notes
-            voices = self.get_inactive_voices()
-            voice_index = 0
-            for note in notes:
-                self._press_voice(voices[voice_index], note)
-                voice_index += 1
-                if voice_index >= len(voices):
+    def _get_voice_level(self, voice:Voice) -> float:
+        return self._voice_level(voice.index) if self._voice_level else 0.0
+
+    def _get_inactive_voice(self, note:Note=None) -> Voice:
+        # Returns the inactive voice best suited to the steal policy, defaults to the voice which was assigned a note the longest time ago
+        result = None
+        level = 0.0
+        for voice in self._voices:
+            if voice.is_active():
+                continue
+            if self._steal == self.STEAL_SAME and not note is None and voice.notenum == note.notenum:
+                return voice
+            if self._steal == self.STEAL_QUIETEST and self._voice_level:
+                value = self._get_voice_level(voice)
+                if result is None or value < level or (value == level and voice.time < result.time):
+                    result = voice
+                    level = value
+            elif result is None or voice.time < result.time:
+                result = voice
+        return result
+
+    def _steal_voice(self, note:Note) -> Voice:
+        # Returns the active voice to be taken over by a new note, voices pressed within the current update are skipped
+        result = None
+        level = 0.0
+        for voice in self._voices:
+            if not voice.is_active() or voice._update == self._update_count:
+                continue
+            if self._steal == self.STEAL_SAME and voice.notenum == note.notenum:
+                return voice
+            if self._steal == self.STEAL_QUIETEST and self._voice_level:
+                value = self._get_voice_level(voice)
+                if result is None or value < level or (value == level and voice.time < result.time):
+                    result = voice
+                    level = value
+            elif result is None or voice.time < result.time:
+                result = voice
+        return result
+
+    def _update_voices(self, count:int=0):
+        self._update_count += 1
+
+        # When stealing, every active note is eligible for a voice
+        if count and self._steal != self.STEAL_PRIORITY:
+            count = len(self._notes)
+
+        # Select the first notes by priority without allocating a new list
+        count = min(count, len(self._notes))
+        for i in range(len(self._notes)):
+            self._notes[i]._selected = i < count
+
+        # Release voices without selected notes
+        for voice in self._voices:
+            if voice.is_active() and not voice.note._selected:
+                self._release_voice(voice)
+
+        # Activate new notes, if no voices are available it will ignore remaining notes or steal voices for new notes
+        for i in range(count):
+            note = self._notes[i]
+            if not note._voice is None:
+                continue
+            voice = self._get_inactive_voice(note)
+            if voice is None:
+                if self._steal == self.STEAL_PRIORITY:
                     break
+                if note._pressed:
+                    continue # Notes which have lost their voice don't steal it back
+                voice = self._steal_voice(note)
+                if voice is None:
+                    continue
+                self._release_voice(voice)
+            self._press_voice(voice, note)
 
     def _press_voice(self, voice, note):
         voice.set_note(note)
+        voice._update = self._update_count
+        note._voice = voice
+        note._pressed = True
         if self._voice_press:
             self._voice_press(voice.index, voice.note.notenum, voice.note.velocity, voice.note.keynum)
     def _release_voice(self, voice:Voice):
@@ -588,9 +746,13 @@ class Keyboard(Task):
             for i in voice:
                 self._release_voice(i)
         elif voice.is_active():
+            note = voice.note
             if self._voice_release:
-                self._voice_release(voice.index, voice.note.notenum, voice.note.keynum)
+                self._voice_release(voice.index, note.notenum, note.keynum)
             voice.clear()
+            note._voice = None
+            if note._pooled and not note._held and not note._sustained:
+                self._note_pool.append(note)
 
 def get_keyboard_driver(board, max_voices:int=1, root:int=None) -> Keyboard:
     """Automatically generate the proper :class:`pico_synth_sandbox.keyboard.Keyboard` object based on the device's settings.toml configuration.
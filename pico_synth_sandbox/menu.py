@@ -2,21 +2,67 @@
 # 2024 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-import os, json, math
+import os, json, math, struct
 import ulab.numpy as numpy
 from pico_synth_sandbox import clamp, map_value, unmap_value, check_dir, get_filter_frequency_range
+from pico_synth_sandbox.tasks import Task
 from pico_synth_sandbox.display import Display
 from pico_synth_sandbox.voice import Voice, AREnvelope
 from pico_synth_sandbox.voice.oscillator import Oscillator
 import pico_synth_sandbox.waveform as waveform
 
-def apply_value(items:tuple, method:callable|str, offset:float=0.0) -> callable:
+class ParameterDispatcher(Task):
+    # Parameter changes from menu items and midi control changes are marked as pending and only the final value of each parameter is applied once per update. Callbacks are applied in the order that they first became pending (ie: menu order) since dict order isn't preserved and some setters depend on others (ie: loop points on the waveform).
+    def __init__(self, update_frequency:int=30):
+        self._pending = {}
+        self._order = []
+        Task.__init__(self, update_frequency)
+    def set(self, callback:callable, value):
+        if not callback in self._pending:
+            self._order.append(callback)
+        self._pending[callback] = value
+    def is_pending(self) -> bool:
+        return len(self._order) > 0
+    def flush(self):
+        if not self._order:
+            return
+        pending, order = self._pending, self._order
+        self._pending, self._order = {}, []
+        for callback in order:
+            callback(pending[callback])
+    async def update(self):
+        self.flush()
+
+_dispatcher = None
+def get_dispatcher() -> ParameterDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = ParameterDispatcher()
+    return _dispatcher
+def dispatch(callback:callable, value):
+    get_dispatcher().set(callback, value)
+def defer(callback:callable) -> callable:
+    return lambda value : get_dispatcher().set(callback, value)
+
+def apply_value(items:tuple, method:callable|str, offset:float=0.0, immediate:bool=False) -> callable:
     if type(method) is str:
         method = getattr(type(items[0]), method)
+    # Voices hold the change if they are staging a patch
     if offset > 0.0:
-        return lambda value : [method(items[i], value+offset*(i-(len(items)-1)/2)) for i in range(len(items))]
+        def apply(value):
+            for i in range(len(items)):
+                if isinstance(items[i], Voice):
+                    items[i].stage(method, value+offset*(i-(len(items)-1)/2))
+                else:
+                    method(items[i], value+offset*(i-(len(items)-1)/2))
     else:
-        return lambda value : [method(items[i], value) for i in range(len(items))]
+        def apply(value):
+            for item in items:
+                if isinstance(item, Voice):
+                    item.stage(method, value)
+                else:
+                    method(item, value)
+    return apply if immediate else defer(apply)
 
 class MenuItem:
     def __init__(self, title:str="", group:str="", update:callable=None):
@@ -327,6 +373,9 @@ class MenuGroup(MenuItem):
         for item in self._items:
             data[item.get_title()] = item.get_data()
         return data
+    def get_preset_items(self) -> tuple:
+        # Items stored within a preset, see PresetBank
+        return self._items
     def get_item_by_title(self, title:str) -> MenuItem:
         for item in self._items:
             if item.get_title() == title:
@@ -436,14 +485,15 @@ class WaveformMenuGroup(MenuGroup):
     def __init__(self, voices:Oscillator|tuple[Oscillator], group:str=""):
         self._voices = tuple(voices)
         self._waveform = WaveformMenuItem(update=apply_value(self._voices, Oscillator.set_waveform))
-        self._loop_start = NumberMenuItem("LoopStart", step=0.01, initial=0.0, update=lambda value : self.update_loop())
-        self._loop_end = NumberMenuItem("LoopEnd", step=0.01, initial=1.0, update=lambda value : self.update_loop())
+        update_loop = defer(lambda value : self.update_loop())
+        self._loop_start = NumberMenuItem("LoopStart", step=0.01, initial=0.0, update=update_loop)
+        self._loop_end = NumberMenuItem("LoopEnd", step=0.01, initial=1.0, update=update_loop)
         MenuGroup.__init__(self, (self._waveform, self._loop_start, self._loop_end), group)
         self.disable_title()
     def update_loop(self):
         print((self._loop_start.get(), self._loop_end.get()))
         for voice in self._voices:
-            voice.set_loop(self._loop_start.get(), self._loop_end.get())
+            voice.stage(Oscillator.set_loop, self._loop_start.get(), self._loop_end.get())
     def enable(self, display:Display, last:bool = False):
         MenuGroup.enable(self, display, last)
         display.enable_vertical_graph()
@@ -886,6 +936,8 @@ class PatchMenuGroup(MenuGroup):
             self._name.set_data(data["Name"], False)
     def get(self) -> int:
         return self._patch.get()
+    def get_preset_items(self) -> tuple:
+        return (self._name,) # Don't store index
     def get_name(self) -> str:
         return self._name.get()
     def enable(self, display:Display, last:bool = False):
@@ -956,4 +1008,189 @@ class Menu(MenuGroup):
             return False
         
         self.set_data(data)
+        get_dispatcher().flush()
+        return True
+
+class PresetBank:
+    # Stores all presets of a menu within a single binary file. A fixed-size header is followed by an index of which slots are used and then one fixed-size record per slot. Each record contains a typed field for every parameter of the menu in the order of a precompiled item table, so reading a preset only reads and unpacks a single record.
+
+    MAGIC = b"PSPB"
+    VERSION = 1
+
+    _HEADER = "<4sBHHL"
+
+    def __init__(self, menu:Menu, path:str="", count:int=128, dir:str="/presets"):
+        if not path: path = "{}/{}.bank".format(dir, menu.get_title() or "presets")
+        self._menu = menu
+        self._path = path
+        self._dir = path[:path.rfind("/")] or "/"
+        self._count = count
+
+        # Precompile the table of items and record format
+        self._items = []
+        self._types = []
+        self._compile(menu)
+        format = "<" + "".join(self._types)
+        self._format = format
+        self._record = bytearray(struct.calcsize(format))
+        self._layout = self._hash(format + "|".join([item.get_title() for item in self._items]))
+
+        self._used = bytearray(count)
+        self._incompatible = False # An existing bank file which doesn't match the menu, it is only replaced when writing with reset
+        self._valid = self._read_header()
+
+    def _compile(self, group:MenuGroup):
+        for item in group.get_preset_items():
+            if isinstance(item, StringMenuItem):
+                self._items.append(item)
+                self._types.append("{:d}s".format(item._length))
+            elif isinstance(item, MenuGroup):
+                self._compile(item)
+            elif isinstance(item, IntMenuItem):
+                self._items.append(item)
+                self._types.append("h")
+            elif isinstance(item, NumberMenuItem):
+                self._items.append(item)
+                self._types.append("f")
+
+    def _hash(self, value:str) -> int:
+        # 32-bit FNV-1a of the item layout, used to reject banks written by a different menu structure
+        result = 0x811C9DC5
+        for char in value:
+            result = ((result ^ ord(char)) * 0x01000193) & 0xFFFFFFFF
+        return result
+
+    def _get_offset(self, index:int) -> int:
+        return struct.calcsize(self._HEADER) + self._count + index * len(self._record)
+
+    def _read_header(self) -> bool:
+        try:
+            with open(self._path, "rb") as file:
+                magic, version, count, size, layout = struct.unpack(self._HEADER, file.read(struct.calcsize(self._HEADER)))
+                if magic != self.MAGIC or version != self.VERSION or count != self._count or size != len(self._record) or layout != self._layout:
+                    print("Incompatible preset bank: {}".format(self._path))
+                    self._incompatible = True
+                    return False
+                file.readinto(self._used)
+        except OSError:
+            return False
+        return True
+
+    def _backup(self) -> bool:
+        # Keep an incompatible bank as a backup file rather than erasing its presets
+        backup = self._path + ".bak"
+        try:
+            try:
+                os.remove(backup)
+            except OSError:
+                pass
+            os.rename(self._path, backup)
+        except OSError:
+            print("Failed to back up preset bank: {}".format(self._path))
+            return False
+        print("Replacing incompatible preset bank, previous bank kept as: {}".format(backup))
+        self._incompatible = False
+        return True
+
+    def _create(self) -> bool:
+        try:
+            check_dir(self._dir)
+            with open(self._path, "wb") as file:
+                file.write(struct.pack(self._HEADER, self.MAGIC, self.VERSION, self._count, len(self._record), self._layout))
+                for i in range(self._count):
+                    self._used[i] = 0
+                file.write(self._used)
+                for i in range(len(self._record)):
+                    self._record[i] = 0
+                for i in range(self._count):
+                    file.write(self._record)
+        except OSError:
+            print("Failed to create preset bank: {}".format(self._path))
+            return False
+        self._valid = True
+        return True
+
+    def get_count(self) -> int:
+        return self._count
+    def exists(self, index:int) -> bool:
+        return self._valid and 0 <= index < self._count and self._used[index] > 0
+
+    def read(self, index:int) -> bool:
+        if not self.exists(index):
+            return False
+        try:
+            with open(self._path, "rb") as file:
+                file.seek(self._get_offset(index))
+                file.readinto(self._record)
+        except OSError:
+            print("Failed to read preset bank: {}".format(self._path))
+            return False
+        values = struct.unpack_from(self._format, self._record)
+        for i in range(len(self._items)):
+            if self._types[i][-1] == "s":
+                self._items[i].set(values[i].rstrip(b"\0").decode())
+            else:
+                self._items[i].set(values[i])
+        get_dispatcher().flush()
+        return True
+
+    def is_incompatible(self) -> bool:
+        # Whether the bank file was written by a different menu structure, see write
+        return self._incompatible
+
+    def write(self, index:int, reset:bool=False) -> bool:
+        # An incompatible bank file is only replaced if reset is enabled, the previous file is then kept with a .bak extension
+        if not 0 <= index < self._count:
+            return False
+        if self._incompatible:
+            if not reset:
+                print("Incompatible preset bank, not writing without reset: {}".format(self._path))
+                return False
+            if not self._backup():
+                return False
+        if not self._valid and not self._create():
+            return False
+        values = []
+        for i in range(len(self._items)):
+            value = self._items[i].get_data()
+            if self._types[i][-1] == "s":
+                value = value.encode()
+            values.append(value)
+        struct.pack_into(self._format, self._record, 0, *values)
+        try:
+            with open(self._path, "r+b") as file:
+                file.seek(self._get_offset(index))
+                file.write(self._record)
+                self._used[index] = 1
+                file.seek(struct.calcsize(self._HEADER) + index)
+                file.write(self._used[index:index+1])
+        except OSError:
+            print("Failed to write preset bank: {}".format(self._path))
+            return False
+        return True
+
+    def select(self, index:int, synth=None, fade:float=None) -> bool:
+        # Read a preset as a patch of the synth so that each voice swaps to it at its next note boundary rather than changing notes which are playing, see Synth.commit_patch
+        if synth is None:
+            return self.read(index)
+        synth.begin_patch()
+        result = self.read(index)
+        synth.commit_patch(fade)
+        return result
+
+    def bind_program_change(self, midi, synth=None, fade:float=None):
+        # Select the preset of the program number whenever a midi program change message is received, empty slots are ignored
+        midi.set_program_change(lambda patch: self.select(patch, synth, fade))
+
+    def erase(self, index:int) -> bool:
+        if not self.exists(index):
+            return False
+        try:
+            with open(self._path, "r+b") as file:
+                self._used[index] = 0
+                file.seek(struct.calcsize(self._HEADER) + index)
+                file.write(self._used[index:index+1])
+        except OSError:
+            print("Failed to write preset bank: {}".format(self._path))
+            return False
         return True
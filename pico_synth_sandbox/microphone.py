@@ -2,6 +2,7 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
+from pico_synth_sandbox.tasks import Task
 from pico_synth_sandbox import resample
 import os, array
 import ulab.numpy as numpy
@@ -22,6 +23,8 @@ class Microphone:
         self._buffer_raw = None
         self._buffer_data = None
         self._data = None
+        self._block_raw = None
+        self._block_data = None
 
         # Callbacks
         self._trigger = None
@@ -41,8 +44,33 @@ class Microphone:
         self._data = numpy.array(resample(self._buffer_data, self.input_sample_rate, self.actual_sample_rate) - mean, dtype=numpy.int16)
         return self._data
 
-    def calculate_level(self, data):
-        return numpy.sum(abs(data)) / len(data) / 32768.0
+    def read_into(self, data, dc=True):
+        # Record len(data) samples in a single continuous call into a preallocated int16 array. The raw buffer is reused and only grows, but the conversion to int16 still allocates a temporary array for each read. If dc is disabled, only the unsigned midpoint is removed and the offset of the microphone remains until remove_dc is called on the whole recording.
+        samples = len(data)
+        count = samples if self.input_sample_rate == self.actual_sample_rate else int(samples * self.input_sample_rate / self.actual_sample_rate) + 1
+        if self._block_raw is None or len(self._block_raw) < count:
+            del self._block_raw, self._block_data
+            self._block_raw = array.array('H', [0] * count)
+            self._block_data = numpy.frombuffer(self._block_raw, dtype=numpy.uint16)
+        self.input.record(self._block_raw, count)
+        raw = resample(self._block_data[:count], self.input_sample_rate, self.actual_sample_rate)
+        count = min(len(raw), samples)
+        data[:count] = numpy.array(raw[:count] - 32768.0, dtype=numpy.int16)
+        if count < samples:
+            data[count:] = data[count-1] if count else 0
+        del raw
+        if dc:
+            self.remove_dc(data)
+        return data
+
+    def remove_dc(self, data):
+        # Remove the mean of the whole array at once so that there isn't a step between separate reads
+        mean = numpy.mean(data)
+        data[:] = numpy.array(numpy.clip(data - mean, -32768.0, 32767.0), dtype=numpy.int16)
+        return data
+
+    def calculate_level(self, data, mean=0.0):
+        return numpy.sum(abs(data - mean)) / len(data) / 32768.0
     def get_level(self, samples=None):
         if samples is None: samples = self.level_samples
         return self.calculate_level(self.get_data(samples))
@@ -73,13 +101,14 @@ class Microphone:
         else:
             data = self.get_data(samples)
 
-        # Clip tail if below level
-        if clip > 0.0:
-            for i in range(0, samples, self.level_samples):
-                if self.calculate_level(data[i:i+self.level_samples]) < clip:
-                    data = data[:i]
-                    break
+        return self.clip(data, clip)
 
+    def clip(self, data, level=0.0, start=0):
+        # Clip tail if below level
+        if level > 0.0:
+            for i in range(start, len(data), self.level_samples):
+                if self.calculate_level(data[i:i+self.level_samples]) < level:
+                    return data[:i]
         return data
 
     def record(self, name, samples, trigger=None, clip=True):
@@ -87,7 +116,9 @@ class Microphone:
         data = self.read(samples, trigger, clip)
         if not data:
             return False
+        return self.save(name, data)
 
+    def save(self, name, data):
         # Remove existing file
         filepath = "/samples/{}.wav".format(name)
         try:
@@ -111,3 +142,107 @@ class Microphone:
     @staticmethod
     def get_sample_rate():
         return os.getenv("MIC_RATE", 11025)
+
+class Recorder(Task):
+    # Capture microphone input from a scheduled task one bounded block per update so that other tasks keep running while waiting for the trigger level and while recording. While waiting, each block is read into a preallocated ring buffer of pre-trigger history and checked for the trigger level. Once triggered, the history is copied in order to the start of the recording and the remaining samples are read one block at a time. The microphone can only be read during an update, so any audio which arrives while other tasks are updating is lost between blocks. Larger blocks leave fewer gaps but delay other tasks for longer (ie: 512 samples at 22050hz is about 23ms). The microphone offset is removed once over the whole recording.
+
+    STATE_IDLE = 0
+    STATE_WAITING = 1
+    STATE_RECORDING = 2
+    STATE_COMPLETE = 3
+
+    UPDATE_FREQUENCY = 1000 # Blocks are read back to back while only yielding to other tasks which are due
+
+    def __init__(self, microphone, samples=4096, trigger=0.01, clip=0.001, pretrigger=None, block=None):
+        self._microphone = microphone
+        self._trigger_level = trigger
+        self._clip_level = clip
+        self._block = max(block if not block is None else microphone.level_samples * 4, microphone.level_samples)
+        self._samples = max(samples, self._block)
+
+        # Pre-trigger history of whole blocks including the block which triggered the recording
+        if pretrigger is None: pretrigger = self._block * 4
+        blocks = min(max((pretrigger + self._block - 1) // self._block, 1), self._samples // self._block)
+        self._history = numpy.zeros(blocks * self._block, dtype=numpy.int16)
+        self._history_pos = 0
+        self._history_count = 0
+
+        self._data = numpy.zeros(self._samples, dtype=numpy.int16)
+        self._pos = 0
+        self._result = None
+        self._state = self.STATE_IDLE
+
+        self._trigger = None
+        self._complete = None
+
+        Task.__init__(self, update_frequency=self.UPDATE_FREQUENCY)
+        self.pause()
+
+    def set_trigger(self, callback):
+        # Called before the next block of the recording is read, so it should return quickly to avoid a gap in the audio
+        self._trigger = callback
+    def set_complete(self, callback):
+        # Called with the recorded data once complete, ie: `def complete(data):`
+        self._complete = callback
+
+    def set_trigger_level(self, value):
+        self._trigger_level = value
+    def get_trigger_level(self):
+        return self._trigger_level
+
+    def get_state(self):
+        return self._state
+    def is_active(self):
+        return self._state == self.STATE_WAITING or self._state == self.STATE_RECORDING
+    def get_progress(self):
+        # Fraction of the recording which has been captured including the pre-trigger history
+        if self._state == self.STATE_COMPLETE:
+            return 1.0
+        if self._state == self.STATE_RECORDING:
+            return self._pos / self._samples
+        return 0.0
+    def get_data(self):
+        # The recorded data is a view of the preallocated buffer and will be overwritten by the next recording
+        return self._result
+
+    def start(self):
+        self._history_pos = 0
+        self._history_count = 0
+        self._pos = 0
+        self._result = None
+        self._state = self.STATE_WAITING if self._trigger_level > 0.0 else self.STATE_RECORDING
+        self.resume()
+    def stop(self):
+        self.pause()
+        self._state = self.STATE_IDLE
+
+    async def update(self):
+        if self._state == self.STATE_WAITING:
+            block = self._history[self._history_pos:self._history_pos+self._block]
+            self._microphone.read_into(block, False)
+            self._history_pos = (self._history_pos + self._block) % len(self._history)
+            self._history_count = min(self._history_count + self._block, len(self._history))
+            if self._microphone.calculate_level(block, numpy.mean(block)) < self._trigger_level:
+                return
+
+            # Copy the history in order to the start of the recording
+            start = (self._history_pos - self._history_count) % len(self._history)
+            length = min(self._history_count, len(self._history) - start)
+            self._data[:length] = self._history[start:start+length]
+            if length < self._history_count:
+                self._data[length:self._history_count] = self._history[:self._history_count-length]
+            self._pos = self._history_count
+            self._state = self.STATE_RECORDING
+            if self._trigger: self._trigger()
+
+        elif self._state == self.STATE_RECORDING:
+            count = min(self._block, self._samples - self._pos)
+            if count > 0:
+                self._microphone.read_into(self._data[self._pos:self._pos+count], False)
+                self._pos += count
+            if self._pos >= self._samples:
+                self.pause()
+                self._microphone.remove_dc(self._data)
+                self._result = self._microphone.clip(self._data, self._clip_level, self._history_count)
+                self._state = self.STATE_COMPLETE
+                if self._complete: self._complete(self._result)
@@ -11,7 +11,89 @@ from adafruit_midi.note_off import NoteOff
 from adafruit_midi.control_change import ControlChange
 from adafruit_midi.pitch_bend import PitchBend
 from adafruit_midi.program_change import ProgramChange
-from adafruit_midi.midi_message import MIDIUnknownEvent
+
+# Number of data bytes following each status byte, system exclusive and undefined system messages are marked with 0xFF and ignored
+_DATA_LENGTH = bytes([0] * 128 + [2] * 64 + [1] * 32 + [2] * 16 + [0xFF, 1, 2, 1, 0xFF, 0xFF, 0, 0xFF] + [0] * 8)
+
+class _MidiInput:
+    # Raw midi byte stream read in bulk into a preallocated ring buffer and parsed with running status without allocating any message objects
+
+    def __init__(self, port, size:int=256):
+        self._port = port
+        self._polled = hasattr(port, "in_waiting") # busio.UART blocks until timeout when no data is available
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._size = size
+        self._head = 0
+        self._tail = 0
+        self._available = 0
+
+        self._status = 0
+        self._running = 0
+        self._data = bytearray(2)
+        self._count = 0
+        self._length = 0
+
+        self.message = bytearray(3)
+        self._message_views = (memoryview(self.message)[:1], memoryview(self.message)[:2], memoryview(self.message))
+
+    def fill(self):
+        if self._available >= self._size or (self._polled and not self._port.in_waiting):
+            return
+        end = self._size if self._head >= self._tail else self._tail
+        count = self._port.readinto(self._view[self._head:end])
+        if count:
+            self._head = (self._head + count) % self._size
+            self._available += count
+            if self._head == 0 and self._available < self._size:
+                self.fill() # Wrap around to the start of the buffer
+
+    def get_message(self) -> memoryview:
+        return self._message_views[self._length]
+
+    def read(self) -> int:
+        # Returns the status byte of the next complete message or 0 if no message is available, the data bytes are stored in the message buffer
+        while self._available:
+            value = self._buffer[self._tail]
+            self._tail = (self._tail + 1) % self._size
+            self._available -= 1
+
+            if value >= 0xF8: # Real-time messages may appear anywhere and do not affect running status
+                self.message[0] = value
+                self._length = 0
+                return value
+
+            if value & 0x80:
+                self._count = 0
+                if value < 0xF0:
+                    self._running = self._status = value
+                    continue
+                # System common messages cancel running status
+                self._running = self._status = 0
+                length = _DATA_LENGTH[value]
+                if length == 0xFF:
+                    continue
+                if not length:
+                    self.message[0] = value
+                    self._length = 0
+                    return value
+                self._status = value
+                continue
+
+            if not self._status:
+                continue # Skip system exclusive data and data without a status byte
+            self._data[self._count] = value
+            self._count += 1
+            if self._count >= _DATA_LENGTH[self._status]:
+                status = self._status
+                self.message[0] = status
+                self.message[1] = self._data[0]
+                self.message[2] = self._data[1]
+                self._length = self._count
+                self._count = 0
+                self._status = self._running
+                return status
+        return 0
 
 class Midi(Task):
     """Send and receive both hardware UART and USB MIDI messages using :class:`adafruit_midi.MIDI`. UART can be enabled with the `MIDI_UART` variable and USB can be enabled with the `MIDI_USB` variable in `settings.toml`. The midi channel is limited to a single value for both input and output and is determined by the `MIDI_CHANNEL` variable in `settings.toml` with a range of 0-15. However, the channel can be changed once a :class:`pico_synth_sandbox.midi.Midi` object is created by calling the `set_channel` function. By default, the onboard led will be used to indicate incoming midi messages. At the moment, this feature cannot be disabled.
@@ -26,33 +108,49 @@ class Midi(Task):
         self._control_change = None
         self._pitch_bend = None
         self._program_change = None
+        self._clock = None
+        self._start = None
+        self._stop = None
+        self._continue = None
+
+        self._handlers = [None] * 256
+
+        # Pending control change values, consecutive changes of the same control are coalesced into one callback
+        self._control_values = bytearray(128)
+        self._control_pending = bytearray(128)
+        self._control_order = bytearray(128)
+        self._control_count = 0
+        self._realtime = bytearray(1)
 
         if os.getenv("MIDI_UART", 0) > 0:
             self._uart = board.get_uart()
             self._uart_midi = adafruit_midi.MIDI(
-                midi_in=self._uart,
                 midi_out=self._uart,
                 debug=False
             )
+            self._uart_input = _MidiInput(self._uart)
         else:
             self._uart_midi = None
+            self._uart_input = None
 
         if os.getenv("MIDI_USB", 0) > 0:
             import usb_midi
+            self._usb_out = usb_midi.ports[1]
             self._usb_midi = adafruit_midi.MIDI(
-                midi_in=usb_midi.ports[0],
-                midi_out=usb_midi.ports[1],
+                midi_out=self._usb_out,
                 debug=False
             )
+            self._usb_input = _MidiInput(usb_midi.ports[0])
         else:
             self._usb_midi = None
+            self._usb_input = None
 
         self._led = board.get_led()
         self._led.value = False
         self._led_duration = 0.01
         self._led_last = time.monotonic()
 
-        Task.__init__(self, update_frequency=100)
+        Task.__init__(self, update_frequency=100, priority=Task.PRIORITY_HIGH)
 
     def set_note_on(self, callback):
         """Set the callback method you would like to be called when a `adafruit_midi.note_on.NoteOn` message is received.
@@ -61,6 +159,7 @@ class Midi(Task):
         :type callback: function
         """
         self._note_on = callback
+        self._update_handlers()
     def set_note_off(self, callback):
         """Set the callback method you would like to be called when a `adafruit_midi.note_off.NoteOff` message is received.
 
@@ -68,13 +167,15 @@ class Midi(Task):
         :type callback: function
         """
         self._note_off = callback
+        self._update_handlers()
     def set_control_change(self, callback):
         """Set the callback method you would like to be called when a `adafruit_midi.control_change.ControlChange` message is received.
 
-        :param callback: The callback method. Must have 2 parameters for control number and control value (0.0-1.0). Ie: `def control_change(control, value):`.
+        :param callback: The callback method. Must have 2 parameters for control number and control value (0.0-1.0). Ie: `def control_change(control, value):`. Consecutive messages of the same control received within a single update are coalesced and the callback is only called with the final value. Other types of messages are never reordered around control changes.
         :type callback: function
         """
         self._control_change = callback
+        self._update_handlers()
     def set_pitch_bend(self, callback):
         """Set the callback method you would like to be called when a `adafruit_midi.pitch_bend.PitchBend` message is received.
 
@@ -82,6 +183,7 @@ class Midi(Task):
         :type callback: function
         """
         self._pitch_bend = callback
+        self._update_handlers()
     def set_program_change(self, callback):
         """Set the callback method you would like to be called when a `adafruit_midi.program_change.ProgramChange` message is received.
 
@@ -89,6 +191,40 @@ class Midi(Task):
         :type callback: function
         """
         self._program_change = callback
+        self._update_handlers()
+
+    def set_clock(self, callback):
+        """Set the callback method you would like to be called when a midi timing clock message (24 per quarter note) is received. Typically assigned by :func:`pico_synth_sandbox.clock.Clock.set_midi`.
+
+        :param callback: The callback method without any parameters. Ie: `def clock():`.
+        :type callback: function
+        """
+        self._clock = callback
+        self._update_handlers()
+    def set_start(self, callback):
+        """Set the callback method you would like to be called when a midi start message is received.
+
+        :param callback: The callback method without any parameters. Ie: `def start():`.
+        :type callback: function
+        """
+        self._start = callback
+        self._update_handlers()
+    def set_stop(self, callback):
+        """Set the callback method you would like to be called when a midi stop message is received.
+
+        :param callback: The callback method without any parameters. Ie: `def stop():`.
+        :type callback: function
+        """
+        self._stop = callback
+        self._update_handlers()
+    def set_continue(self, callback):
+        """Set the callback method you would like to be called when a midi continue message is received.
+
+        :param callback: The callback method without any parameters. Ie: `def resume():`.
+        :type callback: function
+        """
+        self._continue = callback
+        self._update_handlers()
 
     def set_channel(self, value):
         """Set the midi channel for messages to be received and sent from.
@@ -101,6 +237,7 @@ class Midi(Task):
         else:
             value = clamp(value - 1, 0, 15)
         self._channel = value
+        self._update_handlers()
     def get_channel(self):
         return 0 if self._channel is None else self._channel + 1
     
@@ -114,53 +251,96 @@ class Midi(Task):
     def get_thru(self):
         return self._thru
 
-    def _process_message(self, msg):
-        if not msg:
-            return
-        
-        if self._channel is None or msg.channel == self._channel:
-            if isinstance(msg, NoteOn):
-                if msg.velocity > 0.0:
-                    if self._note_on:
-                        self._note_on(msg.note, msg.velocity / 127.0)
-                elif self._note_off:
-                    self._note_off(msg.note)
-            elif isinstance(msg, NoteOff):
-                if self._note_off:
-                    self._note_off(msg.note)
-            elif isinstance(msg, ControlChange):
-                if self._control_change:
-                    self._control_change(msg.control, msg.value / 127.0)
-            elif isinstance(msg, PitchBend):
-                if self._pitch_bend:
-                    self._pitch_bend((msg.pitch_bend - 8192) / 8192)
-            elif isinstance(msg, ProgramChange):
-                if self._program_change:
-                    self._program_change(msg.patch)
-
-        if self._thru and not isinstance(msg, MIDIUnknownEvent):
-            if self._uart_midi:
-                self._uart_midi.send(msg)
-            if self._usb_midi:
-                self._usb_midi.send(msg)
+    def _update_handlers(self):
+        # Build the dispatch table keyed by status byte, messages on other channels map to None and are ignored
+        for i in range(0x80, 0xF0):
+            self._handlers[i] = None
+        for channel in range(16) if self._channel is None else (self._channel,):
+            if self._note_on or self._note_off:
+                self._handlers[0x90 | channel] = self._handle_note_on
+            if self._note_off:
+                self._handlers[0x80 | channel] = self._handle_note_off
+            if self._control_change:
+                self._handlers[0xB0 | channel] = self._handle_control_change
+            if self._program_change:
+                self._handlers[0xC0 | channel] = self._handle_program_change
+            if self._pitch_bend:
+                self._handlers[0xE0 | channel] = self._handle_pitch_bend
 
-        self._trigger_led()
+        # Real-time messages are not bound to a channel
+        self._handlers[0xF8] = self._handle_clock if self._clock else None
+        self._handlers[0xFA] = self._handle_start if self._start else None
+        self._handlers[0xFB] = self._handle_continue if self._continue else None
+        self._handlers[0xFC] = self._handle_stop if self._stop else None
+
+    def _handle_note_on(self, data1, data2):
+        if data2 > 0:
+            if self._note_on:
+                self._note_on(data1, data2 / 127.0)
+        elif self._note_off:
+            self._note_off(data1)
+    def _handle_note_off(self, data1, data2):
+        self._note_off(data1)
+    def _handle_control_change(self, data1, data2):
+        self._control_values[data1] = data2
+        if not self._control_pending[data1]:
+            self._control_pending[data1] = 1
+            self._control_order[self._control_count] = data1
+            self._control_count += 1
+    def _flush_control_changes(self):
+        for i in range(self._control_count):
+            control = self._control_order[i]
+            self._control_pending[control] = 0
+            if self._control_change:
+                self._control_change(control, self._control_values[control] / 127.0)
+        self._control_count = 0
+    def _handle_program_change(self, data1, data2):
+        self._program_change(data1)
+    def _handle_pitch_bend(self, data1, data2):
+        self._pitch_bend(((data2 << 7 | data1) - 8192) / 8192)
+    def _handle_clock(self, data1, data2):
+        self._clock()
+    def _handle_start(self, data1, data2):
+        self._start()
+    def _handle_continue(self, data1, data2):
+        self._continue()
+    def _handle_stop(self, data1, data2):
+        self._stop()
 
-    def _process_messages(self, midi, limit=32):
-        while limit>0:
-            msg = midi.receive()
-            if not msg:
+    def _process_messages(self, input, limit=32):
+        input.fill()
+        count = 0
+        while count < limit:
+            status = input.read()
+            if not status:
                 break
-            self._process_message(msg)
-            limit = limit - 1
+            handler = self._handlers[status]
+            if handler:
+                if self._control_count and status & 0xF0 != 0xB0 and status < 0xF8:
+                    self._flush_control_changes()
+                handler(input.message[1], input.message[2])
+            if self._thru:
+                self._write(input.get_message())
+            if status < 0xF8:
+                count += 1
+        if count:
+            self._trigger_led()
 
-    async def update(self):
-        """Process any incoming midi messages from the enabled midi devices. Will trigger any pre-defined callbacks if the appropriate messages are received.
-        """
+    def _write(self, data):
         if self._uart_midi:
-            self._process_messages(self._uart_midi)
+            self._uart.write(data)
         if self._usb_midi:
-            self._process_messages(self._usb_midi)
+            self._usb_out.write(data)
+
+    async def update(self):
+        """Process any incoming midi messages from the enabled midi devices. Will trigger any pre-defined callbacks if the appropriate messages are received. Incoming bytes are read in bulk into a ring buffer and up to 32 messages per device are dispatched on each update. Any remaining messages are kept within the buffer for the next update.
+        """
+        if self._uart_input:
+            self._process_messages(self._uart_input)
+        if self._usb_input:
+            self._process_messages(self._usb_input)
+        if self._control_count:
+            self._flush_control_changes()
 
         if self._led.value and time.monotonic() - self._led_last > self._led_duration:
             self._led.value = False
@@ -234,3 +414,26 @@ class Midi(Task):
             clamp(patch, 0, 127),
             channel=channel if not channel is None else self._channel
         ))
+
+    def _send_realtime(self, status):
+        self._realtime[0] = status
+        self._write(self._realtime)
+    def send_clock(self):
+        """Send a midi timing clock message through the enabled midi outputs. Should be sent 24 times per quarter note, see :class:`pico_synth_sandbox.clock.Clock`.
+        """
+        self._send_realtime(0xF8)
+    def send_start(self):
+        """Send a midi start message through the enabled midi outputs.
+        """
+        self._send_realtime(0xFA)
+        self._trigger_led()
+    def send_continue(self):
+        """Send a midi continue message through the enabled midi outputs.
+        """
+        self._send_realtime(0xFB)
+        self._trigger_led()
+    def send_stop(self):
+        """Send a midi stop message through the enabled midi outputs.
+        """
+        self._send_realtime(0xFC)
+        self._trigger_led()
@@ -0,0 +1,112 @@
+# pico_synth_sandbox/pitch.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import ulab.numpy as numpy
+
+MIN_FREQUENCY = 40.0 #: The default lowest frequency in hertz considered by :func:`pico_synth_sandbox.pitch.detect`.
+MAX_FREQUENCY = 2000.0 #: The default highest frequency in hertz considered by :func:`pico_synth_sandbox.pitch.detect`.
+ANALYSIS_RATE = 22050 #: The approximate sample rate that audio data is decimated to before analysis.
+THRESHOLD = 0.15 #: The absolute threshold of the cumulative mean normalized difference used to select the first period candidate.
+MIN_CONFIDENCE = 0.5 #: The lowest confidence returned by :func:`pico_synth_sandbox.pitch.detect` at which audio data is considered pitched. Noise and most drums fall well below this value while tones are typically above 0.75.
+
+def _decimate(data, factor:int, length:int):
+    # Average groups of samples to reduce the sample rate by an integer factor with basic low-pass filtering
+    result = numpy.array(data[0:length*factor:factor], dtype=numpy.float)
+    for i in range(1, factor):
+        result += data[i:length*factor:factor]
+    if factor > 1:
+        result = result / factor
+    return result
+
+def _cumsum(data):
+    # Inclusive prefix sum using a logarithmic number of vectorized additions since ulab doesn't provide cumsum
+    result = numpy.array(data, dtype=numpy.float)
+    shift = 1
+    while shift < len(result):
+        result[shift:] = result[shift:] + result[:-shift]
+        shift *= 2
+    return result
+
+def detect(data, sample_rate:int, min_frequency:float=MIN_FREQUENCY, max_frequency:float=MAX_FREQUENCY, size:int=2048) -> tuple[float, float]:
+    """Estimate the fundamental frequency of audio data using the YIN algorithm. Unlike a spectrum peak, the period based estimate doesn't lock onto harmonics. The data is decimated to roughly :const:`pico_synth_sandbox.pitch.ANALYSIS_RATE` and only a working buffer of up to `size` samples from the middle of the data is analyzed, so the cost is bound regardless of the length of the sample. The analysis window spans at least two periods of the lowest frequency. The difference function is calculated for all lags at once from an FFT cross-correlation and a prefix sum of the signal energy, so there is no loop over each lag.
+
+    :param data: Audio data to analyze.
+    :type data: :class:`ulab.numpy.ndarray`
+    :param sample_rate: The sample rate of the audio data in hertz.
+    :type sample_rate: int
+    :param min_frequency: The lowest frequency to consider in hertz. Defaults to :const:`pico_synth_sandbox.pitch.MIN_FREQUENCY`.
+    :type min_frequency: float
+    :param max_frequency: The highest frequency to consider in hertz. Defaults to :const:`pico_synth_sandbox.pitch.MAX_FREQUENCY`.
+    :type max_frequency: float
+    :param size: The maximum number of decimated samples to analyze. Should be at least three periods of the lowest frequency, otherwise the lowest frequency considered is raised to fit. Defaults to 2048.
+    :type size: int
+    :return: The estimated frequency in hertz and a confidence value from 0.0 (unpitched) to 1.0 (perfectly periodic). The frequency will be `None` if the data is too short or silent.
+    :rtype: tuple[float, float]
+    """
+    factor = max(int(sample_rate // ANALYSIS_RATE), 1)
+    rate = sample_rate / factor
+    max_lag = int(rate / min_frequency) + 1
+    min_lag = max(int(rate / max_frequency), 2)
+
+    # The window must cover two periods of the lowest frequency in addition to the largest lag
+    length = min(size, len(data) // factor)
+    if length < 3 * max_lag + 2:
+        max_lag = (length - 2) // 3
+        if max_lag <= min_lag:
+            return None, 0.0
+    lags = max_lag + 2
+    window = length - lags
+
+    # Take the working buffer from the middle of the data to skip the attack
+    offset = (len(data) - length * factor) // 2
+    buffer = _decimate(data[offset:], factor, length)
+    buffer = buffer - numpy.mean(buffer)
+    peak = numpy.max(abs(buffer))
+    if peak <= 0.0:
+        return None, 0.0
+    buffer = buffer / peak
+
+    # Energy of the window at each lag: e(t) = sum of x(j)^2 for t <= j < t + window
+    squares = _cumsum(buffer * buffer)
+    energy = numpy.array(squares[window-1:window-1+lags])
+    energy[1:] = energy[1:] - squares[:lags-1]
+
+    # Correlation of the window with each lag: r(t) = sum of x(j)x(j+t) for 0 <= j < window, zero padded to avoid wrapping
+    n = 2
+    while n < length:
+        n *= 2
+    padded = numpy.zeros(n)
+    padded[:length] = buffer
+    signal_real, signal_imag = numpy.fft.fft(padded)
+    padded[window:] = 0.0
+    window_real, window_imag = numpy.fft.fft(padded)
+    correlation, imag = numpy.fft.ifft(window_real * signal_real + window_imag * signal_imag, window_real * signal_imag - window_imag * signal_real)
+
+    # Difference function: d(t) = e(0) + e(t) - 2r(t)
+    difference = numpy.clip(energy[0] + energy - 2.0 * correlation[:lags], 0.0, 2.0 * energy[0])
+    difference[0] = 0.0
+
+    # Cumulative mean normalized difference
+    total = _cumsum(difference)
+    normalized = numpy.ones(lags)
+    normalized[1:] = difference[1:] * numpy.arange(1, lags, dtype=numpy.float) / numpy.maximum(total[1:], 1e-9)
+
+    # Select the first dip below the threshold, otherwise the global minimum
+    below = numpy.array(normalized[min_lag:max_lag+1] < THRESHOLD, dtype=numpy.uint8)
+    if numpy.max(below):
+        best = min_lag + int(numpy.argmax(below))
+        while best + 1 <= max_lag and normalized[best + 1] < normalized[best]:
+            best += 1
+    else:
+        best = min_lag + int(numpy.argmin(normalized[min_lag:max_lag+1]))
+
+    # Parabolic interpolation between neighboring lags
+    period = float(best)
+    a, b, c = normalized[best - 1], normalized[best], normalized[best + 1]
+    if a + c - 2.0 * b > 0.0:
+        period += 0.5 * (a - c) / (a + c - 2.0 * b)
+
+    confidence = min(max(1.0 - float(b), 0.0), 1.0)
+    del buffer, squares, energy, padded, signal_real, signal_imag, window_real, window_imag, correlation, imag, difference, total, normalized, below
+    return rate / period, confidence
@@ -0,0 +1,241 @@
+# pico_synth_sandbox/profiler.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import time, struct, array
+
+class TaskProfile:
+    """Execution statistics of a single :class:`pico_synth_sandbox.tasks.Task` object. Update durations are recorded in a histogram of power-of-two buckets in microseconds, ie: bucket 0 counts updates shorter than 1us, bucket 1 counts updates shorter than 2us, bucket 10 counts updates shorter than 1.024ms, etc.
+
+    :param name: The name used to identify the task within reports and logs.
+    :type name: str
+    """
+
+    NUM_BUCKETS = 20 #: The number of histogram buckets. The last bucket holds all updates of 262ms or longer.
+
+    def __init__(self, name:str):
+        """Constructor method
+        """
+        self.name = name
+        self.histogram = array.array('I', [0] * self.NUM_BUCKETS)
+        self.reset()
+
+    def reset(self):
+        """Clear all recorded statistics.
+        """
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.overruns = 0
+        self.jitter_ns = 0
+        self.max_jitter_ns = 0
+        self.slips = 0
+        self.slip_ns = 0
+        self.max_slip_ns = 0
+        self._last_start = None
+        for i in range(self.NUM_BUCKETS):
+            self.histogram[i] = 0
+
+    def record(self, start:int, end:int, period:int):
+        """Record a single update of the task.
+
+        :param start: The start time of the update in nanoseconds.
+        :type start: int
+        :param end: The end time of the update in nanoseconds.
+        :type end: int
+        :param period: The desired time between updates in nanoseconds (the deadline).
+        :type period: int
+        """
+        duration = end - start
+        self.count += 1
+        self.total_ns += duration
+        if duration > self.max_ns:
+            self.max_ns = duration
+        if duration > period:
+            self.overruns += 1
+
+        value = duration // 1000
+        bucket = 0
+        while value and bucket < self.NUM_BUCKETS - 1:
+            value >>= 1
+            bucket += 1
+        self.histogram[bucket] += 1
+
+        if not self._last_start is None:
+            jitter = abs(start - self._last_start - period)
+            self.jitter_ns += jitter
+            if jitter > self.max_jitter_ns:
+                self.max_jitter_ns = jitter
+        self._last_start = start
+
+    def record_slip(self, slip:int):
+        """Record the scheduling slip of a timed sleep, the amount of time that a sleep call woke up after its desired time. Used by :class:`pico_synth_sandbox.timer.Timer`.
+
+        :param slip: The scheduling slip in nanoseconds.
+        :type slip: int
+        """
+        self.slips += 1
+        self.slip_ns += slip
+        if slip > self.max_slip_ns:
+            self.max_slip_ns = slip
+
+    def get_average(self) -> float:
+        """Get the average duration of an update in seconds.
+
+        :return: average update duration
+        :rtype: float
+        """
+        return self.total_ns / self.count / 1000000000 if self.count else 0.0
+
+    def get_average_jitter(self) -> float:
+        """Get the average difference between the desired and actual time between updates in seconds.
+
+        :return: average jitter
+        :rtype: float
+        """
+        return self.jitter_ns / (self.count - 1) / 1000000000 if self.count > 1 else 0.0
+
+    def get_average_slip(self) -> float:
+        """Get the average scheduling slip of timed sleeps in seconds.
+
+        :return: average slip
+        :rtype: float
+        """
+        return self.slip_ns / self.slips / 1000000000 if self.slips else 0.0
+
+class Profiler:
+    """Collect execution statistics of all :class:`pico_synth_sandbox.tasks.Task` objects while the event loop is running. Typically created by calling :func:`pico_synth_sandbox.tasks.enable_profiler`.
+    """
+
+    MAGIC = b"PSSP" #: File identifier of binary logs.
+    VERSION = 1 #: Format version of binary logs.
+    NAME_LENGTH = 16 #: The maximum number of characters of a task name stored within binary logs.
+
+    _HEADER = "<4sBBH"
+    _RECORD = "<16sLQQLQQLQQ"
+
+    def __init__(self):
+        """Constructor method
+        """
+        self._profiles = {}
+        self._start = time.monotonic_ns()
+
+    def get_profile(self, task) -> TaskProfile:
+        """Get the statistics of a task object. A new :class:`pico_synth_sandbox.profiler.TaskProfile` object will be created if the task hasn't been recorded yet.
+
+        :param task: The task object.
+        :type task: :class:`pico_synth_sandbox.tasks.Task`
+        :return: task statistics
+        :rtype: :class:`pico_synth_sandbox.profiler.TaskProfile`
+        """
+        # Keyed by the object rather than its id, which may be reused by another object once the task is freed
+        profile = self._profiles.get(task)
+        if profile is None:
+            profile = self._profiles[task] = TaskProfile(type(task).__name__)
+        return profile
+
+    def remove_profile(self, task):
+        """Discard the statistics of a task object. Called when a task is unregistered so that the profiler doesn't keep the task alive.
+
+        :param task: The task object.
+        :type task: :class:`pico_synth_sandbox.tasks.Task`
+        """
+        if task in self._profiles:
+            del self._profiles[task]
+
+    def get_profiles(self) -> list[TaskProfile]:
+        """Get the statistics of all recorded tasks sorted by total execution time from highest to lowest.
+
+        :return: all task statistics
+        :rtype: list[:class:`pico_synth_sandbox.profiler.TaskProfile`]
+        """
+        profiles = list(self._profiles.values())
+        profiles.sort(key=lambda profile: profile.total_ns, reverse=True)
+        return profiles
+
+    def get_elapsed(self) -> float:
+        """Get the amount of time since the profiler was created or reset in seconds.
+
+        :return: elapsed time
+        :rtype: float
+        """
+        return (time.monotonic_ns() - self._start) / 1000000000
+
+    def reset(self):
+        """Clear the statistics of all recorded tasks.
+        """
+        for profile in self._profiles.values():
+            profile.reset()
+        self._start = time.monotonic_ns()
+
+    def report(self):
+        """Print a summary of all recorded tasks to the console. Tasks are listed by total execution time, so the task most likely to be starving others is listed first. The load column is the percentage of elapsed time spent within each task.
+        """
+        elapsed = max(time.monotonic_ns() - self._start, 1)
+        print("{:<16}{:>8}{:>7}{:>9}{:>9}{:>6}{:>9}{:>9}".format("Task", "Count", "Load", "Avg(ms)", "Max(ms)", "Over", "Jit(ms)", "Slip(ms)"))
+        for profile in self.get_profiles():
+            print("{:<16}{:>8d}{:>6.1f}%{:>9.3f}{:>9.3f}{:>6d}{:>9.3f}{:>9.3f}".format(
+                profile.name[:16],
+                profile.count,
+                profile.total_ns * 100 / elapsed,
+                profile.get_average() * 1000,
+                profile.max_ns / 1000000,
+                profile.overruns,
+                profile.get_average_jitter() * 1000,
+                profile.get_average_slip() * 1000
+            ))
+
+    def dump(self, path:str) -> bool:
+        """Write the statistics of all recorded tasks to a compact binary log file. Each task is stored as a fixed-size little-endian record followed by its histogram buckets. Use :func:`pico_synth_sandbox.profiler.Profiler.load` to read the file.
+
+        :param path: The absolute path of the log file.
+        :type path: str
+        :return: whether or not the file was written successfully
+        :rtype: bool
+        """
+        profiles = self.get_profiles()
+        try:
+            with open(path, "wb") as file:
+                file.write(struct.pack(self._HEADER, self.MAGIC, self.VERSION, TaskProfile.NUM_BUCKETS, len(profiles)))
+                for profile in profiles:
+                    file.write(struct.pack(self._RECORD,
+                        profile.name.encode()[:self.NAME_LENGTH],
+                        profile.count,
+                        profile.total_ns,
+                        profile.max_ns,
+                        profile.overruns,
+                        profile.max_jitter_ns,
+                        profile.jitter_ns,
+                        profile.slips,
+                        profile.max_slip_ns,
+                        profile.slip_ns
+                    ))
+                    file.write(profile.histogram)
+        except OSError:
+            print("Failed to write profiler log: {}".format(path))
+            return False
+        return True
+
+    @staticmethod
+    def load(path:str) -> list[TaskProfile]:
+        """Read task statistics from a binary log file created by :func:`pico_synth_sandbox.profiler.Profiler.dump`.
+
+        :param path: The absolute path of the log file.
+        :type path: str
+        :return: all task statistics within the log, or `None` if the file is invalid
+        :rtype: list[:class:`pico_synth_sandbox.profiler.TaskProfile`]
+        """
+        profiles = []
+        with open(path, "rb") as file:
+            magic, version, buckets, count = struct.unpack(Profiler._HEADER, file.read(struct.calcsize(Profiler._HEADER)))
+            if magic != Profiler.MAGIC or version != Profiler.VERSION or buckets != TaskProfile.NUM_BUCKETS:
+                return None
+            for i in range(count):
+                data = struct.unpack(Profiler._RECORD, file.read(struct.calcsize(Profiler._RECORD)))
+                profile = TaskProfile(data[0].rstrip(b"\0").decode())
+                profile.count, profile.total_ns, profile.max_ns, profile.overruns, profile.max_jitter_ns, profile.jitter_ns, profile.slips, profile.max_slip_ns, profile.slip_ns = data[1:10]
+                histogram = array.array('I', file.read(4 * buckets))
+                for j in range(buckets):
+                    profile.histogram[j] = histogram[j]
+                profiles.append(profile)
+        return profiles
@@ -0,0 +1,249 @@
+# pico_synth_sandbox/samples.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import os, struct, gc
+import ulab.numpy as numpy
+import adafruit_wave
+import pico_synth_sandbox.waveform as waveform
+from pico_synth_sandbox.pitch import detect, MIN_CONFIDENCE
+
+class SampleInfo:
+    """Cached properties and analysis of an audio `.wav` file within a :class:`pico_synth_sandbox.samples.SampleLibrary`. Analysis is performed on the first `frames_analyzed` frames of the file, the same data that is loaded by default by :func:`pico_synth_sandbox.waveform.load_from_file`.
+
+    :param name: The file name of the sample within the library directory.
+    :type name: str
+    """
+
+    def __init__(self, name:str):
+        """Constructor method
+        """
+        self.name = name
+        self.size = 0 #: File size in bytes, used to invalidate the index.
+        self.mtime = 0 #: File modification time, used to invalidate the index.
+        self.sample_rate = 0
+        self.channels = 0
+        self.sample_width = 0
+        self.frames = 0 #: Total number of frames within the file.
+        self.frames_analyzed = 0
+        self.root = 0.0 #: Detected root frequency in hertz, 0.0 if unpitched.
+        self.confidence = 0.0 #: Confidence of the detected root frequency from 0.0 to 1.0.
+        self.peak = 0 #: Absolute peak level of the analyzed frames before normalization.
+        self.loop_start = 0 #: Suggested loop start in frames aligned to a rising zero crossing.
+        self.loop_end = 0 #: Suggested loop end in frames aligned to a rising zero crossing.
+
+    def get_root(self) -> float:
+        """Get the detected root frequency if it is available.
+
+        :return: root frequency in hertz or `None` if the sample is unpitched or the confidence is below :const:`pico_synth_sandbox.pitch.MIN_CONFIDENCE`
+        :rtype: float
+        """
+        return self.root if self.root > 0.0 and self.confidence >= MIN_CONFIDENCE else None
+
+    def get_duration(self) -> float:
+        """Get the length of the whole file in seconds.
+
+        :return: duration
+        :rtype: float
+        """
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+    def get_loop(self, length:int=None) -> tuple[float, float]:
+        """Get the suggested loop points relative to the length of loaded audio data, suitable for :func:`pico_synth_sandbox.voice.sample.Sample.set_loop`.
+
+        :param length: The number of frames loaded. If left as `None`, the number of analyzed frames will be used.
+        :type length: int
+        :return: relative start and end loop points (0.0-1.0)
+        :rtype: tuple[float, float]
+        """
+        if length is None: length = self.frames_analyzed
+        if length <= 0 or self.loop_end <= self.loop_start:
+            return (0.0, 1.0)
+        return (min(self.loop_start / length, 1.0), min(self.loop_end / length, 1.0))
+
+class SampleLibrary:
+    """Index of the audio `.wav` files within a directory (ie: `/samples` or a directory on a mounted sd card). The properties and analysis of each file are stored within a compact binary index file in the same directory so that root frequency detection and loop point analysis only occur once per file. Entries are invalidated when the size or modification time of a file changes. Files are only analyzed when their information is first requested.
+
+    :param path: The absolute path to the directory of samples. Defaults to "/samples".
+    :type path: str
+    :param max_samples: The number of frames of each file to analyze. Defaults to 4096 frames.
+    :type max_samples: int
+    """
+
+    INDEX_FILE = ".index" #: The name of the index file stored within the sample directory.
+    MAGIC = b"PSSI" #: File identifier of index files.
+    VERSION = 1 #: Format version of index files.
+
+    _HEADER = "<4sBH"
+    _RECORD = "<LLLBBLLffHLL"
+
+    def __init__(self, path:str="/samples", max_samples:int=4096):
+        """Constructor method
+        """
+        self._path = path.rstrip("/")
+        self._max_samples = max_samples
+        self._info = {}
+        self._dirty = False
+        self._files = []
+        self.refresh()
+
+    def get_path(self, name:str) -> str:
+        """Get the absolute path of a sample file within the library.
+
+        :param name: The file name of the sample.
+        :type name: str
+        :return: absolute path
+        :rtype: str
+        """
+        return self._path + "/" + name
+
+    def get_files(self) -> list[str]:
+        """Get the file names of all samples within the library sorted alphabetically.
+
+        :return: list of file names
+        :rtype: list[str]
+        """
+        return self._files
+
+    def refresh(self):
+        """Read the index file and scan the directory for `.wav` files. Index entries of missing files are removed, and entries of files which have been modified are discarded to be analyzed again when requested.
+        """
+        self._read_index()
+        try:
+            self._files = sorted([name for name in os.listdir(self._path) if name[-4:].lower() == ".wav"])
+        except OSError:
+            self._files = []
+        for name in list(self._info.keys()):
+            if not name in self._files:
+                del self._info[name]
+                self._dirty = True
+        for name in self._files:
+            info = self._info.get(name)
+            if not info is None:
+                size, mtime = self._stat(name)
+                if info.size != size or info.mtime != mtime:
+                    del self._info[name]
+                    self._dirty = True
+
+    def _stat(self, name:str) -> tuple[int, int]:
+        stat = os.stat(self.get_path(name))
+        return (stat[6], int(stat[8]))
+
+    def get_info(self, name:str, save:bool=True) -> SampleInfo:
+        """Get the information of a sample file. If the file isn't within the index, it will be analyzed and the index will be updated.
+
+        :param name: The file name of the sample.
+        :type name: str
+        :param save: Whether or not to write the index file immediately if the file was analyzed. Defaults to `True`.
+        :type save: bool
+        :return: sample information or `None` if the file is not within the library or its format isn't supported by :func:`pico_synth_sandbox.waveform.load_from_file`
+        :rtype: :class:`pico_synth_sandbox.samples.SampleInfo`
+        """
+        if not name in self._files:
+            return None
+        info = self._info.get(name)
+        if info is None:
+            info = self._analyze(name)
+            if info is None:
+                return None
+            self._info[name] = info
+            self._dirty = True
+            if save:
+                self.save()
+        return info
+
+    def analyze_all(self):
+        """Analyze all files which aren't already within the index and write the index file once complete. Useful to build the index ahead of time.
+        """
+        for name in self._files:
+            self.get_info(name, False)
+        self.save()
+
+    def load(self, name:str, max_samples:int=None) -> tuple[numpy.ndarray, int, SampleInfo]:
+        """Load the normalized audio data of a sample file along with its cached information without repeating any analysis.
+
+        :param name: The file name of the sample.
+        :type name: str
+        :param max_samples: The maximum number of frames to load. If left as `None`, the analysis length of the library will be used.
+        :type max_samples: int
+        :return: A tuple of the audio data, the sample rate and the sample information. The audio data and sample information will be `None` if the file isn't within the library or its format isn't supported.
+        :rtype: tuple[:class:`ulab.numpy.ndarray`, int, :class:`pico_synth_sandbox.samples.SampleInfo`]
+        """
+        info = self.get_info(name)
+        if info is None:
+            return None, 0, None
+        result = waveform.load_from_file(self.get_path(name), self._max_samples if max_samples is None else max_samples)
+        if not result:
+            return None, 0, None
+        return result[0], result[1], info
+
+    def _analyze(self, name:str) -> SampleInfo:
+        info = SampleInfo(name)
+        info.size, info.mtime = self._stat(name)
+        result = waveform.load_from_file(self.get_path(name), self._max_samples, normalize=False)
+        if not result:
+            return None
+        data, sample_rate = result
+        with adafruit_wave.open(self.get_path(name), "rb") as wave:
+            info.sample_rate = wave.getframerate()
+            info.channels = wave.getnchannels()
+            info.sample_width = wave.getsampwidth()
+            info.frames = wave.getnframes()
+        info.frames_analyzed = len(data)
+        info.peak = max(int(numpy.max(data)), -int(numpy.min(data)))
+        root, info.confidence = detect(data, sample_rate)
+        info.root = root if not root is None else 0.0
+
+        # Suggest loop points at rising zero crossings after the attack and before the end of the data
+        if len(data) > 8:
+            rising = (data[:-1] < 0) * (data[1:] >= 0)
+            offset = len(data) // 4
+            start = offset + int(numpy.argmax(rising[offset:]))
+            end = len(rising) - 1 - int(numpy.argmax(rising[::-1]))
+            if rising[start] and rising[end] and end - start > 2:
+                info.loop_start = start + 1
+                info.loop_end = end + 1
+            del rising
+
+        del data
+        gc.collect()
+        return info
+
+    def _read_index(self):
+        self._info = {}
+        self._dirty = False
+        try:
+            with open(self.get_path(self.INDEX_FILE), "rb") as file:
+                magic, version, count = struct.unpack(self._HEADER, file.read(struct.calcsize(self._HEADER)))
+                if magic != self.MAGIC or version != self.VERSION:
+                    self._dirty = True
+                    return
+                for i in range(count):
+                    info = SampleInfo(file.read(file.read(1)[0]).decode())
+                    info.size, info.mtime, info.sample_rate, info.channels, info.sample_width, info.frames, info.frames_analyzed, info.root, info.confidence, info.peak, info.loop_start, info.loop_end = struct.unpack(self._RECORD, file.read(struct.calcsize(self._RECORD)))
+                    self._info[info.name] = info
+        except (OSError, ValueError, IndexError, struct.error):
+            self._info = {}
+            self._dirty = True
+
+    def save(self) -> bool:
+        """Write the index file if any entries have changed. The file system must be writable, see `boot.py`.
+
+        :return: whether or not the index is up to date on the file system
+        :rtype: bool
+        """
+        if not self._dirty:
+            return True
+        try:
+            with open(self.get_path(self.INDEX_FILE), "wb") as file:
+                file.write(struct.pack(self._HEADER, self.MAGIC, self.VERSION, len(self._info)))
+                for info in self._info.values():
+                    name = info.name.encode()[:255]
+                    file.write(bytes((len(name),)))
+                    file.write(name)
+                    file.write(struct.pack(self._RECORD, info.size, info.mtime, info.sample_rate, info.channels, info.sample_width, info.frames, info.frames_analyzed, info.root, info.confidence, info.peak, info.loop_start, info.loop_end))
+        except OSError:
+            print("Failed to write sample index: {}".format(self.get_path(self.INDEX_FILE)))
+            return False
+        self._dirty = False
+        return True
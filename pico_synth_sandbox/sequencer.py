@@ -6,16 +6,29 @@ from pico_synth_sandbox import clamp
 from pico_synth_sandbox.timer import Timer
 
 class Sequencer(Timer):
-    """Sequence notes using the :class:`pico_synth_sandbox.timer.Timer` class to create a multi-track sixteenth note sequencer. By default, the Sequencer is set up for a single 4/4 measure of 16 notes with one track. Each note of each track can be assigned any note value and velocity. The length and number of tracks can be reassigned during runtime.
+    """Sequence notes using the :class:`pico_synth_sandbox.timer.Timer` class to create a multi-track sixteenth note sequencer. By default, the Sequencer is set up for a single 4/4 measure of 16 notes with one track. Each note of each track can be assigned any note value, velocity and gate. The length and number of tracks can be reassigned during runtime.
+
+    Step data of all patterns is stored within a single `bytearray` of 4 bytes per step (note, velocity, gate and flags) so that access is constant time and the memory footprint is explicit: `patterns * max_tracks * max_length * 4` bytes. For example, 16 patterns of 16 tracks with 64 steps use 64KB. Changing the length or number of tracks within the allocated maximums doesn't allocate any memory.
 
     :param length: The number of sixteenth note steps of each track. The minimum value allowed is 1.
     :type length: int
     :param tracks: The number of tracks to create and sequence. The minimum value allowed is 1.
     :type tracks: int
-    :param bpm: The beats per minute of timer.
+    :param bpm: The beats per minute of the master clock. If left as `None`, the current tempo of the master clock is used.
     :type bpm: int
+    :param patterns: The number of patterns within the bank. The minimum value allowed is 1.
+    :type patterns: int
+    :param max_length: The number of steps allocated for each track. If left as `None`, the initial length will be used. The storage will be reallocated if a larger length is set.
+    :type max_length: int
+    :param max_tracks: The number of tracks allocated for each pattern. If left as `None`, the initial number of tracks will be used. The storage will be reallocated if more tracks are set.
+    :type max_tracks: int
     """
-    def __init__(self, length=16, tracks=1, bpm=120):
+
+    STEP_SIZE = 4 #: The number of bytes used by each step.
+    FLAG_NOTE = 0x01 #: Step flag which indicates that the step contains a note.
+    FLAG_TIE = 0x02 #: Step flag which indicates that the note is held into the following step. If the following step has the same note, it continues without being pressed again. The remaining bits of the flags byte are available for application use.
+
+    def __init__(self, length=16, tracks=1, bpm=None, patterns=1, max_length=None, max_tracks=None):
         Timer.__init__(self,
             bpm=bpm,
             steps=Timer.STEP_SIXTEENTH
@@ -23,22 +36,53 @@ class Sequencer(Timer):
 
         self._length = max(length, 1)
         self._tracks = max(tracks, 1)
-        self._data = [[None for j in range(self._length)] for i in range(self._tracks)]
+        self._patterns = max(patterns, 1)
+        self._max_length = max(self._length, max_length or 0)
+        self._max_tracks = max(self._tracks, max_tracks or 0)
+        self._data = bytearray(self._patterns * self._max_tracks * self._max_length * Sequencer.STEP_SIZE)
+        self._pattern = 0
+        self._next_pattern = 0
         self._pos = 0
 
+    def _resize(self, max_length, max_tracks):
+        data = bytearray(self._patterns * max_tracks * max_length * Sequencer.STEP_SIZE)
+        length = min(self._max_length, max_length) * Sequencer.STEP_SIZE
+        for pattern in range(self._patterns):
+            for track in range(min(self._max_tracks, max_tracks)):
+                source = ((pattern * self._max_tracks + track) * self._max_length) * Sequencer.STEP_SIZE
+                destination = ((pattern * max_tracks + track) * max_length) * Sequencer.STEP_SIZE
+                data[destination:destination+length] = self._data[source:source+length]
+        self._data = data
+        self._max_length = max_length
+        self._max_tracks = max_tracks
+
+    def _get_offset(self, position, track, pattern=None):
+        if pattern is None: pattern = self._pattern
+        return ((pattern * self._max_tracks + track) * self._max_length + position) * Sequencer.STEP_SIZE
+
+    def get_memory_usage(self):
+        """Get the number of bytes allocated to store the step data of all patterns.
+
+        :return: memory usage in bytes
+        :rtype: int
+        """
+        return len(self._data)
+
     def set_length(self, value):
-        """Set the number of sixteenth notes for each track. If the length is shortened, all of the step data beyond the new length will be deleted, and if the sequencer is also currently running, it should loop back around automatically to the start of the track data.
+        """Set the number of sixteenth notes for each track. If the length is shortened, all of the step data beyond the new length will be cleared, and if the sequencer is also currently running, it should loop back around automatically to the start of the track data.
 
         :param value: The number of sixteenth note steps of each track. The minimum value allowed is 1.
         :type value: int
         """
         value = max(value, 1)
-        if value > self._length:
-            for i in range(self._tracks):
-                self._data[i] = self._data[i] + [None for j in range(value - self._length)]
+        if value > self._max_length:
+            self._resize(value, self._max_tracks)
         elif value < self._length:
-            for i in range(self._tracks):
-                del self._data[i][value:]
+            for pattern in range(self._patterns):
+                for track in range(self._tracks):
+                    offset = self._get_offset(value, track, pattern)
+                    for i in range(offset, self._get_offset(self._length, track, pattern)):
+                        self._data[i] = 0
         self._length = value
     def get_length(self):
         """Get the number of sixteenth notes for each track.
@@ -49,16 +93,18 @@ class Sequencer(Timer):
         return self._length
 
     def set_tracks(self, value):
-        """Set the number of note tracks to sequence. If the number of tracks is shortened, the tracks at an index greater to or equal than the number will be deleted. If a larger number of tracks is provided, the newly created tracks will be empty.
+        """Set the number of note tracks to sequence. If the number of tracks is shortened, the tracks at an index greater to or equal than the number will be cleared. If a larger number of tracks is provided, the newly created tracks will be empty.
 
         :param value: The number of tracks to sequence. The minimum value allowed is 1.
         :type value: int
         """
         value = max(value, 1)
-        if value > self._tracks:
-            self._data = self._data + [[None for j in range(self._length)] for i in range(value - self._tracks)]
+        if value > self._max_tracks:
+            self._resize(self._max_length, value)
         elif value < self._tracks:
-            del self._data[value:]
+            for pattern in range(self._patterns):
+                for i in range(self._get_offset(0, value, pattern), self._get_offset(0, self._tracks, pattern)):
+                    self._data[i] = 0
         self._tracks = value
     def get_tracks(self):
         """Get the number tracks being sequenced.
@@ -68,6 +114,55 @@ class Sequencer(Timer):
         """
         return self._tracks
 
+    def get_patterns(self):
+        """Get the number of patterns within the bank.
+
+        :return: pattern count
+        :rtype: int
+        """
+        return self._patterns
+    def set_pattern(self, index, immediate=False):
+        """Select the pattern to sequence. If the sequencer is running, the pattern will change once the current pattern reaches its end unless `immediate` is set.
+
+        :param index: Index of the pattern (0-based). Will be limited to the pattern count.
+        :type index: int
+        :param immediate: Whether or not to change the pattern at the next step rather than the end of the current pattern.
+        :type immediate: bool
+        """
+        self._next_pattern = clamp(index, 0, self._patterns - 1)
+        if immediate or not self.is_enabled():
+            self._pattern = self._next_pattern
+    def get_pattern(self):
+        """Get the index of the pattern which is currently being sequenced.
+
+        :return: pattern index
+        :rtype: int
+        """
+        return self._pattern
+    def copy_pattern(self, source, destination):
+        """Copy all step data from one pattern to another.
+
+        :param source: Index of the pattern to copy from.
+        :type source: int
+        :param destination: Index of the pattern to copy to.
+        :type destination: int
+        """
+        size = self._max_tracks * self._max_length * Sequencer.STEP_SIZE
+        source = clamp(source, 0, self._patterns - 1) * size
+        destination = clamp(destination, 0, self._patterns - 1) * size
+        if source != destination:
+            self._data[destination:destination+size] = self._data[source:source+size]
+    def clear_pattern(self, pattern=None):
+        """Remove all notes from a pattern.
+
+        :param pattern: Index of the pattern. If left as `None`, the current pattern will be cleared.
+        :type pattern: int
+        """
+        if pattern is None: pattern = self._pattern
+        pattern = clamp(pattern, 0, self._patterns - 1)
+        for i in range(self._get_offset(0, 0, pattern), self._get_offset(0, self._max_tracks, pattern)):
+            self._data[i] = 0
+
     def get_position(self):
         """Get the current position of the sequencer within the track length (0-based).
 
@@ -76,8 +171,8 @@ class Sequencer(Timer):
         """
         return self._pos
 
-    def set_note(self, position, notenum, velocity=1.0, track=0):
-        """Set the note value and velocity of a track at a specific step index.
+    def set_note(self, position, notenum, velocity=1.0, track=0, gate=0.0, pattern=None, tie=False):
+        """Set the note value, velocity, gate and tie of a track at a specific step index.
 
         :param position: Index of the step (0-based). Will be limited to the track length.
         :type position: int
@@ -87,61 +182,138 @@ class Sequencer(Timer):
         :type velocity: float
         :param track: Index of the track (0-based). Will be limited to the track count.
         :type track: int
+        :param gate: The duration of the note within the step as a ratio from 0.0 to 1.0. A value of 0.0 will use the gate of the timer.
+        :type gate: float
+        :param pattern: Index of the pattern (0-based). If left as `None`, the current pattern will be used.
+        :type pattern: int
+        :param tie: Whether or not to hold the note into the following step, see :const:`pico_synth_sandbox.sequencer.Sequencer.FLAG_TIE`. The gate of the last step of a tie is used.
+        :type tie: bool
         """
-        track = clamp(track, 0, self._tracks)
-        position = clamp(position, 0, self._length)
-        self._data[track][position] = (notenum, velocity)
-    def get_note(self, position, track=0):
+        offset = self._get_offset(clamp(position, 0, self._length - 1), clamp(track, 0, self._tracks - 1), pattern)
+        self._data[offset] = clamp(notenum, 0, 127)
+        self._data[offset+1] = int(clamp(velocity) * 127.0)
+        self._data[offset+2] = int(clamp(gate) * 255.0)
+        if tie:
+            self._data[offset+3] |= Sequencer.FLAG_NOTE | Sequencer.FLAG_TIE
+        else:
+            self._data[offset+3] = (self._data[offset+3] | Sequencer.FLAG_NOTE) & ~Sequencer.FLAG_TIE
+    def get_note(self, position, track=0, pattern=None):
         """Get the note data for a specified track and step position. If a note isn't defined at specific index, a value of `None` will be returned.
 
         :param position: Index of the step (0-based). Will be limited to the track length.
         :type position: int
         :param track: Index of the track (0-based). Will be limited to the track count.
         :type track: int
+        :param pattern: Index of the pattern (0-based). If left as `None`, the current pattern will be used.
+        :type pattern: int
         :return: note data (notenum, velocity)
         :rtype: tuple
         """
-        track = clamp(track, 0, self._tracks)
-        position = clamp(position, 0, self._length)
-        return self._data[track][position]
-    def has_note(self, position, track=0):
+        offset = self._get_offset(clamp(position, 0, self._length - 1), clamp(track, 0, self._tracks - 1), pattern)
+        if not self._data[offset+3] & Sequencer.FLAG_NOTE:
+            return None
+        return (self._data[offset], self._data[offset+1] / 127.0)
+    def get_gate(self, position, track=0, pattern=None):
+        """Get the gate of a note for a specified track and step position.
+
+        :param position: Index of the step (0-based). Will be limited to the track length.
+        :type position: int
+        :param track: Index of the track (0-based). Will be limited to the track count.
+        :type track: int
+        :param pattern: Index of the pattern (0-based). If left as `None`, the current pattern will be used.
+        :type pattern: int
+        :return: gate ratio from 0.0 to 1.0, 0.0 if the gate of the timer is used
+        :rtype: float
+        """
+        offset = self._get_offset(clamp(position, 0, self._length - 1), clamp(track, 0, self._tracks - 1), pattern)
+        return self._data[offset+2] / 255.0
+    def is_tied(self, position, track=0, pattern=None):
+        """Check whether or not the note of a specific step within a track is held into the following step.
+
+        :param position: Index of the step (0-based). Will be limited to the track length.
+        :type position: int
+        :param track: Index of the track (0-based). Will be limited to the track count.
+        :type track: int
+        :param pattern: Index of the pattern (0-based). If left as `None`, the current pattern will be used.
+        :type pattern: int
+        :return: if the track step is tied
+        :rtype: bool
+        """
+        offset = self._get_offset(clamp(position, 0, self._length - 1), clamp(track, 0, self._tracks - 1), pattern)
+        return self._data[offset+3] & Sequencer.FLAG_TIE > 0
+    def has_note(self, position, track=0, pattern=None):
         """Check whether or note a specific step within a track has been set with note data.
 
         :param position: Index of the step (0-based). Will be limited to the track length.
         :type position: int
         :param track: Index of the track (0-based). Will be limited to the track count.
         :type track: int
+        :param pattern: Index of the pattern (0-based). If left as `None`, the current pattern will be used.
+        :type pattern: int
         :return: if the track step has a note
         :rtype: bool
         """
-        return not self.get_note(position, track) is None
-    def remove_note(self, position, track=0):
+        offset = self._get_offset(clamp(position, 0, self._length - 1), clamp(track, 0, self._tracks - 1), pattern)
+        return self._data[offset+3] & Sequencer.FLAG_NOTE > 0
+    def remove_note(self, position, track=0, pattern=None):
         """Remove the note data as a specific step within a track.
 
         :param position: Index of the step (0-based). Will be limited to the track length.
         :type position: int
         :param track: Index of the track (0-based). Will be limited to the track count.
         :type track: int
+        :param pattern: Index of the pattern (0-based). If left as `None`, the current pattern will be used.
+        :type pattern: int
         """
-        track = clamp(track, 0, self._tracks)
-        position = clamp(position, 0, self._length)
-        self._data[track][position] = None
+        offset = self._get_offset(clamp(position, 0, self._length - 1), clamp(track, 0, self._tracks - 1), pattern)
+        for i in range(Sequencer.STEP_SIZE):
+            self._data[offset+i] = 0
 
     def get_track(self, track=0):
-        """Get list of note data for a specified track index (0-based). If the track isn't available, a value of `None` will be returned.
+        """Get list of note data for a specified track index (0-based) of the current pattern. If the track isn't available, a value of `None` will be returned. The list is built on request and modifying it doesn't affect the sequence.
 
-        :return: track data list of note tuples as (notenum, velocity)
+        :return: track data list of note tuples as (notenum, velocity) or `None` for empty steps
         :rtype: list
         """
         if track < 0 or track >= self._tracks: return None
-        return self._data[track]
+        return [self.get_note(i, track) for i in range(self._length)]
 
     def _update(self):
         self._pos = (self._pos+1) % self._length
+        if self._pos == 0:
+            self._pattern = self._next_pattern
+        data = self._data
+        offset = self._get_offset(self._pos, 0)
+        previous = self._get_offset((self._pos - 1) % self._length, 0)
+        stride = self._max_length * Sequencer.STEP_SIZE
         for i in range(self._tracks):
-            note = self._data[i][self._pos]
-            if note and note[0] > 0 and note[1] > 0:
-                self._do_press(note[0], note[1])
+            if data[offset+3] & Sequencer.FLAG_NOTE and data[offset] > 0 and data[offset+1] > 0:
+                # Notes tied from the previous step are already held
+                if not (data[previous+3] & Sequencer.FLAG_TIE and data[previous+3] & Sequencer.FLAG_NOTE and data[previous] == data[offset]):
+                    self._do_press(data[offset], data[offset+1] / 127.0, self._get_duration(self._pos, i))
+            offset += stride
+            previous += stride
+
+    def _get_duration(self, position, track):
+        # Each note is released independently after its own gate, extended through any following tied steps of the same note
+        data = self._data
+        offset = self._get_offset(position, track)
+        notenum = data[offset]
+        steps = 0
+        for i in range(self._length - 1):
+            if not data[offset+3] & Sequencer.FLAG_TIE:
+                break
+            steps += 1
+            position = (position + 1) % self._length
+            offset = self._get_offset(position, track)
+            if not data[offset+3] & Sequencer.FLAG_NOTE or data[offset] != notenum:
+                return steps * self._step_time
+        gate = data[offset+2]
+        return (steps + (gate / 255.0 if gate else self._gate)) * self._step_time
+
+    def _start(self):
+        # Play the first step on the next tick after the clock is started
+        self._pos = self._length - 1
 
     def _do_step(self):
         if self._step:
@@ -2,7 +2,8 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-import os
+import os, math, time
+from pico_synth_sandbox import LOG_2
 from pico_synth_sandbox.tasks import Task
 from pico_synth_sandbox.voice import Voice
 import synthio
@@ -13,6 +14,9 @@ class Synth(Task):
     FILTER_HPF  = 1
     FILTER_BPF  = 2
 
+    FILTER_FREQUENCY_STEPS = 24 # Quantization steps per octave of cached filter frequencies
+    FILTER_RESONANCE_STEPS = 8 # Quantization steps per unit of cached filter resonance
+
     def __init__(self, audio=None):
         sample_rate = os.getenv("AUDIO_RATE", 22050)
         if audio is not None: sample_rate = audio.get_sample_rate()
@@ -23,18 +27,79 @@ class Synth(Task):
         if audio is not None: audio.play(self._synth)
 
         self.voices = []
+        self._block_refs = {} # Reference count of each registered block by id
+        self._shared = {} # Objects shared between the voices of this synth, ie: global lfos
+
+        self._patch_committed = False
+        self._patch_fade = None
+        self._patch_fades = [] # Voices being faded out before applying a patch
+        self._patch_time = 0.0
+
+        self._filter_cache = {}
+        self._filter_order = []
+        self._filter_cache_size = os.getenv("FILTER_CACHE", 32)
+        self._filter_hits = 0
+        self._filter_misses = 0
 
         Task.__init__(self, update_frequency=15)
 
     def add_voice(self, voice):
         self.voices.append(voice)
+        voice.bind(self)
         for block in voice.get_blocks():
-            self._synth.blocks.append(block)
+            self.append(block)
     def add_voices(self, voices):
         for voice in voices:
             self.add_voice(voice)
+    def remove_voice(self, voice):
+        # Releases the voice immediately and unregisters any of its blocks which aren't shared with other voices
+        if isinstance(voice, int):
+            voice = self.voices[voice % len(self.voices)]
+        if not voice in self.voices:
+            return False
+        self.voices.remove(voice)
+        self._synth.release(voice.get_notes())
+        for block in voice.get_blocks():
+            self.remove(block)
+        return True
+    def replace_voice(self, index, voice):
+        # Swap the voice at an index while keeping the order of voices used by the keyboard
+        index = index % len(self.voices)
+        previous = self.voices[index]
+        voice.bind(self)
+        for block in voice.get_blocks():
+            self.append(block)
+        self._synth.release(previous.get_notes())
+        for block in previous.get_blocks():
+            self.remove(block)
+        self.voices[index] = voice
+        return previous
+
+    def share(self, key, value):
+        # Returns the object shared by voices of this synth under the key, the provided value is stored if there isn't one yet
+        return self._shared.setdefault(key, value)
 
     def build_filter(self, type, frequency, resonance):
+        # Filters are shared between voices and quantized by type, log-frequency and resonance so that modulation reuses existing objects
+        frequency = round(math.log(max(frequency, 1.0)) / LOG_2 * Synth.FILTER_FREQUENCY_STEPS)
+        resonance = round(resonance * Synth.FILTER_RESONANCE_STEPS)
+        key = (type << 20) | (frequency << 10) | resonance
+        filter = self._filter_cache.get(key)
+        if filter is None:
+            self._filter_misses += 1
+            while self._filter_order and len(self._filter_order) >= self._filter_cache_size:
+                del self._filter_cache[self._filter_order.pop(0)]
+            filter = self._build_filter(type, math.pow(2.0, frequency / Synth.FILTER_FREQUENCY_STEPS), resonance / Synth.FILTER_RESONANCE_STEPS)
+            if self._filter_cache_size > 0:
+                self._filter_cache[key] = filter
+                self._filter_order.append(key)
+        else:
+            self._filter_hits += 1
+            if self._filter_order[-1] != key:
+                self._filter_order.remove(key)
+                self._filter_order.append(key)
+        return filter
+    def _build_filter(self, type, frequency, resonance):
         if type == Synth.FILTER_LPF:
             return self._synth.low_pass_filter(frequency, resonance)
         elif type == Synth.FILTER_HPF:
@@ -42,14 +107,53 @@ class Synth(Task):
         else: #type == Synth.FILTER_BPF:
             return self._synth.band_pass_filter(frequency, resonance)
 
+    def set_filter_cache_size(self, value):
+        # Maximum number of filter objects kept by build_filter, 0 disables caching
+        self._filter_cache_size = max(int(value), 0)
+        self.clear_filter_cache()
+    def get_filter_cache_size(self):
+        return self._filter_cache_size
+    def clear_filter_cache(self):
+        self._filter_cache = {}
+        self._filter_order = []
+        self._filter_hits = 0
+        self._filter_misses = 0
+    def get_filter_cache_stats(self):
+        # Returns (hits, misses, number of cached filters)
+        return (self._filter_hits, self._filter_misses, len(self._filter_order))
+
     def append(self, block):
-        self._synth.blocks.append(block)
+        # Shared blocks such as global lfos are only registered and processed once
+        key = id(block)
+        count = self._block_refs.get(key, 0)
+        if not count:
+            self._synth.blocks.append(block)
+        self._block_refs[key] = count + 1
+    def remove(self, block):
+        key = id(block)
+        count = self._block_refs.get(key, 0)
+        if not count:
+            return False
+        if count > 1:
+            self._block_refs[key] = count - 1
+        else:
+            del self._block_refs[key]
+            self._synth.blocks.remove(block)
+        return True
+    def has_block(self, block):
+        return id(block) in self._block_refs
+    def get_block_count(self):
+        return len(self._synth.blocks)
     def press(self, voice=0, notenum=1, velocity=1.0):
         if isinstance(voice, int) and len(self.voices) > 0:
             voice = self.voices[voice % len(self.voices)]
         if isinstance(voice, synthio.Note):
             self._synth.press(voice)
-        elif isinstance(voice, Voice) and voice.press(notenum, velocity):
+        elif isinstance(voice, Voice):
+            if self._patch_committed and voice.is_staging(): # Note boundary
+                self._apply_patch(voice)
+            if not voice.press(notenum, velocity):
+                return False
             self._synth.press(voice.get_notes())
         else:
             return False
@@ -68,6 +172,78 @@ class Synth(Task):
             return False
         return True
 
+    def get_level(self, voice=0):
+        if isinstance(voice, int) and len(self.voices) > 0:
+            voice = self.voices[voice % len(self.voices)]
+        level = 0.0
+        if isinstance(voice, Voice):
+            for note in voice.get_notes():
+                state, value = self._synth.note_info(note)
+                if not state is None and value > level:
+                    level = value
+        return level
+
+    # Patch
+    def begin_patch(self):
+        # Parameter changes made through Voice.stage (ie: menu items and preset banks) are held by each voice until the patch is committed
+        self._patch_committed = False
+        for voice in self.voices:
+            voice.begin_patch()
+    def commit_patch(self, fade=None):
+        # Each voice swaps to its staged parameters at its next note boundary: immediately if it is silent, before its next press, or once its release has finished. If a fade time (in seconds) is provided, held notes are faded out to silence over that time and then pressed again with the new parameters and a new attack. This is a dip rather than a crossfade since the old and new notes never overlap.
+        self._patch_committed = True
+        self._patch_fade = fade
+        self._patch_time = time.monotonic()
+        for voice in self.voices:
+            if not voice.is_staging():
+                continue
+            if self.get_level(voice) <= 0.0:
+                self._apply_patch(voice)
+            elif not fade is None and voice.is_pressed():
+                self._fade_voice(voice, fade)
+        self._update_patch()
+    def is_patch_pending(self):
+        return self._patch_committed
+    def _fade_voice(self, voice, duration):
+        # Release the notes with a short release time while the voice remains logically pressed
+        for note in voice.get_notes():
+            envelope = note.envelope
+            if not envelope is None:
+                note.envelope = synthio.Envelope(
+                    attack_time=envelope.attack_time,
+                    decay_time=envelope.decay_time,
+                    release_time=duration,
+                    attack_level=envelope.attack_level,
+                    sustain_level=envelope.sustain_level
+                )
+        self._synth.release(voice.get_notes())
+        self._patch_fades.append(voice)
+    def _apply_patch(self, voice):
+        if voice in self._patch_fades:
+            self._patch_fades.remove(voice)
+        voice.apply_patch()
+    def _update_patch(self):
+        if not self._patch_committed:
+            return
+        faded = time.monotonic() - self._patch_time >= (self._patch_fade or 0.0)
+        pending = False
+        for voice in self.voices:
+            if not voice.is_staging():
+                continue
+            if voice in self._patch_fades:
+                if faded:
+                    self._apply_patch(voice)
+                    if voice.retrigger(): # Press the held note again with the new patch
+                        self._synth.press(voice.get_notes())
+                else:
+                    pending = True
+            elif self.get_level(voice) <= 0.0:
+                self._apply_patch(voice)
+            else:
+                pending = True
+        if not pending:
+            self._patch_committed = False
+
     def set_waveform(self, waveform):
         for voice in self.voices:
             voice.set_waveform(waveform)
@@ -96,5 +272,6 @@ class Synth(Task):
 
     # Loop
     async def update(self):
+        self._update_patch()
         for voice in self.voices:
             await voice.update(self)
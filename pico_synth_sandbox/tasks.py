@@ -8,13 +8,19 @@ from pico_synth_sandbox import clamp
 _tasks = []
 _loop = None
 _running = False
+_profiler = None
+_scheduler = None
+_scheduler_tick = 0
+_coalesce_time = 0.002
+_event_dispatcher = None
 
 def get_loop(reset:bool=False):
-    global _loop
+    global _loop, _scheduler
     if reset and not _loop is None:
         _loop.stop()
     if reset or _loop is None:
         _loop = asyncio.new_event_loop()
+        _scheduler = None
     return _loop
 def reset_loop():
     cancel_tasks()
@@ -23,15 +29,28 @@ def register_task(task):
     global _tasks
     if not task in _tasks:
         _tasks.append(task)
-    return get_loop().create_task(task.loop())
+        _tasks.sort(key=lambda task: task._async_priority)
+    if not task._async_scheduled:
+        return get_loop().create_task(task.loop())
+    return _get_scheduler()
+def unregister_task(task):
+    global _tasks
+    task.cancel()
+    if task in _tasks:
+        _tasks.remove(task)
+    if not _profiler is None:
+        _profiler.remove_profile(task)
 def register_tasks():
     global _tasks
     for task in _tasks:
         task.register()
 def cancel_tasks():
-    global _tasks
+    global _tasks, _scheduler
     for task in _tasks:
         task.cancel()
+    if not _scheduler is None:
+        _scheduler.cancel()
+        _scheduler = None
 
 def run():
     global _running
@@ -56,6 +75,19 @@ def resume():
     global _tasks
     for task in _tasks:
         task.resume()
+def enable_profiler():
+    global _profiler
+    if _profiler is None:
+        from pico_synth_sandbox.profiler import Profiler
+        _profiler = Profiler()
+    return _profiler
+def disable_profiler():
+    global _profiler
+    _profiler = None
+def get_profiler():
+    global _profiler
+    return _profiler
+
 def run_task(coro):
     if is_running():
         get_loop().run_until_complete(coro)
@@ -63,32 +95,141 @@ def run_task(coro):
     else:
         asyncio.run(coro)
 
+# Scheduler
+
+def set_event_dispatcher(callback):
+    # Called with the current time before each scheduled task update so that timed events (ie: Clock) aren't delayed by other tasks
+    global _event_dispatcher
+    _event_dispatcher = callback
+
+def set_coalesce_time(value:float):
+    # Tasks which are due within this amount of time (in seconds) are run early within the same wakeup
+    global _coalesce_time
+    _coalesce_time = max(value, 0.0)
+def get_coalesce_time() -> float:
+    global _coalesce_time
+    return _coalesce_time
+
+def get_schedule() -> list[tuple]:
+    # Returns (name, priority, update frequency, seconds until next update, paused) of each task in the order that they are serviced
+    global _tasks
+    now = time.monotonic()
+    return [(
+        type(task).__name__,
+        task._async_priority,
+        1.0 / task._async_time,
+        max(task._async_next - now, 0.0) if task._async_scheduled and task._async_active else None,
+        task._async_paused
+    ) for task in _tasks]
+
+def _get_scheduler():
+    global _scheduler
+    if _scheduler is None or _scheduler.done():
+        _scheduler = get_loop().create_task(_schedule())
+    return _scheduler
+
+async def _schedule():
+    global _tasks, _scheduler_tick, _coalesce_time, _event_dispatcher
+    while True:
+        try:
+            _scheduler_tick += 1
+            now = time.monotonic()
+            delay = None
+            i = 0
+            while i < len(_tasks):
+                task = _tasks[i]
+                i += 1
+                if not task._async_scheduled or not task._async_active:
+                    continue
+                wait = task._async_next - now
+                if wait > _coalesce_time or task._async_tick == _scheduler_tick:
+                    if delay is None or wait < delay:
+                        delay = wait
+                    continue
+
+                # Each task runs at most once per wakeup and missed updates are skipped rather than queued
+                task._async_tick = _scheduler_tick
+                task._async_next += task._async_time
+                if task._async_next <= now:
+                    task._async_next = now + task._async_time
+                if not task._async_paused:
+                    if not _event_dispatcher is None:
+                        _event_dispatcher(now)
+                    try:
+                        await task._update()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as error:
+                        # Only pause the failing task so that the shared scheduler keeps servicing all other tasks
+                        print("Task update failed, pausing {}: {}".format(type(task).__name__, repr(error)))
+                        task.pause()
+                    now = time.monotonic()
+
+                # Restart from the highest priority task in case it became due
+                delay = None
+                i = 0
+
+            await asyncio.sleep(max(delay, 0.0) if not delay is None else 0.01)
+        except asyncio.CancelledError:
+            break
+
 class Task:
-    def __init__(self, update_frequency=1):
+    PRIORITY_HIGH = 0 # Latency sensitive input such as midi and keys
+    PRIORITY_NORMAL = 1
+    PRIORITY_LOW = 2 # Cosmetic work such as display updates
+
+    def __init__(self, update_frequency=1, priority:int=PRIORITY_NORMAL, scheduled:bool=True):
+        # Tasks which await within update (ie: Timer) should not be scheduled and instead run within their own loop
+        self._async_priority = priority
+        self._async_scheduled = scheduled
+        self._async_active = False
+        self._async_tick = 0
+        self._async_next = time.monotonic()
         self.set_update_frequency(update_frequency)
         self._async_paused = False
         self._async_task = None
         self.register()
     def set_update_frequency(self, frequency=1):
         self._async_time = max(1.0/float(clamp(frequency, 1, 1000)), 0.001)
+    def get_priority(self) -> int:
+        return self._async_priority
+    def set_priority(self, value:int):
+        global _tasks
+        self._async_priority = value
+        _tasks.sort(key=lambda task: task._async_priority)
     def register(self, task:asyncio.Task=None):
         self.cancel()
         if task is None:
             task = register_task(self)
-        self._async_task = task
+        self._async_active = True
+        if self._async_scheduled:
+            self._async_next = time.monotonic()
+        else:
+            self._async_task = task
     def cancel(self):
+        self._async_active = False
         if not self._async_task is None and self._async_task.cancel():
             self._async_task = None
+    def unregister(self):
+        # Cancel the task and release it from the event loop so that it isn't revived by register_tasks
+        unregister_task(self)
     def pause(self):
         self._async_paused = True
     def resume(self):
         self._async_paused = False
+    async def _update(self):
+        if _profiler is None:
+            await self.update()
+        else:
+            start = time.monotonic_ns()
+            await self.update()
+            _profiler.get_profile(self).record(start, time.monotonic_ns(), int(self._async_time * 1000000000))
     async def loop(self):
         while True:
             try:
                 start = time.monotonic()
                 if not self._async_paused:
-                    await self.update()
+                    await self._update()
                 await asyncio.sleep(max(self._async_time - (time.monotonic() - start), 0.001))
             except asyncio.CancelledError:
                 break
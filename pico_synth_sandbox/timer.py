@@ -2,14 +2,15 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-from pico_synth_sandbox.tasks import Task
+from pico_synth_sandbox.clock import Clock, get_clock
 from pico_synth_sandbox import clamp
-import time, asyncio
 
-class Timer(Task):
+class Timer:
     """An abstract class to help handle timing functionality of the :class:`pico_synth_sandbox.arpeggiator.Arpeggiator` and :class:`pico_synth_sandbox.sequencer.Sequencer` classes. Note press and release timing is managed by bpm (beats per minute), steps (divisions of a beat), and gate (note duration during step).
 
-    :param bpm: The beats per minute of timer.
+    All timers are driven by the ticks of the shared :class:`pico_synth_sandbox.clock.Clock` object rather than their own sleep loop, so multiple timers stay phase-locked with each other and can follow an external midi clock. The tempo is a property of the clock and is shared by all timers. The notes of each step are calculated slightly ahead of time and the press, release and step callbacks are called from the event queue of the clock at their due time.
+
+    :param bpm: The initial beats per minute of the master clock. Only applied if the tempo of the master clock hasn't been set yet, so creating another timer doesn't change the tempo of existing timers. If left as `None`, the current tempo of the master clock is used.
     :type bpm: int
     :param steps: The number of steps to divide a single beat. The minimum value allowed is 0.25, or a whole note.
     :type steps: float
@@ -36,51 +37,61 @@ class Timer(Task):
         STEP_THIRTYSECOND
     ]
 
-    def __init__(self, bpm=120, steps=2.0, gate=0.5):
+    def __init__(self, bpm=None, steps=2.0, gate=0.5):
         self._enabled = False
+        self._paused = False
         self._gate = clamp(gate)
+        self._clock = get_clock()
+        self._phase = 0
+        self._step_due = 0.0
 
-        self._reset(False)
+        # Pending note releases are kept in a binary min-heap keyed by due time using parallel lists which are reused
+        self._release_times = []
+        self._release_notes = []
+        self._release_count = 0
+        self._release_queued = None
+
+        if bpm and not self._clock._bpm_set: self._clock.set_bpm(bpm)
         self._update_timing(
-            bpm=bpm,
             steps=max(float(steps), self.STEP_WHOLE)
         )
+        self._reset(False)
 
         self._step = None
         self._press = None
         self._release = None
-        self._last_press = []
+        self._last_press = [] # One entry per dispatched press which hasn't been released, a note may be pressed again before its previous release
+        self._early_release = [] # Releases which were due before their press was dispatched
 
-        Task.__init__(self)
-
-    def _update_timing(self, bpm=None, steps=None):
-        if bpm: self._bpm = bpm
-        if steps: self._steps = steps
-        self._step_time = 60.0 / self._bpm / self._steps
+    def _update_timing(self, steps=None):
+        if steps:
+            self._steps = steps
+            self._step_ticks = max(round(self._clock.PPQN / steps), 1)
+        self._step_time = self._clock.get_tick_time() * self._step_ticks
         self._gate_duration = self._gate * self._step_time
 
     def _reset(self, immediate=True):
-        self._now = time.monotonic()
-        if immediate:
-            self._now -= self._step_time
+        # Align steps to the next tick of the clock if immediate, otherwise to the beat grid of the clock
+        self._phase = self._clock.get_ticks() if immediate else 0
 
     def set_bpm(self, value):
-        """Set the beats per minute.
+        """Set the beats per minute of the master clock. The tempo is shared, so this will affect all timers. Unlike the previous task based timer, timers can no longer run at different tempos.
 
         :param value: The desired beats per minute.
         :type value: int
         """
-        self._update_timing(bpm=value)
+        self._clock.set_bpm(value)
+        self._update_timing()
     def get_bpm(self):
-        """Get the beats per minute.
+        """Get the beats per minute of the master clock.
 
         :return: Beats per minute
         :rtype: int
         """
-        return self._bpm
+        return self._clock.get_bpm()
 
     def set_steps(self, value):
-        """Set number of steps per beat (or the beat division). The pre-defined `pico_synth_sandbox.Timer.STEP_...` constants can be used here.
+        """Set number of steps per beat (or the beat division). The pre-defined `pico_synth_sandbox.Timer.STEP_...` constants can be used here. The step duration is rounded to a whole number of clock ticks.
 
         :param value: The number of steps to divide a single beat. The minimum value allowed is 0.25, or a whole note.
         :type value: float
@@ -129,10 +140,11 @@ class Timer(Task):
         elif not value and self._enabled:
             self.disable()
     def enable(self):
-        """Enable the timer object to start timing beat steps and triggering note press and release callbacks. The first step will immediately trigger.
+        """Enable the timer object to start timing beat steps and triggering note press and release callbacks. The first step will trigger on the next step of the beat grid of the master clock.
         """
         self._enabled = True
-        self._now = time.monotonic() - self._step_time
+        self._phase = 0
+        self._clock.add_timer(self)
         self._enable()
     def _enable(self):
         pass
@@ -140,6 +152,8 @@ class Timer(Task):
         """Disable the timer object and immediately release any pressed notes.
         """
         self._enabled = False
+        self._clock.remove_timer(self)
+        self._clock.cancel_events(self)
         self._do_release()
         self._disable()
     def _disable(self):
@@ -177,36 +191,143 @@ class Timer(Task):
     def _is_active(self):
         return self._enabled
 
+    # Compatibility with the previous task based timer, steps are now driven by the master clock
     async def update(self):
-        """Update the timer object and call any relevant callbacks if a new beat step or the end of the gate of a step is reached. The actual functionality of this method will depend on the child class that utilizes the :class:`pico_synth_sandbox.timer.Timer` parent class.
+        """Dispatch any due events of the master clock. Timers are no longer tasks, so this doesn't need to be called and is only kept for compatibility.
         """
-        while True:
-            if not self._is_active():
-                break
-            self._update()
+        self._clock.dispatch()
+    def force_update(self):
+        """Immediately dispatch any due events of the master clock. Only kept for compatibility with the previous task based timer.
+        """
+        self._clock.dispatch()
+    def pause(self):
+        """Stop triggering new steps while remaining enabled. Notes which have already been pressed will still be released at the end of their gate.
+        """
+        self._paused = True
+    def resume(self):
+        """Continue triggering steps after being paused. Steps remain aligned to the beat grid of the master clock.
+        """
+        self._paused = False
+
+    def _clock_tick(self, tick, due):
+        if self._paused or not self._is_active() or (tick - self._phase) % self._step_ticks:
+            return
+        self._update_timing()
+        self._step_due = due
+        self._update()
+        self._clock.queue_event(due, self, Clock.EVENT_STEP)
+        self._queue_release()
+    def _clock_start(self):
+        self._phase = 0
+        self._clock.cancel_events(self)
+        self._do_release()
+        self._start()
+    def _clock_stop(self):
+        self._clock.cancel_events(self)
+        self._do_release()
+
+    def _dispatch(self, kind, notenum, velocity, due):
+        if kind == Clock.EVENT_PRESS:
+            if self._press:
+                self._press(notenum, velocity)
+            self._last_press.append(notenum)
+            if notenum in self._early_release:
+                # The release of this press has already passed, so release it as soon as possible
+                self._early_release.remove(notenum)
+                self._push_release(due + 0.001, notenum)
+                self._queue_release()
+        elif kind == Clock.EVENT_RELEASE:
+            # Service all releases which are due by the time of this event. Later releases may belong to presses which are still queued behind this event after a stall.
+            self._release_queued = None
+            while self._release_count and self._release_times[0] <= due:
+                notenum = self._pop_release()
+                if notenum in self._last_press:
+                    # Only release the note once every press of it has been released so that an overlapping press isn't cut short
+                    self._last_press.remove(notenum)
+                    if self._release and not notenum in self._last_press:
+                        self._release(notenum)
+                else:
+                    self._early_release.append(notenum)
+            self._queue_release()
+        else:
             self._do_step()
-            if self._last_press:
-                await self.sleep(self._gate_duration)
-                self._do_release()
-                await self.sleep(self._step_time - self._gate_duration)
-            else:
-                await self.sleep(self._step_time)
-    async def sleep(self, delay:float):
-        self._now += delay
-        await asyncio.sleep(self._now - time.monotonic())
 
+    def _start(self):
+        pass
     def _update(self):
         pass
 
     def _do_step(self):
         if self._step:
             self._step()
-    def _do_press(self, notenum, velocity):
-        if self._press:
-            self._press(notenum, velocity)
-            self._last_press.append(notenum)
+    def _do_press(self, notenum, velocity, duration=None):
+        # Queue the note to be pressed at the due time of the current step and released after its own gate. Releases are dispatched before presses with the same time, so notes are held for at least 1ms.
+        self._clock.queue_event(self._step_due, self, Clock.EVENT_PRESS, notenum, velocity)
+        self._push_release(self._step_due + max(self._gate_duration if duration is None else duration, 0.001), notenum)
     def _do_release(self):
+        self._release_count = 0
+        if not self._release_queued is None:
+            self._release_queued = None
+            self._clock.cancel_events(self, Clock.EVENT_RELEASE)
+        self._early_release.clear()
         if self._release and self._last_press:
-            for notenum in self._last_press:
-                self._release(notenum)
-            self._last_press.clear()
+            for i in range(len(self._last_press)):
+                notenum = self._last_press[i]
+                if self._last_press.index(notenum) == i:
+                    self._release(notenum)
+        self._last_press.clear()
+
+    def _queue_release(self):
+        # Keep a single release event within the clock queue at the earliest due release
+        if not self._release_count:
+            return
+        due = self._release_times[0]
+        if self._release_queued is None or due < self._release_queued:
+            if not self._release_queued is None:
+                self._clock.cancel_events(self, Clock.EVENT_RELEASE)
+            self._clock.queue_event(due, self, Clock.EVENT_RELEASE)
+            self._release_queued = due
+
+    def _push_release(self, due, notenum):
+        times = self._release_times
+        notes = self._release_notes
+        i = self._release_count
+        if i == len(times):
+            times.append(due)
+            notes.append(notenum)
+        self._release_count += 1
+        while i > 0:
+            parent = (i - 1) >> 1
+            if times[parent] <= due:
+                break
+            times[i] = times[parent]
+            notes[i] = notes[parent]
+            i = parent
+        times[i] = due
+        notes[i] = notenum
+
+    def _pop_release(self):
+        times = self._release_times
+        notes = self._release_notes
+        notenum = notes[0]
+        self._release_count -= 1
+        count = self._release_count
+        if not count:
+            return notenum
+        due = times[count]
+        last = notes[count]
+        i = 0
+        while True:
+            child = 2 * i + 1
+            if child >= count:
+                break
+            if child + 1 < count and times[child + 1] < times[child]:
+                child += 1
+            if times[child] >= due:
+                break
+            times[i] = times[child]
+            notes[i] = notes[child]
+            i = child
+        times[i] = due
+        notes[i] = last
+        return notenum
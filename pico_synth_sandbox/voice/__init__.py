@@ -213,9 +213,13 @@ class Voice:
         self._filter_frequency = 1.0
         self._filter_resonance = 0.0
         self._filter_buffer = ("", 0.0, 0.0)
+        self._filter = None
 
         self._velocity_amount = 1.0
 
+        self._patch = None
+        self._patch_order = None
+
     def get_notes(self) -> list[synthio.Note]:
         """Get all :class:`synthio.Note` objects attributed to this voice. Used by the :class:`pico_synth_sandbox.synth.Synth` to handle press and release states.
 
@@ -232,6 +236,14 @@ class Voice:
         """
         return []
 
+    def bind(self, synth):
+        """Called by a :class:`pico_synth_sandbox.synth.Synth` object when the voice is added to it and before its blocks are registered. Used by child classes to share resources between the voices of the same synth.
+
+        :param synth: The :class:`pico_synth_sandbox.synth.Synth` object which the voice is being added to.
+        :type synth: :class:`pico_synth_sandbox.synth.Synth`
+        """
+        pass
+
     def press(self, notenum:int, velocity:float=1.0) -> bool:
         """Update the voice to be "pressed" with a specific MIDI note number and velocity. Returns whether or not a new note is received to avoid unnecessary retriggering. The envelope is updated with the new velocity value regardless. Updating :class:`synthio.Note` objects should typically occur within the child class after calling this method and checking its return value.
 
@@ -301,6 +313,9 @@ class Voice:
         self._filter_buffer = (type, frequency, resonance)
 
         filter = synth.build_filter(type, frequency, resonance)
+        if filter is self._filter:
+            return
+        self._filter = filter
         for note in self.get_notes():
             note.filter = filter
 
@@ -362,6 +377,64 @@ class Voice:
         self.set_filter_resonance(resonance, update=False)
         if update and not synth is None: self._update_filter(synth)
 
+    # Patch
+    def begin_patch(self):
+        """Start staging a new patch. Any parameter changes made through :func:`pico_synth_sandbox.voice.Voice.stage` (such as those made by menu items) will be held until :func:`pico_synth_sandbox.voice.Voice.apply_patch` is called rather than modifying the notes that are currently playing. Typically managed by :func:`pico_synth_sandbox.synth.Synth.begin_patch`.
+        """
+        if self._patch is None:
+            self._patch = {}
+            self._patch_order = []
+
+    def is_staging(self) -> bool:
+        """Whether or not a patch is currently being staged.
+
+        :return: staging state
+        :rtype: bool
+        """
+        return not self._patch is None
+
+    def stage(self, method:callable, *args):
+        """Call a parameter setter of the voice, ie: `voice.stage(Oscillator.set_tremolo_rate, 2.0)`. If a patch is being staged, the call will be held until the patch is applied. Only the last arguments of each setter are kept, and setters are applied in the order that they were first staged.
+
+        :param method: The setter method of the voice class.
+        :type method: callable
+        """
+        if self._patch is None:
+            method(self, *args)
+        else:
+            if not method in self._patch:
+                self._patch_order.append(method)
+            self._patch[method] = args
+
+    def apply_patch(self):
+        """Apply all staged parameter changes at once using the existing setters and stop staging.
+        """
+        patch, order = self._patch, self._patch_order
+        self._patch, self._patch_order = None, None
+        if patch:
+            for method in order:
+                method(self, *patch[method])
+        self._update_envelope()
+
+    def is_pressed(self) -> bool:
+        """Whether or not a note is currently being held by the voice.
+
+        :return: pressed state
+        :rtype: bool
+        """
+        return self._notenum > 0
+
+    def retrigger(self) -> bool:
+        """Press the currently held note again with the same velocity, ie: after a patch has been applied. The :class:`synthio.Note` objects must be pressed again by the :class:`pico_synth_sandbox.synth.Synth` object if successful.
+
+        :return: Whether or not a note was held and pressed again
+        :rtype: bool
+        """
+        notenum = self._notenum
+        if notenum <= 0: return False
+        self._notenum = 0
+        return self.press(notenum, self._velocity)
+
     # Loop
     async def update(self, synth):
         """Update all time-based voice logic controlled outside of `synthio` such as filter modulation.
@@ -4,22 +4,32 @@
 
 from pico_synth_sandbox import LOG_2, clamp
 from pico_synth_sandbox.voice import Voice, AREnvelope, LerpBlockInput
+from pico_synth_sandbox.waveform import Wavetable
 import math
 import synthio
 
+def _build_lfos():
+    # Tremolo, vibrato, panning and filter lfos, level and pan are either the lfo offsets of voice modulation or summed with the shared lfos per note of global modulation
+    return (
+        synthio.LFO(waveform=None, rate=1.0, scale=0.0, offset=0.0),
+        synthio.LFO(waveform=None, rate=1.0, scale=0.0, offset=0.0),
+        synthio.LFO(waveform=None, rate=1.0, scale=0.0, offset=0.0),
+        synthio.LFO(waveform=None, rate=1.0, scale=0.0, offset=0.0),
+    )
+
 class Oscillator(Voice):
-    def __init__(self, root=440.0):
+    MODULATION_VOICE = 0 # Each voice has its own lfos
+    MODULATION_GLOBAL = 1 # All global voices of the same synth reference the same lfos, lfo rate and depth apply to every global voice while level and pan remain per voice
+
+    def __init__(self, root=440.0, modulation=MODULATION_VOICE):
         Voice.__init__(self)
 
+        self._modulation = modulation
+        self._tremolo, self._vibrato, self._panning, self._filter_lfo = _build_lfos() # Replaced by the lfos of the synth once added if global
         self._filter_envelope = AREnvelope(amount=0.0)
-        self._filter_lfo = synthio.LFO(
-            waveform=None,
-            rate=1.0,
-            scale=0.0,
-            offset=0.0
-        )
 
         self._root = root
+        self._wavetable = None
         self.coarse_tune = 0.0
         self.fine_tune = 0.0
         self.bend_amount = 0.0
@@ -33,36 +43,40 @@ class Oscillator(Voice):
 
         self._freq_lerp = LerpBlockInput()
         self._pitch_lerp = LerpBlockInput()
+        if modulation == Oscillator.MODULATION_GLOBAL:
+            # Shared lfos can't hold the level and pan of each voice, so they are summed by additional math blocks
+            amplitude = synthio.Math(synthio.MathOperation.SUM, self._tremolo, 1.0, 0.0) # Tremolo + Level
+            panning = synthio.Math(synthio.MathOperation.SUM, self._panning, 0.0, 0.0) # Panning + Pan
+        else:
+            self._tremolo.offset = 1.0 # Level
+            amplitude = self._tremolo
+            panning = self._panning
         self._note = synthio.Note(
             waveform=None,
             frequency=self._root,
-            amplitude=synthio.LFO( # Tremolo
-                waveform=None,
-                rate=1.0,
-                scale=0.0,
-                offset=1.0
-            ),
+            amplitude=amplitude,
             bend=synthio.Math(
                 synthio.MathOperation.SUM,
                 self._freq_lerp.get(), # Frequency Lerp
-                synthio.LFO( # Vibrato
-                    waveform=None,
-                    rate=1.0,
-                    scale=0.0,
-                    offset=0.0
-                ),
+                self._vibrato,
                 self._pitch_lerp.get() # Pitch Bend Lerp
             ),
-            panning=synthio.LFO(
-                waveform=None,
-                rate=1.0,
-                scale=0.0,
-                offset=0.0
-            )
+            panning=panning
         )
 
     def get_notes(self):
         return [self._note]
+    def get_modulation(self):
+        return self._modulation
+    def bind(self, synth):
+        # Global voices adopt the lfos shared by the synth, the first global voice provides them along with its current lfo settings
+        if self._modulation != Oscillator.MODULATION_GLOBAL:
+            return
+        lfos = synth.share("oscillator_lfos", (self._tremolo, self._vibrato, self._panning, self._filter_lfo))
+        self._tremolo, self._vibrato, self._panning, self._filter_lfo = lfos
+        self._note.amplitude.a = self._tremolo
+        self._note.bend.b = self._vibrato
+        self._note.panning.a = self._panning
     def get_blocks(self):
         return self._filter_envelope.get_blocks() + self._freq_lerp.get_blocks() + self._pitch_lerp.get_blocks() + [
             self._filter_lfo,
@@ -76,6 +90,8 @@ class Oscillator(Voice):
             return False
         frequency = synthio.midi_to_hz(notenum)
         self.set_frequency(frequency)
+        if not self._wavetable is None:
+            self._note.waveform = self._wavetable.get(self._get_wavetable_notenum(notenum))
         self._filter_envelope.press()
         return True
     def release(self):
@@ -107,7 +123,15 @@ class Oscillator(Voice):
     def _update_root(self):
         self._note.frequency = self._root * pow(2,self.coarse_tune) * pow(2,self.fine_tune)
 
+    def _get_wavetable_notenum(self, notenum):
+        # Include the tuning and maximum pitch bend so that the selected level never aliases
+        return notenum + (self.coarse_tune + self.fine_tune + abs(self.bend_amount)) * 12
     def set_waveform(self, waveform):
+        if isinstance(waveform, Wavetable):
+            self._wavetable = waveform
+            waveform = waveform.get(self._get_wavetable_notenum(self._notenum if self._notenum > 0 else 60))
+        else:
+            self._wavetable = None
         self._note.waveform = waveform
     def set_loop(self, start=0.0, end=1.0):
         if self._note.waveform is None or len(self._note.waveform) < 2:
@@ -124,23 +148,29 @@ class Oscillator(Voice):
         self._note.waveform_loop_end = end
 
     def set_level(self, value):
-        self._note.amplitude.offset = value
+        if self._modulation == Oscillator.MODULATION_GLOBAL:
+            self._note.amplitude.b = value
+        else:
+            self._tremolo.offset = value
     def set_tremolo_rate(self, value):
-        self._note.amplitude.rate = value
+        self._tremolo.rate = value
     def set_tremolo_depth(self, value):
-        self._note.amplitude.scale = value
+        self._tremolo.scale = value
 
     def set_vibrato_rate(self, value):
-        self._note.bend.b.rate = value
+        self._vibrato.rate = value
     def set_vibrato_depth(self, value):
-        self._note.bend.b.scale = value
+        self._vibrato.scale = value
 
     def set_pan_rate(self, value):
-        self._note.panning.rate = value
+        self._panning.rate = value
     def set_pan_depth(self, value):
-        self._note.panning.scale = value
+        self._panning.scale = value
     def set_pan(self, value):
-        self._note.panning.offset = value
+        if self._modulation == Oscillator.MODULATION_GLOBAL:
+            self._note.panning.b = value
+        else:
+            self._panning.offset = value
 
     # Envelope
     def _update_envelope(self):
@@ -3,12 +3,184 @@
 # GPL v3 License
 
 import os
-from pico_synth_sandbox import fftfreq, LOG_2
+from pico_synth_sandbox import LOG_2
+from pico_synth_sandbox.pitch import detect, MIN_CONFIDENCE
+from pico_synth_sandbox.tasks import Task
 from pico_synth_sandbox.voice import Voice
 from pico_synth_sandbox.voice.oscillator import Oscillator
 import pico_synth_sandbox.waveform as waveform
+import ulab.numpy as numpy
+import adafruit_wave
 import math, time
 
+class SampleStream(Task):
+    """Double-buffered reader of an audio `.wav` file used by :class:`pico_synth_sandbox.voice.sample.Sample` to play samples which are too long to fit in memory. The playback buffer is split into two halves of `chunk_size` frames. While one half is being played by :class:`synthio.Note`, the other half is refilled with the next chunk of the file. At most one chunk is read during each update so that file access never stalls the event loop for longer than a single read. Files can be read from the internal flash (ie: `/samples`) or from an sd card mounted with :func:`pico_synth_sandbox.board.Board.mount_sd_card`.
+
+    synthio doesn't report the playback position of a note, so the position is estimated from the time since the note was pressed. The synthesizer renders ahead of the time that audio is heard by up to the length of the audio output buffer, so the note may be read up to `latency` seconds ahead of the estimate. A half is refilled as soon as the estimate enters the other half, and the refill must happen before the estimate comes within `latency` of the end of the loaded data. The stream is updated at high priority, but if an update is delayed past that point (ie: by a long file read of another task or a blocking task), stale audio from the previous pass through the buffer may be played. This underrun is counted (see :func:`pico_synth_sandbox.voice.sample.SampleStream.get_underruns`) and the refills are realigned ahead of the estimated position, so playback of the file continues from where it left off rather than skipping ahead.
+
+    :param filepath: The absolute path to the `.wav` file. Supports the same formats as :func:`pico_synth_sandbox.waveform.load_from_file`.
+    :type filepath: str
+    :param chunk_size: The number of frames within each half of the playback buffer. At the highest playback pitch, each chunk must last longer than the output latency plus a couple of updates. Defaults to 2048 frames.
+    :type chunk_size: int
+    :param loop: Whether or not to return to the beginning of the file once the end is reached. Defaults to `False`.
+    :type loop: bool
+    :param latency: The maximum time in seconds that the synthesizer renders ahead of the audio output. If left as `None`, the duration of the audio mixer buffer is calculated from the `AUDIO_BUFFER` (in bytes of 16-bit stereo frames) and `AUDIO_RATE` settings.
+    :type latency: float
+    """
+
+    def __init__(self, filepath:str, chunk_size:int=2048, loop:bool=False, latency:float=None):
+        """Constructor method
+        """
+        self._wave = adafruit_wave.open(filepath, "rb")
+        if self._wave.getsampwidth() > 4:
+            self._wave.close()
+            raise ValueError("Unsupported sample width")
+        self._channels = self._wave.getnchannels()
+        self._sample_width = self._wave.getsampwidth()
+        self._sample_rate = self._wave.getframerate()
+        self._frames = self._wave.getnframes()
+        self._chunk_size = chunk_size
+        self._loop = loop
+
+        self.buffer = numpy.zeros(chunk_size * 2, dtype=numpy.int16)
+        self._head = numpy.zeros(chunk_size * 2, dtype=numpy.int16) # Preloaded beginning of the file so that a press never waits on a read
+        self._read(self._head, 0, chunk_size * 2)
+        self.buffer[:] = self._head
+
+        self._playing = False
+        self._position = 0.0
+        self._loaded = 0
+        self._read_position = 0
+        self._end = None
+        self._last = time.monotonic()
+        self._stop_time = None
+        self._rate = float(self._sample_rate)
+        if latency is None: # The mixer buffer size is in bytes of 16-bit stereo frames
+            latency = int(os.getenv("AUDIO_BUFFER", 2048)) / 4 / int(os.getenv("AUDIO_RATE", 22050))
+        self._latency = latency
+        self._underruns = 0
+        if self._latency * self._rate >= chunk_size:
+            print("Stream chunk size is shorter than the output latency: {}".format(filepath))
+
+        Task.__init__(self, update_frequency=100, priority=Task.PRIORITY_HIGH)
+
+    def get_sample_rate(self) -> int:
+        """Get the sample rate of the audio file.
+
+        :return: sample rate in hertz
+        :rtype: int
+        """
+        return self._sample_rate
+
+    def get_frames(self) -> int:
+        """Get the total number of frames within the audio file.
+
+        :return: number of frames
+        :rtype: int
+        """
+        return self._frames
+
+    def set_rate(self, value:float):
+        """Set the rate at which frames of the playback buffer are being played, in frames per second. Used to estimate the playback position of the note.
+
+        :param value: The playback rate.
+        :type value: float
+        """
+        self._rate = value
+
+    def get_underruns(self) -> int:
+        """Get the number of refills which happened too late to be sure that the output didn't play stale audio.
+
+        :return: number of underruns since the stream was created
+        :rtype: int
+        """
+        return self._underruns
+
+    def is_finished(self) -> bool:
+        """Whether or not playback has passed the end of the file when not looping.
+
+        :return: finished state
+        :rtype: bool
+        """
+        return not self._end is None and self._position >= self._end
+
+    def _read(self, buffer, offset:int, frames:int) -> int:
+        # Read frames into a portion of the buffer and pad the remainder with silence, returns the number of frames read
+        count = 0
+        while count < frames:
+            if self._wave.tell() >= self._frames:
+                if not self._loop or not self._frames:
+                    break
+                self._wave.rewind()
+            length = min(frames - count, self._frames - self._wave.tell())
+            data = waveform.convert_frames(self._wave.readframes(length), self._sample_width, self._channels)
+            buffer[offset+count:offset+count+len(data)] = data
+            count += len(data)
+            del data
+        if count < frames:
+            buffer[offset+count:offset+frames] = 0
+        return count
+
+    def start(self):
+        """Restart playback from the beginning of the file using the preloaded chunks.
+        """
+        self.buffer[:] = self._head
+        self._wave.setpos(min(self._chunk_size * 2, self._frames) if not self._loop or not self._frames else (self._chunk_size * 2) % self._frames)
+        self._position = 0.0
+        self._loaded = self._chunk_size * 2
+        self._end = self._frames if not self._loop and self._frames < self._loaded else None
+        self._last = time.monotonic()
+        self._stop_time = None
+        self._playing = True
+
+    def stop(self, delay:float=0.0):
+        """Stop refilling the playback buffer after a delay, typically the release time of the note envelope.
+
+        :param delay: The amount of time in seconds to continue streaming. Defaults to 0.0.
+        :type delay: float
+        """
+        self._stop_time = time.monotonic() + delay
+
+    def close(self):
+        """Stop playback, remove the stream from the event loop, and close the audio file. The stream can't be used again once it has been closed.
+        """
+        self._playing = False
+        self.unregister()
+        if not self._wave is None:
+            self._wave.close()
+            self._wave = None
+        self.buffer = None
+        self._head = None
+
+    async def update(self):
+        """Estimate the playback position and refill the half of the playback buffer which has finished playing.
+        """
+        if not self._playing:
+            return
+        now = time.monotonic()
+        self._position += (now - self._last) * self._rate
+        self._last = now
+
+        if (not self._stop_time is None and now >= self._stop_time) or self.is_finished():
+            self._playing = False
+            return
+
+        if self._loaded - self._position <= self._chunk_size:
+            if self._loaded - self._position < self._latency * self._rate:
+                # The output may have already read past the loaded data into stale audio
+                self._underruns += 1
+                if self._position >= self._loaded:
+                    # Realign to the half after the estimated position so that refills stay ahead of it
+                    self._loaded += (int(self._position - self._loaded) // self._chunk_size + 1) * self._chunk_size
+            offset = (self._loaded // self._chunk_size) % 2 * self._chunk_size
+            if self._end is None:
+                count = self._read(self.buffer, offset, self._chunk_size)
+                if count < self._chunk_size:
+                    self._end = self._loaded + count
+            else: # Silence the remaining buffer until the note is released
+                self.buffer[offset:offset+self._chunk_size] = 0
+            self._loaded += self._chunk_size
+
 class Sample(Oscillator):
     """Create a synthesizer voice from a provided audio sample. Handles pitch, looping points, and wav file loading and inherits all properties and functionality of the :class:`pico_synth_sandbox.voice.oscillator.Oscillator`.
 
@@ -16,12 +188,14 @@ class Sample(Oscillator):
     :type loop: bool
     :param filepath: The absolute path to the compatible audio file (`.wav`). Leave empty to initialize the voice without a specified sample. Defaults to empty.
     :type filepath: str
+    :param modulation: Whether the voice has its own tremolo, vibrato, panning, and filter lfos (:const:`pico_synth_sandbox.voice.oscillator.Oscillator.MODULATION_VOICE`) or shares their rate and depth with all other global voices of the same synth (:const:`pico_synth_sandbox.voice.oscillator.Oscillator.MODULATION_GLOBAL`). Defaults to per-voice modulation.
+    :type modulation: int
     """
 
-    def __init__(self, loop:bool=True, filepath:str=""):
+    def __init__(self, loop:bool=True, filepath:str="", modulation:int=Oscillator.MODULATION_VOICE):
         """Constructor method
         """
-        Oscillator.__init__(self)
+        Oscillator.__init__(self, modulation=modulation)
 
         self._loop = loop
 
@@ -31,6 +205,7 @@ class Sample(Oscillator):
         self._sample_tune = 0.0
         self._loop_tune = 0.0
         self._start = None
+        self._stream = None
         self._desired_frequency = self._root
 
         if filepath:
@@ -43,35 +218,81 @@ class Sample(Oscillator):
         :type data: :class:`ulab.numpy.ndarray`
         :param sample_rate: The recorded audio sample rate of the incoming sample data.
         :type sample_rate: int
-        :param root: The predesignated root frequency (in hertz) of the recorded audio sample. Used to match pitch frequencies with pressed notes. If left as `None`, the root frequency will be automatically calculated using the included Fast-Fourier Transform tool, `pico_synth_sandbox.fftfreq`. Defaults to `None`.
+        :param root: The predesignated root frequency (in hertz) of the recorded audio sample. Used to match pitch frequencies with pressed notes. If left as `None`, the root frequency will be automatically calculated using :func:`pico_synth_sandbox.pitch.detect`, or the sample will play at its original speed for A4 if the confidence is below :const:`pico_synth_sandbox.pitch.MIN_CONFIDENCE`. Defaults to `None`.
         :type root: float
         """
         self._wave_rate = sample_rate
         self.set_waveform(data)
         if root is None:
-            self._root = fftfreq(
-                data=self._note.waveform,
-                sample_rate=self._wave_rate
-            )
+            root, confidence = detect(self._note.waveform, self._wave_rate)
+            if root is None or confidence < MIN_CONFIDENCE: # Unpitched or silent, play at original speed for A4
+                root = self._desired_frequency
+        self._root = root
         self._wave_duration = 1.0 / self._root
         self._sample_duration = len(self._note.waveform) / self._wave_rate
         self._sample_tune = math.log(self._wave_duration / self._sample_duration) / LOG_2
         self.set_loop() # calls self._update_root
 
     def load_from_file(self, filepath:str, max_samples:int=4096):
-        """Load waveform data from an audio `.wav` file within the virtual file system. The audio sample rate and root frequency will be automatically calculated by the file properties and FFT algorithm.
+        """Load waveform data from an audio `.wav` file within the virtual file system. The audio sample rate and root frequency will be automatically calculated by the file properties and pitch detection.
 
         :param filepath: The absolute path to the `.wav` file.
         :type filepath: str
         :param max_samples: The maximum limit of which to load audio samples from the audio file. Used to avoid memory overflow with large audio files. Defaults to 4096 samples.
         :type max_samples: int
+        :return: Whether or not the format of the file is supported and the data was loaded.
+        :rtype: bool
+        """
+        self._close_stream()
+        result = waveform.load_from_file(filepath, max_samples)
+        if not result:
+            return False
+        self.load(*result)
+        return True
+
+    def load_from_library(self, library, name:str, max_samples:int=4096):
+        """Load waveform data from an audio `.wav` file within a :class:`pico_synth_sandbox.samples.SampleLibrary`. The root frequency is taken from the library index, so pitch detection only occurs the first time a file is analyzed. If the voice is looping, the suggested loop points of the index will be applied.
+
+        :param library: The sample library containing the file.
+        :type library: :class:`pico_synth_sandbox.samples.SampleLibrary`
+        :param name: The file name of the sample within the library.
+        :type name: str
+        :param max_samples: The maximum limit of which to load audio samples from the audio file. Defaults to 4096 samples.
+        :type max_samples: int
+        """
+        self._close_stream()
+        data, sample_rate, info = library.load(name, max_samples)
+        if data is None:
+            return
+        root = info.get_root()
+        self.load(data, sample_rate, root if not root is None else self._desired_frequency)
+        if self._loop:
+            start, end = info.get_loop(len(data))
+            self.set_loop(start, end)
+
+    def stream_from_file(self, filepath:str, root:float=None, chunk_size:int=2048):
+        """Play an audio `.wav` file of any length by streaming it from the file system with a :class:`pico_synth_sandbox.voice.sample.SampleStream` object rather than loading it entirely into memory. The looping setting of the voice applies to the whole file, and custom loop points aren't supported. Only the first two chunks are read immediately, the root frequency is calculated from them if not provided.
+
+        :param filepath: The absolute path to the `.wav` file. Can be located on a mounted sd card.
+        :type filepath: str
+        :param root: The root frequency (in hertz) of the recorded audio sample. If left as `None`, it will be calculated using :func:`pico_synth_sandbox.pitch.detect`. Defaults to `None`.
+        :type root: float
+        :param chunk_size: The number of frames read at a time. Defaults to 2048 frames.
+        :type chunk_size: int
         """
-        data, sample_rate = waveform.load_from_file(filepath, max_samples)
-        self.load(data, sample_rate)
+        self._close_stream()
+        self._stream = SampleStream(filepath, chunk_size, self._loop)
+        self.load(self._stream.buffer, self._stream.get_sample_rate(), root)
+
+    def _close_stream(self):
+        if not self._stream is None:
+            self._stream.close()
+            self._stream = None
 
     def unload(self):
         """Remove sample data from the voice to restore it to its initial state. Will prevent the voice from responding to note presses.
         """
+        self._close_stream()
         self._wave_rate = self._sample_rate
         self.set_waveform(None)
         self._root = self._desired_frequency
@@ -85,9 +306,18 @@ class Sample(Oscillator):
             return False
         if not Oscillator.press(self, notenum, velocity):
             return False
-        if not self._loop:
+        if not self._stream is None:
+            self._stream.set_rate(len(self._note.waveform) / self.get_duration())
+            self._stream.start()
+        elif not self._loop:
             self._start = time.monotonic()
         return True
+    def release(self) -> bool:
+        if not Oscillator.release(self):
+            return False
+        if not self._stream is None:
+            self._stream.stop(self._release_time)
+        return True
 
     def get_duration(self) -> float:
         """Calculates the length of the audio sample given the current state (includes note bend properties). Used for determining when to release a note during single-shot sample playback.
@@ -121,6 +351,10 @@ class Sample(Oscillator):
 
     async def update(self, synth):
         await Voice.update(self, synth)
-        if not self._loop and not self._start is None and time.monotonic() - self._start >= self.get_duration():
+        if not self._stream is None:
+            self._stream.set_rate(len(self._note.waveform) / self.get_duration())
+            if self._stream.is_finished() and self._notenum > 0:
+                synth.release(self)
+        elif not self._loop and not self._start is None and time.monotonic() - self._start >= self.get_duration():
             synth.release(self)
             self._start = None
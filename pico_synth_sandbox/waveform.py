@@ -2,7 +2,7 @@
 # 2023 Cooper Dalrymple - me@dcdalrymple.com
 # GPL v3 License
 
-from pico_synth_sandbox import normalize
+from pico_synth_sandbox import normalize as normalize_data, resample
 import os, random, gc
 import ulab.numpy as numpy
 import adafruit_wave
@@ -112,7 +112,7 @@ def get_sine_noise() -> numpy.ndarray:
     if _sine_noise is None:
         get_sine()
         get_noise()
-        _sine_noise = numpy.array([int(max(min(_sine[i] + (_noise[i]/2.0), get_amplitude()), -get_amplitude())) for i in range(get_samples())], dtype=numpy.int16)
+        _sine_noise = numpy.array(numpy.clip(_sine + _noise / 2.0, -get_amplitude(), get_amplitude()), dtype=numpy.int16)
     return _sine_noise
 
 _offset_sine_noise = None
@@ -126,36 +126,240 @@ def get_offset_sine_noise() -> numpy.ndarray:
     if _offset_sine_noise is None:
         get_offset_sine()
         get_noise()
-        _offset_sine_noise = numpy.array([int(max(min(_offset_sine[i] + (_noise[i]/2.0), get_amplitude()), -get_amplitude())) for i in range(get_samples())], dtype=numpy.int16)
+        _offset_sine_noise = numpy.array(numpy.clip(_offset_sine + _noise / 2.0, -get_amplitude(), get_amplitude()), dtype=numpy.int16)
     return _offset_sine_noise
 
-def load_from_file(filepath:str, max_samples:int=4096) -> tuple[numpy.ndarray, int]:
-    """Read an audio wave file (`.wav`) from the virtual file system up to a specified maximum sample length. Wave file must be mono or stereo and must have a sample width of 2 bytes (16-bit). If stereo, only the left channel will be used. By default, the data will be automatically normalized using `pico_synth_sandbox.normalize`.
+WAVETABLE_SAW = 0 #: Band-limited decrementing sawtooth waveform, see :func:`pico_synth_sandbox.waveform.get_saw`.
+WAVETABLE_SQUARE = 1 #: Band-limited square waveform, see :func:`pico_synth_sandbox.waveform.get_square`.
+WAVETABLE_TRIANGLE = 2 #: Band-limited triangle waveform, see :func:`pico_synth_sandbox.waveform.get_triangle`.
+
+_wavetable_cache = {}
+_wavetable_order = []
+_wavetable_usage = 0
+_wavetable_budget = None
+
+def get_wavetable_budget() -> int:
+    """Retrieve the maximum amount of memory in bytes used by cached wavetable levels as defined by `WAVE_CACHE` in the settings.toml file, or as set by :func:`pico_synth_sandbox.waveform.set_wavetable_budget`. Defaults to 8192 bytes.
+
+    :return: wavetable cache budget in bytes
+    :rtype: int
+    """
+    global _wavetable_budget
+    if _wavetable_budget is None:
+        _wavetable_budget = os.getenv("WAVE_CACHE", 8192)
+    return _wavetable_budget
+
+def set_wavetable_budget(value:int):
+    """Change the maximum amount of memory in bytes used by cached wavetable levels. If the cache is currently larger than the new budget, the least recently used levels will be evicted immediately.
+
+    :param value: The desired budget in bytes.
+    :type value: int
+    """
+    global _wavetable_budget
+    _wavetable_budget = max(int(value), 0)
+    _evict_wavetables()
+
+def get_wavetable_usage() -> int:
+    """Retrieve the amount of memory in bytes currently used by cached wavetable levels.
+
+    :return: wavetable cache usage in bytes
+    :rtype: int
+    """
+    global _wavetable_usage
+    return _wavetable_usage
+
+def clear_wavetables():
+    """Remove all cached wavetable levels. Levels which are still assigned to a note will remain in memory until they are replaced.
+    """
+    global _wavetable_cache, _wavetable_order, _wavetable_usage
+    _wavetable_cache = {}
+    _wavetable_order = []
+    _wavetable_usage = 0
+    gc.collect()
+
+def _evict_wavetables(reserve:int=0, keep:int=None) -> bool:
+    # Evict the least recently used levels, except those of the kept type, until the reserved amount fits within the budget
+    global _wavetable_cache, _wavetable_order, _wavetable_usage
+    i = 0
+    while i < len(_wavetable_order) and _wavetable_usage + reserve > get_wavetable_budget():
+        if _wavetable_order[i][0] == keep:
+            i += 1
+            continue
+        data = _wavetable_cache.pop(_wavetable_order.pop(i))
+        _wavetable_usage -= len(data) * 2
+    return _wavetable_usage + reserve <= get_wavetable_budget()
+
+def _build_wavetable(type:int, harmonics:int) -> numpy.ndarray:
+    # Additive synthesis of the fourier series of each waveform, one vectorized operation per harmonic
+    phase = numpy.linspace(0, 2*numpy.pi, get_samples(), endpoint=False)
+    data = numpy.zeros(get_samples())
+    if type == WAVETABLE_SAW:
+        for i in range(1, harmonics + 1):
+            data += numpy.sin(phase * i) * (2.0 / (numpy.pi * i))
+    elif type == WAVETABLE_SQUARE:
+        for i in range(1, harmonics + 1, 2):
+            data += numpy.sin(phase * i) * (4.0 / (numpy.pi * i))
+    else: # type == WAVETABLE_TRIANGLE
+        for i in range(1, harmonics + 1, 2):
+            data -= numpy.cos(phase * i) * (8.0 / (numpy.pi * numpy.pi * i * i))
+    # Scale down the gibbs overshoot of the saw and square series (about 9%, more with few harmonics) so that it can't wrap with a large amplitude
+    peak = float(numpy.max(abs(data)))
+    if peak > 1.0:
+        data = data / peak
+    return numpy.array(numpy.clip(data * get_amplitude(), -32767.0, 32767.0), dtype=numpy.int16)
+
+class Wavetable:
+    """A band-limited waveform made up of one level per octave, each containing only the harmonics which fall below the nyquist frequency for the highest note of that octave. Using this object with :func:`pico_synth_sandbox.voice.oscillator.Oscillator.set_waveform` avoids the aliasing of high notes with the naive waveforms. All levels are generated when the object is created and stored in a shared cache limited by :func:`pico_synth_sandbox.waveform.get_wavetable_budget` so that pressing a note only requires a lookup. Octaves which end up with the same number of harmonics share a single level.
+
+    :param type: The waveform shape, one of `WAVETABLE_SAW`, `WAVETABLE_SQUARE` or `WAVETABLE_TRIANGLE`.
+    :type type: int
+    :param sample_rate: The sample rate of the synthesizer used to determine the nyquist frequency. If left as `None`, the `AUDIO_RATE` settings.toml value will be used instead.
+    :type sample_rate: int
+    """
+
+    def __init__(self, type:int=WAVETABLE_SAW, sample_rate:int=None):
+        """Constructor method
+        """
+        self.type = type
+        self._sample_rate = os.getenv("AUDIO_RATE", 22050) if sample_rate is None else sample_rate
+        self.build()
+
+    def get_harmonics(self, notenum:float) -> int:
+        """Determine the number of harmonics of the level used for a note.
+
+        :param notenum: The MIDI note number.
+        :type notenum: float
+        :return: number of harmonics
+        :rtype: int
+        """
+        top = (int(notenum) // 12 + 1) * 12
+        frequency = 440.0 * pow(2, (top - 69) / 12)
+        harmonics = min(max(int(self._sample_rate / 2 / frequency), 1), get_samples() // 2 - 1)
+        if self.type != WAVETABLE_SAW and not harmonics % 2:
+            harmonics -= 1 # Only odd harmonics are used
+        return harmonics
+
+    def build(self):
+        """Generate every level needed for MIDI notes 0 to 127, from the fewest harmonics to the most. Levels of other wavetables are evicted as needed, but if the budget is too small to hold all levels of this wavetable, the lowest octaves will use the level with the most harmonics that fit instead. Called automatically when the object is created and only needs to be called again after :func:`pico_synth_sandbox.waveform.clear_wavetables`.
+        """
+        global _wavetable_cache, _wavetable_order, _wavetable_usage
+        harmonics = []
+        for octave in range(11, -1, -1):
+            count = self.get_harmonics(octave * 12)
+            if not count in harmonics:
+                harmonics.append(count)
+        for count in harmonics:
+            key = (self.type, count)
+            if key in _wavetable_cache:
+                continue
+            if not _evict_wavetables(get_samples() * 2, self.type):
+                break
+            data = _build_wavetable(self.type, count)
+            _wavetable_cache[key] = data
+            _wavetable_order.append(key)
+            _wavetable_usage += len(data) * 2
+
+    def get(self, notenum:float=60) -> numpy.ndarray:
+        """Get the waveform level which is suitable for a note. If that level isn't cached, the cached level with the most harmonics below it is used instead so that the note never aliases. A single harmonic level is only generated here if no suitable levels are cached at all.
+
+        :param notenum: The MIDI note number. Tuning offsets can be included as a fractional value.
+        :type notenum: float
+        :return: waveform
+        :rtype: :class:`ulab.numpy.ndarray` of type `ulab.numpy.int16`
+        """
+        global _wavetable_cache, _wavetable_order, _wavetable_usage
+        key = (self.type, self.get_harmonics(notenum))
+        data = _wavetable_cache.get(key)
+        if data is None:
+            best = None
+            for cached in _wavetable_order:
+                if cached[0] == self.type and cached[1] < key[1] and (best is None or cached[1] > best[1]):
+                    best = cached
+            if best is None: # Only a single harmonic is generated to keep the cost of the press low
+                key = (self.type, 1)
+                _evict_wavetables(get_samples() * 2)
+                data = _build_wavetable(self.type, 1)
+                _wavetable_cache[key] = data
+                _wavetable_order.append(key)
+                _wavetable_usage += len(data) * 2
+            else:
+                key = best
+                data = _wavetable_cache[key]
+        _wavetable_order.remove(key)
+        _wavetable_order.append(key)
+        return data
+
+def convert_frames(data:bytes, sample_width:int=2, channels:int=1) -> numpy.ndarray:
+    """Convert raw little-endian PCM frame data (as read from a `.wav` file) into a mono 16-bit array using vectorized operations. 8-bit data is re-centered, 24-bit and 32-bit integer data is truncated to the 16 most significant bits, and multiple channels are averaged together. Floating point data isn't supported.
+
+    :param data: The raw frame data.
+    :type data: bytes
+    :param sample_width: The number of bytes of each sample, from 1 to 4. Defaults to 2 (16-bit).
+    :type sample_width: int
+    :param channels: The number of interleaved channels within the frame data. Defaults to 1.
+    :type channels: int
+    :return: audio data
+    :rtype: :class:`ulab.numpy.ndarray` of type `ulab.numpy.int16`
+    :raises ValueError: if the sample width isn't from 1 to 4 bytes
+    """
+    if sample_width == 2:
+        data = numpy.frombuffer(data, dtype=numpy.int16)
+    elif sample_width == 4: # Use the upper half of each 32-bit sample
+        data = numpy.frombuffer(data, dtype=numpy.int16)[1::2]
+    elif sample_width == 1:
+        data = (numpy.frombuffer(data, dtype=numpy.uint8) - 128.0) * 256.0
+    elif sample_width == 3: # Combine the upper two bytes of each 24-bit sample, the highest byte is signed
+        data = numpy.frombuffer(data, dtype=numpy.uint8)
+        high = numpy.array(data[2::3], dtype=numpy.float)
+        data = (high - (high > 127) * 256.0) * 256.0 + data[1::3]
+        del high
+    else:
+        raise ValueError("Unsupported sample width")
+
+    if channels > 1: # Downmix interleaved channels
+        mix = numpy.array(data[0::channels], dtype=numpy.float)
+        for i in range(1, channels):
+            mix += data[i::channels]
+        data = mix / channels
+        del mix
+
+    # Copy into a writable array since frombuffer references the immutable frame data
+    return numpy.array(data if data.dtype == numpy.int16 else numpy.clip(data, -32768, 32767), dtype=numpy.int16)
+
+def load_from_file(filepath:str, max_samples:int=4096, sample_rate:int=None, normalize:bool=True) -> tuple[numpy.ndarray, int]:
+    """Read an audio wave file (`.wav`) from the virtual file system up to a specified maximum sample length. Wave file must be integer PCM with a sample width of 1 to 4 bytes (8-bit to 32-bit) and will be converted to 16-bit using :func:`pico_synth_sandbox.waveform.convert_frames`. Floating point files aren't supported since `adafruit_wave` can only read PCM data. If it has multiple channels, they will be mixed down to mono. By default, the data will be automatically normalized using `pico_synth_sandbox.normalize`.
 
     :param filepath: The absolute path to the `.wav` file.
     :type filepath: str
     :param max_samples: The maximum limit of which to load audio samples from the audio file. Used to avoid memory overflow with large audio files. Defaults to 4096 samples.
     :type max_samples: int
-    :return: A tuple of the audio data in the format of a :class:`ulab.numpy.ndarray` with a formatting of `ulab.numpy.int16` and the sample rate of the audio file.
+    :param sample_rate: The desired sample rate of the audio data. If it doesn't match the sample rate of the audio file, the data will be resampled using `pico_synth_sandbox.resample`. Leave as `None` to keep the original sample rate. Defaults to `None`.
+    :type sample_rate: int
+    :param normalize: Whether or not to normalize the volume of the audio data. Defaults to `True`.
+    :type normalize: bool
+    :return: A tuple of the audio data in the format of a :class:`ulab.numpy.ndarray` with a formatting of `ulab.numpy.int16` and the sample rate of the audio data, or `False` if the format of the file isn't supported.
     :rtype: tuple[:class:`ulab.numpy.ndarray`, int]
     """
     data = None
-    sample_rate = 0
-
-    with adafruit_wave.open(filepath, "rb") as wave:
-        if wave.getsampwidth() != 2 or wave.getnchannels() > 2:
-            return False
-        sample_rate = wave.getframerate()
-
-        # Read sample and convert to numpy
-        frames = min(wave.getnframes(), max_samples)
-        data = list(memoryview(wave.readframes(frames)).cast('h'))
-        if wave.getnchannels() == 2: # Filter out right channel
-            data = [i for i in range(0, frames, 2)]
-        data = numpy.array(data, dtype=numpy.int16)
-
-        # Normalize volume
-        data = normalize(data)
+
+    try:
+        with adafruit_wave.open(filepath, "rb") as wave:
+            # Read sample and convert to numpy
+            frames = min(wave.getnframes(), max_samples)
+            data = convert_frames(wave.readframes(frames), wave.getsampwidth(), wave.getnchannels())
+            file_rate = wave.getframerate()
+    except (adafruit_wave.Error, ValueError): # Not integer PCM data
+        return False
+
+    # Resample to desired rate
+    if not sample_rate is None and sample_rate != file_rate:
+        data = numpy.array(resample(data, file_rate, sample_rate), dtype=numpy.int16)
+    else:
+        sample_rate = file_rate
+
+    # Normalize volume
+    if normalize:
+        data = normalize_data(data)
 
     gc.collect()
     return data, sample_rate
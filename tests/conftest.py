@@ -0,0 +1,19 @@
+# tests/conftest.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import asyncio
+import pytest
+
+from pico_synth_sandbox import clock, tasks
+
+@pytest.fixture(autouse=True)
+def reset_tasks():
+    yield
+    # Release every task created by the test and let the cancelled tasks finish so that the loop doesn't hold onto unawaited coroutines
+    for task in list(tasks._tasks):
+        task.unregister()
+    tasks.cancel_tasks()
+    tasks.get_loop().run_until_complete(asyncio.sleep(0))
+    tasks.set_event_dispatcher(None)
+    clock._clock = None
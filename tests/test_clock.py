@@ -0,0 +1,38 @@
+# tests/test_clock.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import random
+
+from pico_synth_sandbox.clock import Clock, get_clock
+
+class EventTimer:
+    # Stand-in timer which records the events dispatched to it
+    def __init__(self, events):
+        self.events = events
+    def _dispatch(self, kind, notenum, velocity, due):
+        self.events.append((due, kind, notenum))
+
+def test_event_order():
+    # Events are dispatched by time, releases first and otherwise in the order they were queued
+    clock = get_clock()
+    dispatched = []
+    timers = [EventTimer(dispatched) for i in range(2)]
+    generator = random.Random(1)
+    queued = []
+    for i in range(200):
+        due = generator.randrange(20) * 0.001
+        kind = generator.choice((Clock.EVENT_STEP, Clock.EVENT_PRESS, Clock.EVENT_RELEASE))
+        timer = timers[i % 2]
+        clock.queue_event(due, timer, kind, i)
+        queued.append((due, kind, i, timer))
+
+    cancelled = [event for event in queued if event[3] is timers[1] and event[1] == Clock.EVENT_STEP]
+    assert clock.cancel_events(timers[1], Clock.EVENT_STEP) == len(cancelled)
+
+    clock.dispatch(0.0095)
+    clock.dispatch(1.0)
+    expected = sorted((event for event in queued if not event in cancelled), key=lambda event: (event[0], event[1] != Clock.EVENT_RELEASE, event[2]))
+    assert dispatched == [event[:3] for event in expected]
+    assert not clock._events
+    assert len(clock._free) >= Clock.MAX_EVENTS
@@ -0,0 +1,77 @@
+# tests/test_display.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+from pico_synth_sandbox.display import Display
+
+class LCD:
+    # Stand-in for adafruit_character_lcd which records each message written and the resulting characters
+    LEFT_TO_RIGHT = 0
+    def __init__(self, columns, rows):
+        self.lines = [[" "] * columns for y in range(rows)]
+        self.writes = []
+        self.column = 0
+        self.row = 0
+        self.cursor = False
+        self.blink = False
+        self.text_direction = None
+    @property
+    def message(self):
+        return None
+    @message.setter
+    def message(self, value):
+        self.writes.append((self.column, self.row, value))
+        for i, char in enumerate(value):
+            self.lines[self.row][self.column + i] = char
+    def clear(self):
+        self.lines = [[" "] * len(line) for line in self.lines]
+    def cursor_position(self, column, row):
+        pass
+    def create_char(self, index, data):
+        pass
+
+class Board:
+    def __init__(self):
+        self.lcd = None
+    def get_lcd(self, columns, rows):
+        self.lcd = LCD(columns, rows)
+        return self.lcd
+
+def _update(display):
+    display.force_update()
+    lcd = display._lcd
+    writes = lcd.writes
+    lcd.writes = []
+    return writes
+
+def test_settings(monkeypatch):
+    # Settings are strings on a host
+    monkeypatch.setenv("DISPLAY_COLUMNS", "20")
+    monkeypatch.setenv("DISPLAY_ROWS", "4")
+    display = Display(Board())
+    assert display.get_columns() == 20
+    assert display.get_rows() == 4
+
+def test_spans():
+    board = Board()
+    display = Display(board, 20, 4)
+    display.write("Hello", (0,0))
+    display.write("World", (15,3))
+    assert _update(display) == [(0, 0, "Hello"), (15, 3, "World")]
+
+    # Unchanged characters are skipped, short gaps are rewritten and long gaps are split into separate writes
+    display.write("Hallo", (0,0))
+    assert _update(display) == [(1, 0, "a")]
+    display.write("Jelly", (0,0))
+    assert _update(display) == [(0, 0, "Jelly")] # A gap of 2 unchanged characters costs no more than a new write
+    display.write("AB", (0,1))
+    display.write("C", (4,1))
+    display.write("D", (10,1))
+    assert _update(display) == [(0, 1, "AB  C"), (10, 1, "D")]
+
+    # Writing the same text again doesn't transmit anything
+    display.write("World", (15,3))
+    assert _update(display) == []
+    assert "".join(board.lcd.lines[0]).rstrip() == "Jelly"
+    assert "".join(board.lcd.lines[1]).rstrip() == "AB  C     D"
+    assert "".join(board.lcd.lines[3]).strip() == "World"
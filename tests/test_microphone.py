@@ -0,0 +1,49 @@
+# tests/test_microphone.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import numpy
+
+from pico_synth_sandbox.host import _run
+from pico_synth_sandbox.microphone import Microphone, Recorder
+
+class PDM:
+    # Stand-in for audiobusio.PDMIn which records silence until the trigger read and a tone afterwards
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.reads = []
+    def record(self, buffer, count):
+        loud = len(self.reads) >= self.trigger
+        self.reads.append(count)
+        for i in range(count):
+            buffer[i] = 32768 + 100 + ((8000 if i % 2 else -8000) if loud else 0)
+        return count
+
+class Board:
+    def __init__(self, pdm):
+        self.pdm = pdm
+    def get_pdm(self, sample_rate):
+        return self.pdm
+
+def test_recorder():
+    pdm = PDM(trigger=6)
+    microphone = Microphone(Board(pdm), sample_rate=16000) # Read without resampling
+    microphone.actual_sample_rate = microphone.input_sample_rate
+    recorder = Recorder(microphone, samples=1024, trigger=0.01, clip=0.0, pretrigger=256, block=128)
+
+    recorder.start()
+    progress = [recorder.get_progress()]
+    while recorder.is_active():
+        _run(recorder.update())
+        progress.append(recorder.get_progress())
+        assert len(pdm.reads) < 64
+
+    assert max(pdm.reads) <= 128 # A single bounded block per update
+    assert recorder.get_state() == Recorder.STATE_COMPLETE
+    assert progress == sorted(progress) and 0.0 < progress[-2] < 1.0 and progress[-1] == 1.0
+
+    data = recorder.get_data()
+    assert len(data) == 1024
+    assert not numpy.any(abs(data[:128]) > 1000) # The block before the trigger block is kept as history
+    assert numpy.all(abs(data[128:]) > 1000)
+    assert abs(numpy.mean(data)) < 1000 # Offset removed
@@ -0,0 +1,29 @@
+# tests/test_pitch.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import numpy
+import pytest
+
+from pico_synth_sandbox.pitch import detect, MIN_CONFIDENCE
+
+def _tone(frequency, sample_rate=22050, length=8192, harmonics=4):
+    time = numpy.arange(length) / sample_rate
+    data = sum(numpy.sin(2.0 * numpy.pi * frequency * i * time) / i for i in range(1, harmonics + 1))
+    return numpy.array(data / numpy.max(numpy.abs(data)) * 20000, dtype=numpy.int16)
+
+@pytest.mark.parametrize("frequency", [41.0, 82.41, 110.0, 261.63, 440.0, 1000.0])
+def test_tone(frequency):
+    result, confidence = detect(_tone(frequency), 22050)
+    assert result == pytest.approx(frequency, rel=0.005)
+    assert confidence >= MIN_CONFIDENCE
+
+def test_decimated():
+    result, confidence = detect(_tone(41.0, 44100, 16384), 44100)
+    assert result == pytest.approx(41.0, rel=0.005)
+
+def test_unpitched():
+    noise = numpy.array(numpy.random.default_rng(0).standard_normal(8192) * 8000, dtype=numpy.int16)
+    assert detect(noise, 22050)[1] < MIN_CONFIDENCE
+    assert detect(numpy.zeros(4096, dtype=numpy.int16), 22050) == (None, 0.0)
+    assert detect(numpy.zeros(8, dtype=numpy.int16), 22050) == (None, 0.0)
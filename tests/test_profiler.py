@@ -0,0 +1,30 @@
+# tests/test_profiler.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import pytest
+
+from pico_synth_sandbox import tasks
+from pico_synth_sandbox.tasks import Task
+
+@pytest.fixture
+def profiler():
+    profiler = tasks.enable_profiler()
+    yield profiler
+    tasks.disable_profiler()
+
+def test_profile_per_task(profiler):
+    first = Task(update_frequency=10)
+    second = Task(update_frequency=10)
+    profiler.get_profile(first).record(0, 1000, 100000000)
+    assert profiler.get_profile(first).count == 1
+    assert profiler.get_profile(second).count == 0
+
+def test_unregister_drops_profile(profiler):
+    task = Task(update_frequency=10)
+    profiler.get_profile(task).record(0, 1000, 100000000)
+    task.unregister()
+    assert not profiler.get_profiles()
+    # A task registered afterwards starts with empty statistics
+    task = Task(update_frequency=10)
+    assert profiler.get_profile(task).count == 0
@@ -0,0 +1,83 @@
+# tests/test_render.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+# Golden tests of the audio rendered by the host stand-ins. Set GOLDEN_UPDATE=1 to rewrite the stored audio after an intentional change to the output.
+
+import os
+import numpy
+import pytest
+import synthio
+
+from pico_synth_sandbox import waveform
+from pico_synth_sandbox.host import render
+from pico_synth_sandbox.synth import Synth
+from pico_synth_sandbox.voice.oscillator import Oscillator
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden")
+TOLERANCE = 2 # Maximum difference of any sample to allow for rounding between NumPy and SciPy versions
+
+@pytest.fixture
+def synth():
+    return Synth()
+
+def _compare(name, data):
+    path = os.path.join(GOLDEN_PATH, name + ".npy")
+    if os.getenv("GOLDEN_UPDATE"):
+        numpy.save(path, data)
+    expected = numpy.load(path)
+    assert data.shape == expected.shape
+    assert data.dtype == expected.dtype
+    difference = int(numpy.max(numpy.abs(data.astype(numpy.int32) - expected.astype(numpy.int32))))
+    assert difference <= TOLERANCE, "{} differs from the golden audio by {}".format(name, difference)
+
+def test_oscillator_filter(synth):
+    voice = Oscillator()
+    synth.add_voice(voice)
+    voice.set_waveform(waveform.get_saw())
+    voice.set_envelope(attack_time=0.01, decay_time=0.05, release_time=0.05, sustain_level=0.5)
+    voice.set_filter(type=Synth.FILTER_LPF, frequency=2000.0, resonance=0.5, envelope_attack_time=0.05, envelope_amount=2000.0, synth=synth)
+
+    synth.press(voice, 48)
+    data = render(synth, 0.2)
+    synth.release(voice)
+    data = numpy.concatenate((data, render(synth, 0.1)))
+
+    assert numpy.any(data[:len(data)//2])
+    assert not numpy.any(data[-256:]) # Silent once the release has finished
+    _compare("oscillator_filter", data)
+
+def test_oscillator_voice_modulation_blocks():
+    # Level and pan of voice modulation are the offsets of the voice lfos, math blocks are only needed for shared lfos
+    voice = Oscillator()
+    voice.set_level(0.5)
+    voice.set_pan(-0.25)
+    assert isinstance(voice.get_notes()[0].amplitude, synthio.LFO)
+    assert isinstance(voice.get_notes()[0].panning, synthio.LFO)
+    assert voice.get_notes()[0].amplitude.offset == 0.5
+    assert voice.get_notes()[0].panning.offset == -0.25
+
+    voice = Oscillator(modulation=Oscillator.MODULATION_GLOBAL)
+    assert isinstance(voice.get_notes()[0].amplitude, synthio.Math)
+    assert isinstance(voice.get_notes()[0].panning, synthio.Math)
+
+def test_oscillator_global_modulation(synth):
+    voices = [Oscillator(modulation=Oscillator.MODULATION_GLOBAL) for i in range(2)]
+    synth.add_voices(voices)
+    synth.set_waveform(waveform.get_triangle())
+    for i, voice in enumerate(voices):
+        voice.set_envelope(attack_time=0.02, release_time=0.05, sustain_level=0.75)
+        voice.set_pan(-0.5 if i == 0 else 0.5)
+    voices[0].set_tremolo_rate(8.0)
+    voices[0].set_tremolo_depth(0.5)
+    voices[0].set_vibrato_rate(5.0)
+    voices[0].set_vibrato_depth(0.02)
+
+    synth.press(0, 60)
+    synth.press(1, 67)
+    data = render(synth, 0.25)
+    synth.release()
+    data = numpy.concatenate((data, render(synth, 0.1)))
+
+    assert not numpy.array_equal(data[:, 0], data[:, 1]) # Panned apart
+    _compare("oscillator_global_modulation", data)
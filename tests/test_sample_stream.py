@@ -0,0 +1,46 @@
+# tests/test_sample_stream.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import wave
+import numpy
+
+from pico_synth_sandbox.host import _run
+from pico_synth_sandbox.voice.sample import SampleStream
+
+def _stream(tmp_path, frames=22050, chunk_size=1024, latency=0.01):
+    path = str(tmp_path / "ramp.wav")
+    with wave.open(path, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(22050)
+        file.writeframes(numpy.arange(frames, dtype="<i2").tobytes())
+    return SampleStream(path, chunk_size, latency=latency)
+
+def _advance(stream, frames):
+    # Move the estimated playback position forward without waiting
+    stream._last -= frames / stream._rate
+    _run(stream.update())
+
+def test_refill(tmp_path):
+    stream = _stream(tmp_path)
+    stream.start()
+    for i in range(16):
+        _advance(stream, 512)
+    assert stream.get_underruns() == 0
+    # The half being played holds the frames of the file at the estimated position
+    position = int(stream._position)
+    assert stream.buffer[position % 2048] == position
+    stream.close()
+
+def test_underrun(tmp_path):
+    stream = _stream(tmp_path)
+    stream.start()
+    _advance(stream, 512)
+    _advance(stream, 3000) # Stall past the end of the loaded data
+    assert stream.get_underruns() == 1
+    assert stream._loaded - stream._position > stream._latency * stream._rate # Realigned ahead of the position
+    for i in range(8):
+        _advance(stream, 512)
+    assert stream.get_underruns() == 1
+    stream.close()
@@ -0,0 +1,82 @@
+# tests/test_timer.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+from pico_synth_sandbox.clock import get_clock
+from pico_synth_sandbox.timer import Timer
+
+class NoteTimer(Timer):
+    # Presses the next note of a list on every step
+    def __init__(self, notes, **kwargs):
+        self._notes = notes
+        self._index = 0
+        self._duration = None
+        Timer.__init__(self, **kwargs)
+    def _update(self):
+        if self._index < len(self._notes):
+            self._do_press(self._notes[self._index], 1.0, self._duration)
+            self._index += 1
+
+def _build(notes):
+    timer = NoteTimer(notes, bpm=120, steps=24.0, gate=0.5) # One step per tick
+    pressed, released = [], []
+    timer.set_press(lambda notenum, velocity: pressed.append(notenum))
+    timer.set_release(released.append)
+    timer.enable()
+    return get_clock(), timer, pressed, released
+
+def _generate(clock, count):
+    # Generate ticks on the tick grid without dispatching their events
+    due = clock._start_time
+    for i in range(count):
+        clock._tick(due, due)
+        due += clock.get_tick_time()
+    return due
+
+def test_release_after_press():
+    clock, timer, pressed, released = _build([60, 62, 63])
+    _generate(clock, 3)
+    for i in range(3):
+        clock.dispatch(clock._start_time + clock.get_tick_time() * (i + 0.75))
+    assert pressed == [60, 62, 63]
+    assert released == [60, 62, 63]
+    assert not timer._release_count
+
+def test_release_after_stall():
+    # The clock stalls between the presses and releases, so every event is dispatched late by a single call
+    clock, timer, pressed, released = _build([60, 62, 63])
+    end = _generate(clock, 3)
+    clock.dispatch(end + 1.0)
+    assert pressed == [60, 62, 63]
+    assert released == [60, 62, 63]
+    assert not timer._last_press
+    assert not timer._early_release
+    assert not clock._events
+
+def test_overlapping_press():
+    # A note pressed again before its previous release is only released once its last press has ended
+    clock, timer, pressed, released = _build([60, 60])
+    timer._duration = clock.get_tick_time() * 1.5
+    end = _generate(clock, 2)
+    clock.dispatch(end + 1.0)
+    assert pressed == [60, 60]
+    assert released == [60]
+
+def test_shared_tempo():
+    # The tempo of a timer constructor only applies until the tempo of the clock has been set
+    first = Timer(bpm=100)
+    assert first.get_bpm() == 100
+    first.set_bpm(90)
+    second = Timer(bpm=140)
+    assert second.get_bpm() == 90
+    assert first.get_bpm() == 90
+
+def test_pause():
+    clock, timer, pressed, released = _build([60, 62, 63])
+    timer.pause()
+    _generate(clock, 2)
+    timer.resume()
+    end = _generate(clock, 3)
+    clock.dispatch(end + 1.0)
+    assert pressed == [60, 62, 63]
+    assert released == [60, 62, 63]
@@ -0,0 +1,46 @@
+# tests/test_waveform.py
+# 2024 Cooper Dalrymple - me@dcdalrymple.com
+# GPL v3 License
+
+import struct, wave
+import numpy
+import pytest
+
+from pico_synth_sandbox import waveform
+
+def _write(path, data, sample_width, channels):
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(channels)
+        file.setsampwidth(sample_width)
+        file.setframerate(22050)
+        file.writeframes(data)
+    return str(path)
+
+@pytest.mark.parametrize("sample_width", [1, 2, 3, 4])
+def test_load_pcm(tmp_path, sample_width):
+    # Keep the most significant bytes of a 32-bit ramp, 8-bit data is unsigned
+    ramp = numpy.arange(-16384, 16384, 512, dtype=numpy.int32)
+    words = (ramp << 16).astype("<i4").tobytes()
+    frames = b"".join(words[i+4-sample_width:i+4] for i in range(0, len(words), 4))
+    if sample_width == 1:
+        frames = bytes((value + 128) & 0xFF for value in frames)
+
+    data, sample_rate = waveform.load_from_file(_write(tmp_path / "mono.wav", frames, sample_width, 1), normalize=False)
+    assert sample_rate == 22050
+    assert data.dtype == numpy.int16
+    assert numpy.array_equal(data, ramp)
+
+def test_load_stereo(tmp_path):
+    left = numpy.arange(-8192, 8192, 256, dtype=numpy.int16)
+    frames = numpy.stack((left, -left), axis=1).astype("<i2").tobytes()
+    data, sample_rate = waveform.load_from_file(_write(tmp_path / "stereo.wav", frames, 2, 2), normalize=False)
+    assert len(data) == len(left)
+    assert not numpy.any(data)
+
+def test_load_float(tmp_path):
+    # 32-bit float files aren't supported by adafruit_wave
+    samples = numpy.zeros(64, dtype="<f4").tobytes()
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(samples), b"WAVE", b"fmt ", 16, 3, 1, 22050, 22050 * 4, 4, 32, b"data", len(samples))
+    path = tmp_path / "float.wav"
+    path.write_bytes(header + samples)
+    assert waveform.load_from_file(str(path)) is False